@@ -0,0 +1,172 @@
+"""
+Employee availability compiled to integer bitmasks.
+
+Time is measured in minutes from the start of the day, and windows whose end is at or before their start run past
+midnight ("18:00-01:00" is 18:00 to 25:00). Every employee's weekly availability is turned once into one mask per
+day on a timeline of granularity-minute ticks (60, 30 or 15), with bit t set when the employee can work the whole of
+tick t. Availability checks in the scheduler's inner loops are then a single mask test whatever the granularity:
+a finer timeline only makes each mask a few machine words longer. "Who can work role R from t1 to t2" is a handful
+of ANDs over per-tick employee bitsets.
+"""
+
+from functools import lru_cache
+
+
+# Same order as the generator's "avl" list
+DAYS = ["su", "mo", "tu", "we", "th", "fr", "sa"]
+
+# Order of days within a planned week, Monday first: the greedy phase, overnight break checks and the rolling horizon
+# all measure the week from the start of "mo" to the end of "su"
+WEEK_DAYS = ["mo", "tu", "we", "th", "fr", "sa", "su"]
+
+# "open" is available at every tick; -1 has every bit set however far the day's hours run
+OPEN_MASK = -1
+OFF_MASK = 0
+
+DAY_MINUTES = 24 * 60
+
+# Supported tick lengths, in minutes
+GRANULARITIES = (15, 30, 60)
+DEFAULT_GRANULARITY = 60
+
+# Time covered by the per-tick employee bitsets, enough for shifts running past midnight
+INDEXED_MINUTES = 2 * DAY_MINUTES
+
+
+@lru_cache(maxsize=None)
+def window_minutes(window):
+    """Parse an "H:MM-H:MM" window or slot into its (start, end) minutes; an end at or before the start is +24h."""
+    start, end = window.split('-')
+    start_hour, start_minute = start.split(':')
+    end_hour, end_minute = end.split(':')
+    start = int(start_hour) * 60 + int(start_minute)
+    end = int(end_hour) * 60 + int(end_minute)
+    if end <= start:
+        end += DAY_MINUTES
+    return start, end
+
+
+def check_granularity(granularity):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported slot granularity: {granularity} (choose from {GRANULARITIES})")
+    return granularity
+
+
+def tick_span(start, end):
+    """Return the bitmask of the ticks start <= t < end."""
+    if end <= start:
+        return 0
+    return (1 << end) - (1 << start)
+
+
+def span_ticks(start, end, granularity):
+    """Return the ticks (first, last + 1) that a start..end span in minutes overlaps."""
+    return start // granularity, -(-end // granularity)
+
+
+@lru_cache(maxsize=None)
+def window_mask(availability, granularity=DEFAULT_GRANULARITY):
+    """Return the tick bitmask for an availability value: "open", "off" or an "H:MM-H:MM" window."""
+    if availability == "open":
+        return OPEN_MASK
+    if availability == "off":
+        return OFF_MASK
+    start, end = window_minutes(availability)
+    # Only ticks wholly inside the window count as available
+    return tick_span(-(-start // granularity), end // granularity)
+
+
+def normalize_availability(employee):
+    """
+    Return the employee's availability as the {day: "open" | "off" | "H:MM-H:MM"} dict the scheduler reads,
+    converting the generator's per-day "avl" list (1, 0 or a window string) when that is all there is.
+    """
+    if "availability" in employee:
+        return employee["availability"]
+    normalized = {}
+    for day, availability in zip(DAYS, employee.get("avl", [])):
+        if isinstance(availability, str):
+            normalized[day] = availability
+        else:
+            normalized[day] = "open" if availability else "off"
+    return normalized
+
+
+def employee_roles(employee):
+    """Return the roles an employee can work, falling back to their single "pos"."""
+    if "roles" in employee:
+        return employee["roles"]
+    return [employee["pos"]] if "pos" in employee else []
+
+
+def bitset_of(indices, size):
+    """Build an employee bitset from indices in one pass, rather than OR-ing into an ever larger int."""
+    bits = bytearray((size + 7) // 8)
+    for idx in indices:
+        bits[idx >> 3] |= 1 << (idx & 7)
+    return int.from_bytes(bits, "little")
+
+
+def members(bitset):
+    """Yield the employee indices set in an employee bitset, lowest first."""
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+class AvailabilityIndex:
+    """Per-day availability bitmasks for a list of employees, addressed by their position in that list."""
+
+    def __init__(self, employees, granularity=DEFAULT_GRANULARITY):
+        self.granularity = check_granularity(granularity)
+        self.employee_ids = [employee["id"] for employee in employees]
+        self.position = {employee_id: idx for idx, employee_id in enumerate(self.employee_ids)}
+        self.masks = {day: [OFF_MASK] * len(employees) for day in DAYS}
+        role_members = {}
+        for idx, employee in enumerate(employees):
+            for day, availability in normalize_availability(employee).items():
+                if day not in self.masks:
+                    self.masks[day] = [OFF_MASK] * len(employees)
+                self.masks[day][idx] = window_mask(availability, granularity)
+            for role in employee_roles(employee):
+                role_members.setdefault(role, []).append(idx)
+        self.role_sets = {role: bitset_of(indices, len(employees)) for role, indices in role_members.items()}
+        self._tick_sets = {}
+
+    def day_masks(self, day):
+        return self.masks.get(day) or [OFF_MASK] * len(self.employee_ids)
+
+    def covers(self, idx, day, start, end):
+        """Check whether employee number idx is available for the whole of start..end, in minutes."""
+        mask = self.day_masks(day)[idx]
+        span = tick_span(*span_ticks(start, end, self.granularity))
+        return mask != OFF_MASK and mask & span == span
+
+    def is_available(self, idx, day, hour):
+        """Check whether employee number idx can work the hour starting at hour."""
+        return self.covers(idx, day, hour * 60, hour * 60 + 60)
+
+    def tick_set(self, day, tick):
+        """Return the bitset of employees available for the given tick."""
+        key = (day, tick)
+        bitset = self._tick_sets.get(key)
+        if bitset is None:
+            day_masks = self.day_masks(day)
+            bitset = bitset_of((idx for idx, mask in enumerate(day_masks) if mask >> tick & 1), len(day_masks))
+            self._tick_sets[key] = bitset
+        return bitset
+
+    def available_set(self, day, start, end, role=None):
+        """Return the bitset of employees (optionally with the given role) available for the whole of start..end."""
+        bitset = (1 << len(self.employee_ids)) - 1 if role is None else self.role_sets.get(role, 0)
+        first, last = span_ticks(start, min(end, INDEXED_MINUTES), self.granularity)
+        for tick in range(first, last):
+            if not bitset:
+                break
+            bitset &= self.tick_set(day, tick)
+        return bitset
+
+    def available_employees(self, day, start, end, role=None):
+        """Return the ids of all employees (optionally with the given role) available for the whole of start..end."""
+        return [self.employee_ids[idx] for idx in members(self.available_set(day, start, end, role))]
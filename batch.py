@@ -0,0 +1,185 @@
+"""
+Batch scheduling for many stores.
+
+Reads store configurations from a JSONL file, one problem per line, schedules them across a process pool and writes
+one JSON result per store, in the order they finish. Only a bounded number of stores are in flight at a time and
+lines are read as workers free up, so memory stays flat however long the input is.
+
+    python batch.py stores.jsonl -o schedules.jsonl --workers 8
+
+With --stream, each schedule is written one day per line followed by its evaluation (see scheduleio.ScheduleWriter)
+and then the rest of its result record (line, store, seconds, cache status) on a line of its own;
+with --columnar DIR, schedules go to columnar files in DIR instead, named after their input line, and each result
+records its file. --engine picks an optimizers engine (annealing, tabu or lns) to improve each greedy schedule
+within --time-budget seconds, in place of the fixed --iterations of simulated_annealing_v2, which then only caps it.
+--profile PATH records every store's phases and hot calls in the workers (see instrumentation.py) and writes them to
+PATH as one Chrome trace.
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import json
+import os
+import random
+import sys
+import time
+
+from calculateschedule import (DEFAULT_WEIGHTS, evaluate_schedule, generate_entire_weekly_schedule_v4,
+                               simulated_annealing_v2)
+import instrumentation
+from optimizers import OPTIMIZERS, optimize
+from parsejson import parse_json_data
+from scheduleio import ScheduleWriter, write_columnar
+from solvecache import SolveCache, solve_cached
+
+
+def schedule_store(line_number, line, iterations=0, seed=0, cache_dir=None, engine=None, time_budget=2.0,
+                   profile=False):
+    """
+    Parse, schedule and evaluate one store; return its result record. Errors are reported, not raised, so one bad
+    store cannot take down the batch.
+    With a cache_dir, solved schedules are reused and warm-started through a SolveCache. With an engine, the greedy
+    schedule is improved by that optimizers engine within time_budget seconds, at most iterations steps (0 for
+    no cap). With profile, the store is solved under instrumentation and the Recorder is returned as "profile".
+    """
+    start = time.perf_counter()
+    result = {"line": line_number}
+    if profile:
+        result["profile"] = instrumentation.enable()
+    try:
+        data = parse_json_data(line)
+        result["store"] = data.get("store")
+        if cache_dir is not None:
+            schedule, result["cache"] = solve_cached(
+                SolveCache(cache_dir), data, data.get("weights", DEFAULT_WEIGHTS), max_iterations=iterations,
+                rng=random.Random(seed), engine=engine, time_budget=time_budget)
+        else:
+            schedule = generate_entire_weekly_schedule_v4(data)
+        if engine is not None and cache_dir is None:
+            schedule = optimize(schedule, data, data.get("weights", DEFAULT_WEIGHTS), engine, time_budget,
+                                random.Random(seed), max_iterations=iterations or None)
+        elif iterations and cache_dir is None:
+            schedule = simulated_annealing_v2(
+                schedule, data["empl"], data["positions"], data["dailyTraffic"],
+                data.get("weights", DEFAULT_WEIGHTS), max_iterations=iterations, rng=random.Random(seed))
+        result["schedule"] = schedule
+        result["evaluation"] = evaluate_schedule(schedule, data["empl"], data["hours"], data["positions"],
+                                                 demand=data.get("demand"))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if profile:
+            instrumentation.disable()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def read_stores(lines):
+    """Yield (line_number, line) for every non-blank line."""
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            yield line_number, line
+
+
+def run_batch(lines, workers=None, max_in_flight=None, iterations=0, seed=0, cache_dir=None, engine=None,
+              time_budget=2.0, profile=False):
+    """
+    Schedule every store in an iterable of JSONL lines and yield result records as they complete.
+    At most max_in_flight stores (default twice the workers) are submitted at a time. With profile, each record
+    carries its store's instrumentation Recorder as "profile". Stores in flight when a worker process dies are
+    reported as failed, and the batch carries on in a new pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    stores = read_stores(lines)
+    if workers == 1:
+        for line_number, line in stores:
+            yield schedule_store(line_number, line, iterations, seed, cache_dir, engine, time_budget, profile)
+        return
+    max_in_flight = max_in_flight or 2 * workers
+    executor = ProcessPoolExecutor(max_workers=workers)
+    # future -> line number of its store
+    pending = {}
+    try:
+        for line_number, line in stores:
+            args = (schedule_store, line_number, line, iterations, seed, cache_dir, engine, time_budget, profile)
+            try:
+                future = executor.submit(*args)
+            except BrokenProcessPool:
+                # A worker died and took the pool with it; the rest of the batch goes to a fresh one
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=workers)
+                future = executor.submit(*args)
+            pending[future] = line_number
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _result(future, pending.pop(future))
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _result(future, pending.pop(future))
+    finally:
+        executor.shutdown()
+
+
+def _result(future, line_number):
+    # When a worker process dies (killed, out of memory, a crash in native code) every store then in flight on its
+    # pool fails with BrokenProcessPool; those are reported as failed like any other error
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        return {"line": line_number, "error": f"{type(e).__name__}: {e}"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schedule every store in a JSONL file.")
+    parser.add_argument("input", help="JSONL file of store configurations, or - for stdin")
+    parser.add_argument("-o", "--output", help="JSONL file for the results (default stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default CPU count)")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="stores submitted at once")
+    parser.add_argument("--iterations", type=int, default=0, help="annealing iterations after the greedy schedule")
+    parser.add_argument("--engine", choices=sorted(OPTIMIZERS), help="optimizer engine to improve schedules with")
+    parser.add_argument("--time-budget", type=float, default=2.0, help="seconds per store for --engine")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", help="directory of cached solves to reuse and warm-start from")
+    parser.add_argument("--stream", action="store_true", help="write schedules one day per line")
+    parser.add_argument("--columnar", metavar="DIR", help="write schedules to columnar files in DIR")
+    parser.add_argument("--profile", metavar="PATH", help="write a Chrome trace of the stores' phases to PATH")
+    args = parser.parse_args(argv)
+    if args.columnar:
+        os.makedirs(args.columnar, exist_ok=True)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    sink = open(args.output, "w") if args.output else sys.stdout
+    writer = ScheduleWriter(sink)
+    recorder = instrumentation.Recorder() if args.profile else None
+    failed = 0
+    try:
+        for result in run_batch(source, args.workers, args.max_in_flight, args.iterations, args.seed,
+                                args.cache, args.engine, args.time_budget, args.profile is not None):
+            failed += "error" in result
+            if "profile" in result:
+                recorder.merge(result.pop("profile"))
+            if "schedule" in result and args.columnar:
+                path = os.path.join(args.columnar, f"{result['line']}.sched")
+                write_columnar(result.pop("schedule"), path)
+                result["schedule_file"] = path
+            if "schedule" in result and args.stream:
+                store = result["line"] if result.get("store") is None else result["store"]
+                writer.write_schedule(result.pop("schedule"), store)
+                writer.write_evaluation(result.pop("evaluation"), store)
+            sink.write(json.dumps(result) + "\n")
+            writer.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        if recorder is not None:
+            recorder.write_json(args.profile)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
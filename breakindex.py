@@ -0,0 +1,61 @@
+"""
+Per-employee interval index for enforcing breaks between shifts.
+
+Each employee's shifts are kept as sorted start and end lists, so "can this shift be added without cutting into
+the minimum break?" is a binary search and a look at the two neighbouring shifts, and the index is updated
+incrementally as shifts are added or removed. Shifts are given in minutes (from the start of the day or week), so
+slots that don't start on the hour are compared exactly.
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+# Minimum gap, in hours, between the end of one shift and the start of the next
+MIN_BREAK_HOURS = 1
+
+
+class BreakIndex:
+    """Sorted shift intervals per employee."""
+
+    def __init__(self, min_break=MIN_BREAK_HOURS):
+        self.min_break = min_break
+        self.min_gap = round(min_break * 60)
+        self.starts = {}
+        self.ends = {}
+
+    def can_add(self, employee_id, start, end):
+        """Check whether the employee can take a start..end shift and still get the minimum break either side."""
+        starts = self.starts.get(employee_id)
+        if not starts:
+            return True
+        ends = self.ends[employee_id]
+        i = bisect_right(starts, start)
+        if i > 0 and start - ends[i - 1] < self.min_gap:
+            return False
+        if i < len(starts) and starts[i] - end < self.min_gap:
+            return False
+        return True
+
+    def add(self, employee_id, start, end):
+        """Record a start..end shift for the employee."""
+        starts = self.starts.setdefault(employee_id, [])
+        ends = self.ends.setdefault(employee_id, [])
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+
+    def remove(self, employee_id, start, end):
+        """Forget a start..end shift previously recorded for the employee."""
+        starts, ends = self.starts[employee_id], self.ends[employee_id]
+        i = bisect_left(starts, start)
+        while ends[i] != end:
+            i += 1
+        del starts[i]
+        del ends[i]
+
+    def try_add(self, employee_id, start, end):
+        """Add the shift if it keeps the minimum break, and report whether it did."""
+        if not self.can_add(employee_id, start, end):
+            return False
+        self.add(employee_id, start, end)
+        return True
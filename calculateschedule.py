@@ -25,148 +25,164 @@
 
 # Utility functions and scheduling algorithms
 
-from collections import defaultdict
+from collections import Counter, defaultdict
 import copy
 import math
 import random
+import time
+
+from availability import (DAY_MINUTES, DEFAULT_GRANULARITY, WEEK_DAYS, AvailabilityIndex, employee_roles, members,
+                          normalize_availability, window_minutes)
+from breakindex import MIN_BREAK_HOURS, BreakIndex
+from candidatepool import CandidatePool
+from compactschedule import CompactSchedule
+from parsejson import parse_hours, required_staff_for_guests
 
 
 def day_to_index(day):
-    # Convert day string to index.
-    days = ["su", "mo", "tu", "we", "th", "fr", "sa"]
-    return days.index(day)
+    # Convert day string to its index in the planned week (Monday first).
+    return WEEK_DAYS.index(day)
 
 
-def enforce_breaks(schedule):
+def enforce_breaks(schedule, min_break=MIN_BREAK_HOURS):
     '''Ensure that employees aren't scheduled back-to-back without breaks. '''
-    # Sort schedule by employee ID and start time
-    sorted_schedule = sorted(schedule, key=lambda x: (
-        x['employee_id'], x['slot'].split('-')[0]))
-    for i in range(len(sorted_schedule) - 1):
-        if sorted_schedule[i]['employee_id'] == sorted_schedule[i + 1]['employee_id']:
-            end_time_current_shift = int(
-                sorted_schedule[i]['slot'].split('-')[1].split(':')[0])
-            start_time_next_shift = int(
-                sorted_schedule[i + 1]['slot'].split('-')[0].split(':')[0])
-            if start_time_next_shift - end_time_current_shift < 1:  # No break between shifts
-                return False
+    breaks = BreakIndex(min_break)
+    for hour_schedule in schedule:
+        start, end = window_minutes(hour_schedule['slot'])
+        if not breaks.try_add(hour_schedule['employee_id'], start, end):  # No break between shifts
+            return False
     return True
 
 
-def is_employee_available(employee, day, hour):
-    # Check if an employee is available at a specific day and hour.
-    availability = employee["availability"].get(day, "off")
-    if availability == "open":  # Available all day
-        return True
-    elif availability == "off":  # Not available
-        return False
-    else:
-        # Check specific availability window
-        start, end = map(lambda x: int(
-            x.split(":")[0]), availability.split('-'))
-        return start <= hour < end
-
+def is_employee_available(employee, day, hour, minute=0):
+    # Check if an employee is available at a specific day and time; hours past 23 are after midnight.
+    # Hot loops should compile an AvailabilityIndex once instead; windows are parsed once per window string.
+    availability = normalize_availability(employee).get(day, "off")
+    if availability in ("open", "off"):
+        return availability == "open"
+    start, end = window_minutes(availability)
+    return start <= hour * 60 + minute < end
 
-def required_staff_for_guests(guest_count, max_guests_per_employee):
-    # Calculate the required number of employees based on guest count.
-    return (guest_count + max_guests_per_employee - 1) // max_guests_per_employee
 
 # Hard Constraints
 
 
-def enhanced_day_schedule(data, day_short):
+def enhanced_day_schedule(data, day_short, availability=None, candidates=None, min_break=MIN_BREAK_HOURS, breaks=None):
     '''Enhanced scheduling for a specific day with prioritized allocation. '''
+    if availability is None:
+        availability = AvailabilityIndex(data["empl"], data.get("granularity", DEFAULT_GRANULARITY))
+    if candidates is None:
+        candidates = CandidatePool(data["empl"], roles_of=lambda e: e["roles"])
     day_schedule = []
-    shift_count_by_employee = defaultdict(int)
+    # A BreakIndex passed in holds shifts already on the day, which new ones must keep clear of
+    if breaks is None:
+        breaks = BreakIndex(min_break)
     sorted_roles = sorted(
         data["role_requirements"].items(), key=lambda x: x[1], reverse=True)
-    sorted_employees = sorted(
-        data["empl"], key=lambda e: shift_count_by_employee[e["id"]])
-    for slot in data["preferred_slots"].get(day_short, []):
+    slots = data["preferred_slots"].get(day_short, [])
+    # A parsed Store carries the slots already in minutes
+    windows = data.get("preferred_windows", {}).get(day_short) or [window_minutes(slot) for slot in slots]
+    for slot, (start_slot, end_slot) in zip(slots, windows):
+
+        def can_take_slot(idx):
+            return (availability.covers(idx, day_short, start_slot, end_slot)
+                    and breaks.can_add(data["empl"][idx]["id"], start_slot, end_slot))
+
         for role, min_required in sorted_roles:
             num_assigned = 0
-            for employee in sorted_employees:
-                if role in employee["roles"]:
-                    availability = employee["availability"].get(
-                        day_short, "off")
-                    start_slot = int(slot.split("-")[0].split(":")[0])
-                    end_slot = int(slot.split("-")[1].split(":")[0])
-                    if availability == "open" or ("-" in availability and int(availability.split("-")[0].split(":")[0]) <= start_slot and int(availability.split("-")[1].split(":")[0]) >= end_slot):
-                        temp_schedule = day_schedule.copy()
-                        temp_schedule.append({
-                            "employee_id": employee["id"],
-                            "role": role,
-                            "slot": slot
-                        })
-                        if enforce_breaks(temp_schedule):
-                            day_schedule = temp_schedule
-                            num_assigned += 1
-                            shift_count_by_employee[employee["id"]] += 1
-                            if num_assigned >= min_required:
-                                break
+            # Least-loaded eligible employee first, re-keyed as shifts are handed out
+            seat_candidates = candidates.fill(role, can_take_slot)
+            for idx in seat_candidates:
+                day_schedule.append({
+                    "employee_id": data["empl"][idx]["id"],
+                    "role": role,
+                    "slot": slot
+                })
+                num_assigned += 1
+                candidates.add_load(idx)
+                breaks.add(data["empl"][idx]["id"], start_slot, end_slot)
+                if num_assigned >= min_required:
+                    break
+            seat_candidates.close()
     return day_schedule
 
 
-def generate_entire_weekly_schedule_v4(data):
+def generate_entire_weekly_schedule_v4(data, min_break=MIN_BREAK_HOURS, candidates=None):
     '''Generate a schedule for the entire week using the enhanced day scheduling function.'''
-    days = ["mo", "tu", "we", "th", "fr", "sa", "su"]
+    days = WEEK_DAYS
+    availability = AvailabilityIndex(data["empl"], data.get("granularity", DEFAULT_GRANULARITY))
+    # One pool for the week, so shift counts carry over from day to day
+    if candidates is None:
+        candidates = CandidatePool(data["empl"], roles_of=lambda e: e["roles"])
     weekly_schedule = {}
     for day in days:
-        weekly_schedule[day] = enhanced_day_schedule(data, day)
+        weekly_schedule[day] = enhanced_day_schedule(data, day, availability, candidates, min_break)
     return weekly_schedule
 
 
-def schedule_mandatory_roles(schedule, employees, hours, positions):
+def schedule_mandatory_roles(schedule, employees, hours, positions, availability=None):
     # Schedule roles that need at least one employee at all times.
+    if availability is None:
+        availability = AvailabilityIndex(employees)
+    candidates = CandidatePool(employees, roles_of=lambda e: [e["pos"]])
     for day, day_schedule in schedule.items():
         for hour_idx, _ in enumerate(day_schedule):
             for role, role_data in positions.items():
                 if "min" in role_data:
                     for _ in range(role_data["min"]):
-                        # Find an available employee for this role and hour
-                        for employee in employees:
-                            if employee["pos"] == role and is_employee_available(employee, day, hour_idx):
-                                schedule[day][hour_idx] = {
-                                    "role": role, "employee_id": employee["id"]}
-                                break
+                        # Find the least-loaded available employee for this role and hour
+                        idx = candidates.best(role, lambda i: availability.is_available(i, day, hour_idx))
+                        if idx is not None:
+                            schedule[day][hour_idx] = {
+                                "role": role, "employee_id": employees[idx]["id"]}
+                            candidates.add_load(idx)
     return schedule
 
 
-def schedule_based_on_traffic(schedule, employees, daily_traffic, positions, hours):
+def schedule_based_on_traffic(schedule, employees, daily_traffic, positions, hours, availability=None,
+                              operating_hours=None):
     # Schedule employees based on estimated guest traffic.
+    # operating_hours is a parsed Store's {day: (start, end)}; without it they are parsed from hours.
+    if availability is None:
+        availability = AvailabilityIndex(employees)
+    if operating_hours is None:
+        _, operating_hours = parse_hours(hours)
+    candidates = CandidatePool(employees, roles_of=lambda e: [e["pos"]])
     for day, day_schedule in schedule.items():
-        operating_hours = hours[day]["operatingHours"]
-        start_hour = int(operating_hours[0].split(":")[0])
-        end_hour = int(operating_hours[1].split(":")[0])
+        start_hour, end_hour = operating_hours[day]
+        traffic = daily_traffic[day]
         for hour_idx in range(start_hour, end_hour):
-            traffic_for_hour = daily_traffic[day][hour_idx]
+            # Hours past midnight read the traffic of the early hours; past the end of the list there are no guests
+            traffic_for_hour = traffic[hour_idx % 24] if hour_idx % 24 < len(traffic) else 0
             for role, role_data in positions.items():
                 required_staff = required_staff_for_guests(
                     traffic_for_hour, role_data["maxGuests"])
                 for _ in range(required_staff):
-                    # Find an available employee for this role and hour
-                    for employee in employees:
-                        if employee["pos"] == role and is_employee_available(employee, day, hour_idx):
-                            schedule[day][hour_idx] = {
-                                "role": role, "employee_id": employee["id"]}
-                            break
+                    # Find the least-loaded available employee for this role and hour
+                    idx = candidates.best(role, lambda i: availability.is_available(i, day, hour_idx))
+                    if idx is not None:
+                        schedule[day][hour_idx] = {
+                            "role": role, "employee_id": employees[idx]["id"]}
+                        candidates.add_load(idx)
     return schedule
 
 
-def complete_schedule_with_preferred_hours(schedule, employees, hours):
+def complete_schedule_with_preferred_hours(schedule, employees, hours, availability=None, operating_hours=None):
     # Schedule employees based on their preferred hours.
-    for employee in employees:
+    if availability is None:
+        availability = AvailabilityIndex(employees)
+    if operating_hours is None:
+        _, operating_hours = parse_hours(hours)
+    for idx, employee in enumerate(employees):
         preferred_hours = employee["ph"]
         hours_scheduled = sum(
             1 for _, day_schedule in schedule.items() for hour_schedule in day_schedule if hour_schedule["employee_id"] == employee["id"])
         if hours_scheduled >= preferred_hours:
             continue
         for day, day_schedule in schedule.items():
-            operating_hours = hours[day]["operatingHours"]
-            start_hour = int(operating_hours[0].split(":")[0])
-            end_hour = int(operating_hours[1].split(":")[0])
+            start_hour, end_hour = operating_hours[day]
             for hour_idx in range(start_hour, end_hour):
-                if is_employee_available(employee, day, hour_idx) and not any(s["employee_id"] == employee["id"] for s in day_schedule):
+                if availability.is_available(idx, day, hour_idx) and not any(s["employee_id"] == employee["id"] for s in day_schedule):
                     schedule[day][hour_idx] = {
                         "role": employee["pos"], "employee_id": employee["id"]}
                     hours_scheduled += 1
@@ -179,87 +195,166 @@ def complete_schedule_with_preferred_hours(schedule, employees, hours):
 # Optimization using simulated annealing
 
 
-def perturb_schedule(schedule):
-    """Perturb the given schedule to generate a new schedule."""
-    new_schedule = copy.deepcopy(schedule)
-    days = list(new_schedule.keys())
-    day = random.choice(days)
-
-    # Choose a random perturbation method
-    method = random.choice(['swap_shifts_within_day', 'swap_shifts_between_days',
-                            'change_role', 'swap_shifts_between_employees'])
-
-    if method == 'swap_shifts_within_day':
-        # Swap two time slots within the same day
-        if len(new_schedule[day]) < 2:
-            return new_schedule
-        slot1, slot2 = random.sample(new_schedule[day], 2)
-        idx1, idx2 = new_schedule[day].index(
-            slot1), new_schedule[day].index(slot2)
-        new_schedule[day][idx1], new_schedule[day][idx2] = slot2, slot1
-
-    elif method == 'swap_shifts_between_days':
-        # Swap time slots between two different days
-        day2 = random.choice(days)
-        if day2 == day or not new_schedule[day] or not new_schedule[day2]:
-            return new_schedule
-        slot1, slot2 = random.choice(
-            new_schedule[day]), random.choice(new_schedule[day2])
-        idx1, idx2 = new_schedule[day].index(
-            slot1), new_schedule[day2].index(slot2)
-        new_schedule[day][idx1], new_schedule[day2][idx2] = slot2, slot1
-
-    elif method == 'change_role':
-        # Change the role of an employee for a specific slot
-        if not new_schedule[day]:
-            return new_schedule
-        slot = random.choice(new_schedule[day])
-        roles = list(positions.keys())
-        slot["role"] = random.choice(roles)
-
-    elif method == 'swap_shifts_between_employees':
-        # Swap shifts between two employees
-        if len(new_schedule[day]) < 2:
-            return new_schedule
-        slot1, slot2 = random.sample(new_schedule[day], 2)
+class Move:
+    """
+    A single perturbation of the schedule. Moves are applied in place and undone if the annealer rejects them;
+    removed and added list the (employee_id, role) assignments the move changes, for pricing with ScheduleCost,
+    and slots the (day, index) positions it touches.
+    """
+    name = None
+
+    def __init__(self, removed=(), added=(), slots=()):
+        self.removed = removed
+        self.added = added
+        self.slots = slots
+
+    def apply(self, schedule):
+        raise NotImplementedError
+
+    def undo(self, schedule):
+        raise NotImplementedError
+
+
+class SwapShiftsWithinDay(Move):
+    """Swap two time slots within the same day."""
+    name = 'swap_shifts_within_day'
+
+    def __init__(self, day, idx1, idx2):
+        super().__init__(slots=((day, idx1), (day, idx2)))
+        self.day, self.idx1, self.idx2 = day, idx1, idx2
+
+    @classmethod
+    def propose(cls, schedule, day, positions, rng=random):
+        if len(schedule[day]) < 2:
+            return None
+        idx1, idx2 = rng.sample(range(len(schedule[day])), 2)
+        return cls(day, idx1, idx2)
+
+    def apply(self, schedule):
+        day_schedule = schedule[self.day]
+        day_schedule[self.idx1], day_schedule[self.idx2] = day_schedule[self.idx2], day_schedule[self.idx1]
+
+    undo = apply
+
+
+class SwapShiftsBetweenDays(Move):
+    """Swap time slots between two different days."""
+    name = 'swap_shifts_between_days'
+
+    def __init__(self, day1, idx1, day2, idx2):
+        super().__init__(slots=((day1, idx1), (day2, idx2)))
+        self.day1, self.idx1, self.day2, self.idx2 = day1, idx1, day2, idx2
+
+    @classmethod
+    def propose(cls, schedule, day, positions, rng=random):
+        day2 = rng.choice(list(schedule.keys()))
+        if day2 == day or not schedule[day] or not schedule[day2]:
+            return None
+        return cls(day, rng.randrange(len(schedule[day])), day2, rng.randrange(len(schedule[day2])))
+
+    def apply(self, schedule):
+        schedule[self.day1][self.idx1], schedule[self.day2][self.idx2] = (
+            schedule[self.day2][self.idx2], schedule[self.day1][self.idx1])
+
+    undo = apply
+
+
+class ChangeRole(Move):
+    """Change the role of an employee for a specific slot."""
+    name = 'change_role'
+
+    def __init__(self, day, idx, employee_id, old_role, new_role):
+        super().__init__([(employee_id, old_role)], [(employee_id, new_role)], ((day, idx),))
+        self.day, self.idx, self.old_role, self.new_role = day, idx, old_role, new_role
+
+    @classmethod
+    def propose(cls, schedule, day, positions, rng=random):
+        if not schedule[day]:
+            return None
+        idx = rng.randrange(len(schedule[day]))
+        hour_schedule = schedule[day][idx]
+        return cls(day, idx, hour_schedule["employee_id"], hour_schedule["role"], rng.choice(list(positions.keys())))
+
+    def apply(self, schedule):
+        schedule[self.day][self.idx]["role"] = self.new_role
+
+    def undo(self, schedule):
+        schedule[self.day][self.idx]["role"] = self.old_role
+
+
+class SwapShiftsBetweenEmployees(Move):
+    """Swap shifts between two employees, leaving each slot's role where it is."""
+    name = 'swap_shifts_between_employees'
+
+    def __init__(self, day, idx1, idx2, slot1, slot2):
+        employee1, role1 = slot1["employee_id"], slot1["role"]
+        employee2, role2 = slot2["employee_id"], slot2["role"]
+        super().__init__([(employee1, role1), (employee2, role2)], [(employee2, role1), (employee1, role2)],
+                         ((day, idx1), (day, idx2)))
+        self.day, self.idx1, self.idx2 = day, idx1, idx2
+
+    @classmethod
+    def propose(cls, schedule, day, positions, rng=random):
+        if len(schedule[day]) < 2:
+            return None
+        idx1, idx2 = rng.sample(range(len(schedule[day])), 2)
+        return cls(day, idx1, idx2, schedule[day][idx1], schedule[day][idx2])
+
+    def apply(self, schedule):
+        slot1, slot2 = schedule[self.day][self.idx1], schedule[self.day][self.idx2]
         slot1["employee_id"], slot2["employee_id"] = slot2["employee_id"], slot1["employee_id"]
 
+    undo = apply
+
+
+MOVES = [SwapShiftsWithinDay, SwapShiftsBetweenDays, ChangeRole, SwapShiftsBetweenEmployees]
+
+
+def propose_move(schedule, positions, rng=random):
+    """Pick a random day and perturbation method and return the Move, or None if it would be a no-op."""
+    day = rng.choice(list(schedule.keys()))
+    return rng.choice(MOVES).propose(schedule, day, positions, rng)
+
+
+def perturb_schedule(schedule, positions):
+    """Perturb the given schedule to generate a new schedule."""
+    new_schedule = copy.deepcopy(schedule)
+    move = propose_move(new_schedule, positions)
+    if move is not None:
+        move.apply(new_schedule)
     return new_schedule
 
 
-def accept_schedule(current_cost, new_cost, temp):
+def accept_schedule(current_cost, new_cost, temp, rng=random):
     """Accept the new schedule with a probability based on the current cost, new cost, and temperature."""
     if new_cost < current_cost:
         return True
-    return random.uniform(0, 1) < math.exp((current_cost - new_cost) / temp)
+    return rng.uniform(0, 1) < math.exp((current_cost - new_cost) / temp)
 
 
 def calculate_labor_cost_v2(schedule, employees, positions):
     """Calculate the total labor cost for the given schedule."""
     total_cost = 0
-    for day, roles in schedule.items():
-        for role, time_slots in roles.items():
-            for slot in time_slots:
-                if slot["empl"]:
-                    # Assuming only one employee per slot for simplicity
-                    employee_id = slot["empl"][0]
-                    employee = next(
-                        e for e in employees if e["id"] == employee_id)
-                    rate = positions[role]["hourlyRate"]
-                    total_cost += rate
+    for day, role_counts in roles_by_day(schedule).items():
+        for role, count in role_counts.items():
+            total_cost += positions[role]["hourlyRate"] * count
     return total_cost
 
 
+# Weights for a store that gives none; each term of schedule_cost_v2 counts once
+DEFAULT_WEIGHTS = {"labor_cost": 1, "fairness": 1, "preference": 1}
+
+
 def schedule_cost_v2(schedule, employees, positions, daily_traffic, weights):
     """Calculate the total cost of the schedule based on the given weights."""
     labor_cost = calculate_labor_cost_v2(schedule, employees, positions)
-    all_hours = [employee_hours(schedule, employee["id"]) for employee in employees]
+    scheduled_hours = hours_by_employee(schedule)
+    all_hours = [scheduled_hours[employee["id"]] for employee in employees]
     mean_hours = sum(all_hours) / len(all_hours)
     fairness_penalty = sum(
         (h - mean_hours)**2 for h in all_hours) / len(all_hours)
     preference_penalty = sum(
-        abs(employee_hours(schedule, employee["id"]) - employee["ph"])
-        for employee in employees
+        abs(h - employee["ph"]) for h, employee in zip(all_hours, employees)
     )
     cost = (
         labor_cost * weights.get('labor_cost', 1)
@@ -269,40 +364,392 @@ def schedule_cost_v2(schedule, employees, positions, daily_traffic, weights):
     return cost
 
 
-def simulated_annealing_v2(initial_schedule, employees, positions, daily_traffic, weights, initial_temp=1000, cooling_rate=0.995, max_iterations=10000):
-    """Schedule employees using simulated annealing."""
-    current_schedule = initial_schedule
-    current_cost = schedule_cost_v2(
-        current_schedule, employees, positions, daily_traffic, weights)
-    best_schedule = current_schedule
-    best_cost = current_cost
-    temp = initial_temp
-    for iteration in range(max_iterations):
-        new_schedule = perturb_schedule(current_schedule)
-        new_cost = schedule_cost_v2(
-            new_schedule, employees, positions, daily_traffic, weights)
-        if new_cost < current_cost or accept_schedule(current_cost, new_cost, temp):
-            current_schedule, current_cost = new_schedule, new_cost
-            if new_cost < best_cost:
-                best_schedule, best_cost = new_schedule, new_cost
+class ScheduleCost:
+    """
+    Running totals behind schedule_cost_v2 (labor cost, per-employee hours, fairness and preference sums),
+    kept up to date one assignment at a time so a perturbation can be priced in O(changed slots).
+    """
+
+    def __init__(self, schedule, employees, positions, weights):
+        self.rates = {role: role_data["hourlyRate"] for role, role_data in positions.items()}
+        self.preferred_hours = {employee["id"]: employee["ph"] for employee in employees}
+        self.labor_weight = weights.get('labor_cost', 1)
+        self.fairness_weight = weights.get('fairness', 1)
+        self.preference_weight = weights.get('preference', 1)
+
+        scheduled_hours = hours_by_employee(schedule)
+        self.hours = {employee_id: scheduled_hours[employee_id] for employee_id in self.preferred_hours}
+        self.labor_cost = calculate_labor_cost_v2(schedule, employees, positions)
+        self.hours_sum = sum(self.hours.values())
+        self.hours_squared_sum = sum(h * h for h in self.hours.values())
+        self.preference_penalty = sum(
+            abs(h - self.preferred_hours[employee_id]) for employee_id, h in self.hours.items())
+
+    def _cost(self, labor_cost, hours_sum, hours_squared_sum, preference_penalty):
+        count = len(self.hours)
+        # Population variance of the hours, same as the mean-based form in schedule_cost_v2
+        fairness_penalty = (count * hours_squared_sum - hours_sum * hours_sum) / (count * count) if count else 0
+        return (
+            labor_cost * self.labor_weight
+            + fairness_penalty * self.fairness_weight
+            + preference_penalty * self.preference_weight
+        )
+
+    def total(self):
+        """Return the current cost of the schedule, as schedule_cost_v2 would compute it."""
+        return self._cost(self.labor_cost, self.hours_sum, self.hours_squared_sum, self.preference_penalty)
+
+    def _totals_after(self, removed, added):
+        labor_cost = self.labor_cost
+        hour_changes = defaultdict(int)
+        for employee_id, role in removed:
+            labor_cost -= self.rates[role]
+            if employee_id in self.hours:
+                hour_changes[employee_id] -= 1
+        for employee_id, role in added:
+            labor_cost += self.rates[role]
+            if employee_id in self.hours:
+                hour_changes[employee_id] += 1
+
+        hours_sum, hours_squared_sum, preference_penalty = self.hours_sum, self.hours_squared_sum, self.preference_penalty
+        new_hours = {}
+        for employee_id, change in hour_changes.items():
+            if not change:
+                continue
+            old = self.hours[employee_id]
+            new = old + change
+            preferred = self.preferred_hours[employee_id]
+            hours_sum += change
+            hours_squared_sum += new * new - old * old
+            preference_penalty += abs(new - preferred) - abs(old - preferred)
+            new_hours[employee_id] = new
+        return labor_cost, hours_sum, hours_squared_sum, preference_penalty, new_hours
+
+    def delta(self, removed=(), added=()):
+        """
+        Return how much the cost would change if the removed (employee_id, role) assignments were dropped
+        and the added ones scheduled, without changing the running totals.
+        """
+        labor_cost, hours_sum, hours_squared_sum, preference_penalty, _ = self._totals_after(removed, added)
+        return self._cost(labor_cost, hours_sum, hours_squared_sum, preference_penalty) - self.total()
+
+    def apply(self, removed=(), added=()):
+        """Commit a change previously priced with delta and return the new total cost."""
+        (self.labor_cost, self.hours_sum, self.hours_squared_sum,
+         self.preference_penalty, new_hours) = self._totals_after(removed, added)
+        self.hours.update(new_hours)
+        return self.total()
+
+
+# Accepted moves a BestSchedule logs before it falls back to snapshotting the best schedule
+MAX_UNDO_LOG = 100000
+
+
+class BestSchedule:
+    """
+    The best schedule seen by a search that changes one schedule in place. Instead of copying the schedule each
+    time the search moves away from its best, the moves applied since are logged and the best is rebuilt by undoing
+    them, only when it is asked for. If the log grows past max_log moves the best is snapshotted once instead.
+    """
+
+    def __init__(self, schedule, cost, max_log=MAX_UNDO_LOG):
+        self.schedule = schedule
+        self.cost = cost
+        self.max_log = max_log
+        self.log = []
+        self.snapshot = None
+
+    def is_current(self):
+        """Check whether the live schedule is the best one."""
+        return self.snapshot is None and not self.log
+
+    def applied(self, move, new_cost):
+        """Record a move just applied to the live schedule, which now costs new_cost."""
+        if new_cost <= self.cost:
+            self.cost, self.log, self.snapshot = new_cost, [], None
+        elif self.snapshot is None:
+            self.log.append(move)
+            if len(self.log) > self.max_log:
+                self.snapshot = self.copy()
+                self.log = []
+
+    def copy(self):
+        """Return a copy of the best schedule, leaving the live schedule as it is."""
+        if self.snapshot is not None:
+            return copy.deepcopy(self.snapshot)
+        for move in reversed(self.log):
+            move.undo(self.schedule)
+        best = copy.deepcopy(self.schedule)
+        for move in self.log:
+            move.apply(self.schedule)
+        return best
+
+    def result(self):
+        """Return the best schedule, rolling the live schedule back to it; the search must not go on afterwards."""
+        if self.snapshot is not None:
+            return self.snapshot
+        for move in reversed(self.log):
+            move.undo(self.schedule)
+        self.log = []
+        return self.schedule
+
+
+def anneal_steps(schedule, cost_model, positions, temp, cooling_rate, iterations, rng=random, observer=None,
+                 best=None):
+    """
+    Run annealing steps on the schedule in place, starting from temp, and return (best, temp), where best is the
+    BestSchedule tracking the best schedule seen. Pass best back in to carry a search on across calls.
+    If given, observer.step(move, accepted, temp, current_cost, best_cost) is called after every proposed move.
+    """
+    current_cost = cost_model.total()
+    if best is None:
+        best = BestSchedule(schedule, current_cost)
+    for iteration in range(iterations):
+        move = propose_move(schedule, positions, rng)
+        if move is not None:
+            new_cost = current_cost + cost_model.delta(move.removed, move.added)
+            if new_cost < current_cost or accept_schedule(current_cost, new_cost, temp, rng):
+                move.apply(schedule)
+                current_cost = cost_model.apply(move.removed, move.added)
+                best.applied(move, current_cost)
+                accepted = True
+            else:
+                accepted = False
+            if observer is not None:
+                observer.step(move, accepted, temp, current_cost, best.cost)
         temp *= cooling_rate
-    return best_schedule
+    return best, temp
 
 
-def perturb_schedule(schedule):
-    """Perturb the given schedule to generate a new schedule."""
-    new_schedule = copy.deepcopy(schedule)
-    method = random.choice(['swap_shifts_within_day', 'swap_shifts_between_days',
-    'change_role', 'swap_shifts_between_employees'])
-    ...
-    return new_schedule
+# Move kinds as anneal_batched draws them, in MOVES order
+WITHIN_DAY, BETWEEN_DAYS, CHANGE_ROLE, BETWEEN_EMPLOYEES = range(len(MOVES))
 
 
-def accept_schedule(current_cost, new_cost, temp):
-    """Accept the new schedule with a probability based on the current cost, new cost, and temperature."""
-    if new_cost < current_cost:
-        return True
-    return random.uniform(0, 1) < math.exp((current_cost - new_cost) / temp)
+def _replay_step(schedule, step):
+    """Apply, or with the roles swapped back undo, one (kind, ...) step recorded by anneal_batched."""
+    kind = step[0]
+    if kind == CHANGE_ROLE:
+        schedule[step[1]][step[2]]["role"] = step[4]
+    elif kind == BETWEEN_EMPLOYEES:
+        slot1, slot2 = schedule[step[1]][step[2]], schedule[step[1]][step[3]]
+        slot1["employee_id"], slot2["employee_id"] = slot2["employee_id"], slot1["employee_id"]
+    else:
+        day1, day2 = schedule[step[1]], schedule[step[3]]
+        day1[step[2]], day2[step[4]] = day2[step[4]], day1[step[2]]
+
+
+class StepBatch:
+    """The steps anneal_batched accepted in a row, logged with a BestSchedule as a single move."""
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def apply(self, schedule):
+        for step in self.steps:
+            _replay_step(schedule, step)
+
+    def undo(self, schedule):
+        for step in reversed(self.steps):
+            if step[0] == CHANGE_ROLE:
+                step = (CHANGE_ROLE, step[1], step[2], step[4], step[3])
+            _replay_step(schedule, step)
+
+
+def anneal_batched(schedule, cost_model, positions, temp, cooling_rate, iterations, batch_size=256, rng=random,
+                   observer=None, best=None):
+    """
+    Like anneal_steps, and returning (best, temp) the same way, but without a Move object or a ScheduleCost call
+    per step. Random numbers are drawn batch_size steps at a time, and steps are priced from the rate table: of
+    the moves in MOVES only ChangeRole changes the cost, since the others leave every employee's hours and the
+    set of roles worked unchanged. Steps are still accepted one at a time, so the search is the one anneal_steps
+    runs. observer.step is called with move None.
+    """
+    days = list(schedule.keys())
+    day_schedules = [schedule[day] for day in days]
+    day_count = len(days)
+    roles = list(positions.keys())
+    role_count = len(roles)
+    rates, labor_weight = cost_model.rates, cost_model.labor_weight
+    draw, exp = rng.random, math.exp
+    current_cost = cost_model.total()
+    if best is None:
+        best = BestSchedule(schedule, current_cost)
+
+    done = 0
+    while done < iterations:
+        count = min(batch_size, iterations - done)
+        done += count
+        draws = [draw() for _ in range(4 * count)]
+        steps = []
+        best_cost, best_at = best.cost, None
+        draws = iter(draws)
+        for day_draw, kind_draw, draw1, draw2 in zip(draws, draws, draws, draws):
+            day_index = int(day_draw * day_count)
+            kind = int(kind_draw * 4)
+            day_schedule = day_schedules[day_index]
+            size = len(day_schedule)
+            step = None
+            if kind == CHANGE_ROLE:
+                if size:
+                    idx = int(draw1 * size)
+                    old_role = day_schedule[idx]["role"]
+                    new_role = roles[int(draw2 * role_count)]
+                    rate_change = rates[new_role] - rates[old_role]
+                    delta = rate_change * labor_weight
+                    if delta <= 0 or draw() < exp(-delta / temp):
+                        day_schedule[idx]["role"] = new_role
+                        cost_model.labor_cost += rate_change
+                        current_cost += delta
+                        step = (CHANGE_ROLE, days[day_index], idx, old_role, new_role)
+                    elif observer is not None:
+                        observer.step(None, False, temp, current_cost, best_cost)
+            elif kind == BETWEEN_DAYS:
+                other_index = int(draw1 * day_count)
+                other = day_schedules[other_index]
+                if other_index != day_index and size and other:
+                    spread = draw2 * size
+                    idx1 = int(spread)
+                    idx2 = int((spread - idx1) * len(other))
+                    day_schedule[idx1], other[idx2] = other[idx2], day_schedule[idx1]
+                    step = (BETWEEN_DAYS, days[day_index], idx1, days[other_index], idx2)
+            elif size >= 2:
+                idx1 = int(draw1 * size)
+                idx2 = int(draw2 * (size - 1))
+                if idx2 >= idx1:
+                    idx2 += 1
+                if kind == WITHIN_DAY:
+                    day_schedule[idx1], day_schedule[idx2] = day_schedule[idx2], day_schedule[idx1]
+                    step = (WITHIN_DAY, days[day_index], idx1, days[day_index], idx2)
+                else:
+                    slot1, slot2 = day_schedule[idx1], day_schedule[idx2]
+                    slot1["employee_id"], slot2["employee_id"] = slot2["employee_id"], slot1["employee_id"]
+                    step = (BETWEEN_EMPLOYEES, days[day_index], idx1, idx2)
+            if step is not None:
+                steps.append(step)
+                if current_cost <= best_cost:
+                    best_cost, best_at = current_cost, len(steps)
+                if observer is not None:
+                    observer.step(None, True, temp, current_cost, best_cost)
+            temp *= cooling_rate
+        if best_at is not None:
+            best.applied(StepBatch(steps[:best_at]), best_cost)
+            steps = steps[best_at:]
+        if steps:
+            best.applied(StepBatch(steps), current_cost)
+        current_cost = cost_model.total()
+    return best, temp
+
+
+def simulated_annealing_v2(initial_schedule, employees, positions, daily_traffic, weights, initial_temp=1000, cooling_rate=0.995, max_iterations=10000, rng=random, observer=None):
+    """Schedule employees using simulated annealing."""
+    # Work on one private copy; moves are priced first and only then applied in place
+    current_schedule = copy.deepcopy(initial_schedule)
+    cost_model = ScheduleCost(current_schedule, employees, positions, weights)
+    best, _ = anneal_steps(
+        current_schedule, cost_model, positions, initial_temp, cooling_rate, max_iterations, rng, observer)
+    return best.result()
+
+
+def simulated_annealing_batched(initial_schedule, employees, positions, daily_traffic, weights, batch_size=256,
+                                initial_temp=1000, cooling_rate=0.995, max_iterations=10000, rng=random, observer=None):
+    """Schedule employees using simulated annealing, running the steps through anneal_batched."""
+    current_schedule = copy.deepcopy(initial_schedule)
+    cost_model = ScheduleCost(current_schedule, employees, positions, weights)
+    best, _ = anneal_batched(
+        current_schedule, cost_model, positions, initial_temp, cooling_rate, max_iterations, batch_size, rng, observer)
+    return best.result()
+
+
+def anneal_anytime(initial_schedule, employees, positions, daily_traffic, weights, time_budget=2.0, initial_temp=1000,
+                   initial_acceptance=0.5, final_acceptance=0.01, window=200, stagnation_limit=20000,
+                   report_interval=0.05, max_iterations=None, should_stop=None, rng=random, clock=time.monotonic,
+                   observer=None):
+    """
+    Anneal within a time budget, yielding (best, best_cost) as the best schedule improves, where best is the
+    search's BestSchedule: best.copy() gives the best schedule so far without disturbing the search, and once the
+    search is over best.result() gives the final one. Nothing is copied unless a caller asks.
+
+    The starting cost is yielded straight away, then improvements at most every report_interval seconds, and the
+    final best once when the search ends: when time_budget seconds have passed (None for no deadline), after
+    stagnation_limit steps without a new best, after max_iterations steps, or once should_stop() returns True.
+
+    Rather than a fixed geometric schedule, the temperature is rescaled every window uphill moves so the acceptance
+    rate of uphill moves tracks a target that falls from initial_acceptance to final_acceptance as the time budget
+    (or max_iterations) runs out. observer is called as in anneal_steps.
+    """
+    start = clock()
+    deadline = math.inf if time_budget is None else start + time_budget
+    schedule = copy.deepcopy(initial_schedule)
+    cost_model = ScheduleCost(schedule, employees, positions, weights)
+    current_cost = cost_model.total()
+    best = BestSchedule(schedule, current_cost)
+    temp = initial_temp
+
+    yield best, best.cost
+    reported_cost, last_report = best.cost, start
+
+    now = start
+    iteration = since_improvement = uphill = accepted_uphill = 0
+    while since_improvement < stagnation_limit and (max_iterations is None or iteration < max_iterations):
+        if iteration % 64 == 0:
+            now = clock()
+            if now >= deadline or (should_stop is not None and should_stop()):
+                break
+            if best.cost < reported_cost and now - last_report >= report_interval:
+                yield best, best.cost
+                reported_cost, last_report = best.cost, now
+        iteration += 1
+        since_improvement += 1
+
+        move = propose_move(schedule, positions, rng)
+        if move is None:
+            continue
+        delta = cost_model.delta(move.removed, move.added)
+        new_cost = current_cost + delta
+        if delta > 0:
+            uphill += 1
+        if new_cost < current_cost or accept_schedule(current_cost, new_cost, temp, rng):
+            if delta > 0:
+                accepted_uphill += 1
+            if new_cost < best.cost:
+                since_improvement = 0
+            move.apply(schedule)
+            current_cost = cost_model.apply(move.removed, move.added)
+            best.applied(move, current_cost)
+            accepted = True
+        else:
+            accepted = False
+        if observer is not None:
+            observer.step(move, accepted, temp, current_cost, best.cost)
+
+        if uphill >= window:
+            if time_budget:
+                progress = min(1, (now - start) / time_budget)
+            elif max_iterations:
+                progress = iteration / max_iterations
+            else:
+                progress = 1
+            target = initial_acceptance * (final_acceptance / initial_acceptance) ** progress
+            # Uphill moves are accepted with probability about exp(-delta / temp), so scaling temp by
+            # log(rate) / log(target) moves the acceptance rate onto the target
+            rate = min(max(accepted_uphill / uphill, 1 / window), 1 - 1 / window)
+            temp *= math.log(rate) / math.log(target)
+            uphill = accepted_uphill = 0
+
+    yield best, best.cost
+
+
+def simulated_annealing_anytime(initial_schedule, employees, positions, daily_traffic, weights, time_budget=2.0,
+                                callback=None, **kwargs):
+    """
+    Return the best schedule found by anneal_anytime within time_budget seconds,
+    calling callback(best, best_cost) each time it reports an improvement (best.copy() is the schedule so far).
+    """
+    for best, best_cost in anneal_anytime(
+            initial_schedule, employees, positions, daily_traffic, weights, time_budget, **kwargs):
+        if callback is not None:
+            callback(best, best_cost)
+    return best.result()
 
 
 ##############################################################################################################
@@ -321,33 +768,102 @@ def employee_hours(schedule, employee_id):
     return hours
 
 
-def evaluate_schedule(schedule, employees, hours, positions):
-    """Evaluate the schedule based on certain criteria."""
+def hours_by_employee(schedule):
+    """Return a Counter of scheduled hours per employee id, built in one pass over the schedule."""
+    if isinstance(schedule, CompactSchedule):
+        return schedule.employee_hours()
+    return Counter(hour_schedule["employee_id"] for day_schedule in schedule.values() for hour_schedule in day_schedule)
+
+
+def roles_by_day(schedule):
+    """Return {day: Counter of assignments per role}, built in one pass over the schedule."""
+    if isinstance(schedule, CompactSchedule):
+        return {day: schedule.role_counts(day) for day in schedule}
+    return {day: Counter(hour_schedule["role"] for hour_schedule in day_schedule) for day, day_schedule in schedule.items()}
+
+
+def day_shifts(schedule, day):
+    """Yield (employee_id, role, start, end) in minutes for each assignment on the given day."""
+    if isinstance(schedule, CompactSchedule):
+        yield from schedule.shifts(day)
+        return
+    for hour_schedule in schedule[day]:
+        start, end = window_minutes(hour_schedule["slot"])
+        yield hour_schedule["employee_id"], hour_schedule["role"], start, end
+
+
+def hourly_coverage(schedule):
+    """Return a Counter of staff on shift per (day, hour, role), from each assignment's slot."""
+    coverage = Counter()
+    for day in schedule:
+        for _, role, start, end in day_shifts(schedule, day):
+            # Every hour the shift touches, so a 10:30 start counts towards the 10:00 hour
+            for hour in range(start // 60, -(-end // 60)):
+                coverage[day, hour, role] += 1
+    return coverage
+
+
+def coverage_shortfalls(schedule, demand):
+    """
+    Return [day, hour, role, missing] for every hour where fewer staff are on shift than demand asks for.
+    demand is {day: {role: seats needed at each hour}}, as in a Store's demand arrays.
+    """
+    coverage = hourly_coverage(schedule)
+    shortfalls = []
+    for day, roles in demand.items():
+        for role, seats in roles.items():
+            for hour, needed in enumerate(seats):
+                missing = needed - coverage[day, hour, role]
+                if missing > 0:
+                    shortfalls.append([day, hour, role, missing])
+    return shortfalls
+
+
+def evaluate_schedule(schedule, employees, hours, positions, min_break=MIN_BREAK_HOURS, demand=None):
+    """
+    Evaluate the schedule based on certain criteria. Given per-hour demand ({day: {role: seats per hour}}, a
+    Store's demand), hours short of staff are reported too.
+    """
     evaluation_results = {}
-    total_hours_scheduled = sum(employee_hours(
-        schedule, employee["id"]) for employee in employees)
+    scheduled_hours = hours_by_employee(schedule)
+    total_hours_scheduled = sum(scheduled_hours[employee["id"]] for employee in employees)
     desired_hours = sum(employee["ph"] for employee in employees)
     hours_difference = total_hours_scheduled - desired_hours
     evaluation_results["hours_difference"] = hours_difference
 
     # Ensure mandatory roles are always scheduled
+    day_roles = roles_by_day(schedule)
     mandatory_roles_met = all(
-        any(hour_schedule["role"] == role for hour_schedule in day_schedule)
+        role_counts[role] > 0
         for role, role_data in positions.items() if "min" in role_data
-        for _, day_schedule in schedule.items()
+        for role_counts in day_roles.values()
     )
     evaluation_results["mandatory_roles_met"] = mandatory_roles_met
 
     # Ensure employees are not over-scheduled
     over_scheduled_employees = [
-        employee["id"] for employee in employees if employee_hours(schedule, employee["id"]) > employee["maxh"]]
+        employee["id"] for employee in employees if scheduled_hours[employee["id"]] > employee["maxh"]]
     evaluation_results["over_scheduled_employees"] = over_scheduled_employees
 
-    # Ensure employees get their breaks
-    breaks_enforced = enforce_breaks(
-        [hour_schedule for _, day_schedule in schedule.items() for hour_schedule in day_schedule])
+    # Ensure employees get their breaks, including overnight from one day to the next
+    breaks = BreakIndex(min_break)
+    breaks_enforced = True
+    for day in schedule:
+        day_offset = DAY_MINUTES * day_to_index(day)
+        for employee_id, _, start, end in day_shifts(schedule, day):
+            if not breaks.try_add(employee_id, day_offset + start, day_offset + end):
+                breaks_enforced = False
+                break
+        if not breaks_enforced:
+            break
     evaluation_results["breaks_enforced"] = breaks_enforced
 
+    # Ensure every hour has the staff its traffic calls for
+    if demand is not None:
+        shortfalls = coverage_shortfalls(schedule, demand)
+        evaluation_results["coverage_met"] = not shortfalls
+        evaluation_results["coverage_shortfalls"] = shortfalls
+
     return evaluation_results
 
 
@@ -369,35 +885,260 @@ def manual_override(schedule, day, slot, employee_id, role):
     return schedule
 
 
-def find_replacement(schedule, day, slot, role, employees, positions):
+def find_replacement(schedule, day, slot, role, employees, positions, availability=None,
+                     granularity=DEFAULT_GRANULARITY):
     """
     Find a suitable replacement for a given slot and role on a specific day.
     """
-    for employee in employees:
-        if role in employee["roles"] and is_employee_available(employee, day, int(slot.split('-')[0].split(':')[0])):
+    if availability is None:
+        availability = AvailabilityIndex(employees, granularity)
+    start, end = window_minutes(slot)
+    for idx, employee in enumerate(employees):
+        if role in employee["roles"] and availability.covers(idx, day, start, end):
             schedule = manual_override(
                 schedule, day, slot, employee["id"], role)
             break
     return schedule
 
 
-def rebalance_schedule(schedule, employees, hours, positions):
+class RepairContext:
+    """
+    Indexes over a schedule (availability, hours, breaks and running cost) for re-filling individual assignments
+    in place, so a change only touches the assignments it affects instead of re-running the whole pipeline.
+    Released assignments keep their entry in the schedule until they are re-filled or dropped. granularity is the
+    store's, so availability is checked on the same timeline the schedule was built on.
+    """
+
+    def __init__(self, schedule, employees, positions, weights=None, min_break=MIN_BREAK_HOURS, max_evaluations=5000,
+                 granularity=DEFAULT_GRANULARITY):
+        self.schedule = schedule
+        self.employees = employees
+        self.position = {employee["id"]: idx for idx, employee in enumerate(employees)}
+        self.availability = AvailabilityIndex(employees, granularity)
+        self.hours = hours_by_employee(schedule)
+        self.cost = ScheduleCost(schedule, employees, positions, weights or {})
+        self.breaks = BreakIndex(min_break)
+        for day in schedule:
+            day_offset = DAY_MINUTES * day_to_index(day)
+            for employee_id, _, start, end in day_shifts(schedule, day):
+                self.breaks.add(employee_id, day_offset + start, day_offset + end)
+        self.max_evaluations = max_evaluations
+        self.evaluations = 0
+        self.released = set()
+        self.pinned = set()
+
+    def _shift(self, day, slot):
+        start, end = window_minutes(slot)
+        day_offset = DAY_MINUTES * day_to_index(day)
+        return start, end, day_offset + start, day_offset + end
+
+    def release(self, day, idx):
+        """Take an assignment's employee off the books, leaving the entry to be re-filled."""
+        hour_schedule = self.schedule[day][idx]
+        employee_id, role = hour_schedule["employee_id"], hour_schedule["role"]
+        _, _, start, end = self._shift(day, hour_schedule["slot"])
+        self.hours[employee_id] -= 1
+        self.breaks.remove(employee_id, start, end)
+        self.cost.apply([(employee_id, role)], [])
+        self.released.add((day, idx))
+
+    def assign(self, day, idx, employee_id, role):
+        """Fill a released assignment with the given employee and role."""
+        hour_schedule = self.schedule[day][idx]
+        hour_schedule["employee_id"], hour_schedule["role"] = employee_id, role
+        _, _, start, end = self._shift(day, hour_schedule["slot"])
+        self.hours[employee_id] += 1
+        self.breaks.add(employee_id, start, end)
+        self.cost.apply([], [(employee_id, role)])
+        self.released.discard((day, idx))
+
+    def can_work(self, employee_id, day, slot, role):
+        """Check every hard constraint for giving the employee this slot: role, availability, max hours and breaks."""
+        self.evaluations += 1
+        idx = self.position.get(employee_id)
+        if idx is None:
+            return False
+        employee = self.employees[idx]
+        start, end, week_start, week_end = self._shift(day, slot)
+        return (role in employee_roles(employee)
+                and self.availability.covers(idx, day, start, end)
+                and self.hours[employee_id] + 1 <= employee["maxh"]
+                and self.breaks.can_add(employee_id, week_start, week_end))
+
+    def best_replacement(self, day, slot, role, exclude=()):
+        """Return the id of the eligible employee who adds the least cost to the schedule, or None."""
+        start, end = window_minutes(slot)
+        best_id, best_delta = None, None
+        for idx in members(self.availability.available_set(day, start, end, role)):
+            employee_id = self.employees[idx]["id"]
+            if employee_id in exclude or not self.can_work(employee_id, day, slot, role):
+                continue
+            delta = self.cost.delta([], [(employee_id, role)])
+            if best_delta is None or delta < best_delta:
+                best_id, best_delta = employee_id, delta
+        return best_id
+
+    def refill(self, day, idx, exclude=(), depth=1):
+        """
+        Re-fill a released assignment with the cheapest eligible employee. If nobody is free, try moving someone
+        off another shift that day and re-filling that one in turn, up to depth levels and max_evaluations checks.
+        """
+        hour_schedule = self.schedule[day][idx]
+        slot, role = hour_schedule["slot"], hour_schedule["role"]
+        employee_id = self.best_replacement(day, slot, role, exclude)
+        if employee_id is not None:
+            self.assign(day, idx, employee_id, role)
+            return True
+        if depth == 0:
+            return False
+        for other_idx in range(len(self.schedule[day])):
+            if self.evaluations >= self.max_evaluations:
+                break
+            if other_idx == idx or (day, other_idx) in self.released or (day, other_idx) in self.pinned:
+                continue
+            other = self.schedule[day][other_idx]
+            other_id, other_role = other["employee_id"], other["role"]
+            if other_id in exclude:
+                continue
+            self.release(day, other_idx)
+            if self.can_work(other_id, day, slot, role):
+                self.assign(day, idx, other_id, role)
+                if self.refill(day, other_idx, exclude, depth - 1):
+                    return True
+                self.release(day, idx)
+            self.assign(day, other_idx, other_id, other_role)
+        return False
+
+    def drop_released(self):
+        """Remove assignments that are still released from the schedule and return them."""
+        dropped = []
+        for day, idx in sorted(self.released, key=lambda entry: (entry[0], -entry[1])):
+            hour_schedule = self.schedule[day][idx]
+            dropped.append({"day": day, "slot": hour_schedule["slot"], "role": hour_schedule["role"]})
+            del self.schedule[day][idx]
+        self.released.clear()
+        return dropped
+
+
+def repair_schedule(schedule, employees, hours, positions, changes, weights=None, min_break=MIN_BREAK_HOURS,
+                    max_evaluations=5000, granularity=DEFAULT_GRANULARITY):
+    """
+    Apply a change set to the schedule in place and re-fill only the assignments it affects.
+
+    Each change is a dict:
+        {"type": "callout", "employee_id": id, "day": day}  (leave out "day" for the whole week)
+        {"type": "availability", "employee_id": id, "availability": {day: "open" | "off" | "H:MM-H:MM"}}
+        {"type": "override", "day": day, "slot": slot, "employee_id": id, "role": role}
+
+    Affected assignments get the cheapest replacement that keeps every hard constraint evaluate_schedule checks,
+    using a bounded local search when nobody is free. Overrides are kept as given. Returns the schedule and a list
+    of {"day", "slot", "role"} assignments that could not be re-filled and were dropped. Pass the store's
+    granularity for schedules on a 30- or 15-minute grid.
+    """
+    # Callouts and new availability only change who can be picked, so apply them to a copy of the roster
+    roster = {employee["id"]: employee for employee in employees}
+    called_out = defaultdict(set)
+    for change in changes:
+        change_type = change.get("type")
+        if change_type == "override":
+            continue
+        if change_type not in ("callout", "availability"):
+            raise ValueError(f"Unknown change type: {change_type}")
+        employee_id = change.get("employee_id")
+        if employee_id not in roster:
+            raise ValueError(f"Unknown employee in {change_type} change: {employee_id!r}")
+        employee = dict(roster[employee_id])
+        availability = dict(normalize_availability(employee))
+        if change_type == "callout":
+            for day in [change["day"]] if "day" in change else list(schedule):
+                availability[day] = "off"
+                called_out[day].add(employee_id)
+        else:
+            availability.update(change["availability"])
+        employee["availability"] = availability
+        roster[employee_id] = employee
+    employees = list(roster.values())
+
+    # Overrides pin the first assignment in their slot; check they all exist before changing anything
+    overrides = []
+    for change in changes:
+        if change.get("type") == "override":
+            day, slot = change["day"], change["slot"]
+            idx = next((idx for idx, hour_schedule in enumerate(schedule.get(day, ()))
+                        if hour_schedule.get("slot") == slot), None)
+            if idx is None:
+                raise ValueError(f"No {slot} slot scheduled on {day} to override")
+            overrides.append((change, idx))
+    for change, _ in overrides:
+        manual_override(schedule, change["day"], change["slot"], change["employee_id"], change["role"])
+
+    context = RepairContext(schedule, employees, positions, weights, min_break, max_evaluations, granularity)
+    for change, idx in overrides:
+        context.pinned.add((change["day"], idx))
+
+    # Release every assignment the changes made infeasible
+    for day, day_schedule in schedule.items():
+        for idx, hour_schedule in enumerate(day_schedule):
+            if (day, idx) in context.pinned:
+                continue
+            employee_id = hour_schedule["employee_id"]
+            start, end = window_minutes(hour_schedule["slot"])
+            position = context.position.get(employee_id)
+            if employee_id in called_out[day] or (position is not None and not context.availability.covers(position, day, start, end)):
+                context.release(day, idx)
+    # An override can leave its employee without a break next to another shift, or one shift over their hours;
+    # free up just those shifts
+    for change, _ in overrides:
+        employee_id = change["employee_id"]
+        _, _, override_start, override_end = context._shift(change["day"], change["slot"])
+        others = [(day, idx) for day, day_schedule in schedule.items() for idx, hour_schedule in enumerate(day_schedule)
+                  if hour_schedule["employee_id"] == employee_id
+                  and (day, idx) not in context.pinned and (day, idx) not in context.released]
+        for day, idx in others:
+            _, _, start, end = context._shift(day, schedule[day][idx]["slot"])
+            if start - override_end < min_break * 60 and override_start - end < min_break * 60:
+                context.release(day, idx)
+        employee = roster.get(employee_id)
+        others = [entry for entry in others if entry not in context.released]
+        if employee is not None and others and context.hours[employee_id] - 1 == employee["maxh"]:
+            context.release(*others[-1])
+
+    for day, idx in sorted(context.released):
+        context.refill(day, idx, called_out[day])
+    return schedule, context.drop_released()
+
+
+def rebalance_schedule(schedule, employees, hours, positions, weights=None, min_break=MIN_BREAK_HOURS,
+                       granularity=DEFAULT_GRANULARITY):
     """
     Rebalance the schedule after manual adjustments.
     """
-    # ... (This function will be quite involved, considering all the constraints)
+    # Hand over-scheduled employees' extra shifts, and shifts in roles people aren't trained for, to whoever is
+    # cheapest and still within every hard constraint; anything that can't be moved stays as it was
+    context = RepairContext(schedule, employees, positions, weights, min_break, granularity=granularity)
+    employees_by_id = {employee["id"]: employee for employee in employees}
+    for day, day_schedule in schedule.items():
+        for idx, hour_schedule in enumerate(day_schedule):
+            employee = employees_by_id.get(hour_schedule["employee_id"])
+            if employee is None:
+                continue
+            if context.hours[employee["id"]] > employee["maxh"] or hour_schedule["role"] not in employee_roles(employee):
+                context.release(day, idx)
+                if not context.refill(day, idx, {employee["id"]}):
+                    context.assign(day, idx, employee["id"], hour_schedule["role"])
     return schedule
 
 
-def correct_roles(schedule, employees, positions):
+def correct_roles(schedule, employees, positions, granularity=DEFAULT_GRANULARITY):
     """
     Ensure no employee is scheduled for a role they're not trained for.
     """
+    availability = AvailabilityIndex(employees, granularity)
+    employees_by_id = {employee["id"]: employee for employee in employees}
     for day, day_schedule in schedule.items():
         for hour_schedule in day_schedule:
-            employee = next(
-                e for e in employees if e["id"] == hour_schedule["employee_id"])
+            employee = employees_by_id[hour_schedule["employee_id"]]
             if hour_schedule["role"] not in employee["roles"]:
                 schedule = find_replacement(
-                    schedule, day, hour_schedule["slot"], hour_schedule["role"], employees, positions)
+                    schedule, day, hour_schedule["slot"], hour_schedule["role"], employees, positions, availability)
     return schedule
@@ -0,0 +1,76 @@
+"""
+Role-indexed candidate lookup for the greedy scheduling phase.
+
+Employees are grouped by role into heaps keyed by how much work they have been given so far, so each greedy fill
+step takes the least-loaded eligible employee for a role without scanning the whole roster. Loads are updated as
+assignments are made, which keeps the fairness ordering current instead of sorting once up front.
+"""
+
+import heapq
+
+from availability import employee_roles
+
+
+class CandidatePool:
+    """Per-role heaps of (load, employee index) for a list of employees, addressed by their position in that list."""
+
+    def __init__(self, employees, roles_of=employee_roles):
+        self.load = [0] * len(employees)
+        self.heaps = {}
+        self.roles = []
+        for idx, employee in enumerate(employees):
+            roles = list(roles_of(employee))
+            self.roles.append(roles)
+            for role in roles:
+                # Ties go to the employee listed first, like a stable sort of the roster
+                self.heaps.setdefault(role, []).append((0, idx))
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def fill(self, role, eligible=None):
+        """
+        Yield employees for the role that pass eligible(idx), least-loaded first, for filling several seats in a row.
+        Employees found ineligible are set aside until the generator is closed and then pushed back, so each one is
+        rejected at most once per fill.
+        """
+        heap = self.heaps.get(role)
+        if not heap:
+            return
+        skipped = []
+        try:
+            while heap:
+                load, idx = heapq.heappop(heap)
+                if load != self.load[idx]:
+                    # Stale entry left behind by add_load
+                    continue
+                skipped.append((load, idx))
+                if eligible is None or eligible(idx):
+                    yield idx
+        finally:
+            for item in skipped:
+                if item[0] == self.load[item[1]]:
+                    heapq.heappush(heap, item)
+
+    def best(self, role, eligible=None):
+        """Return the index of the least-loaded employee for the role that passes eligible(idx), or None."""
+        candidates = self.fill(role, eligible)
+        try:
+            return next(candidates, None)
+        finally:
+            candidates.close()
+
+    def add_load(self, idx, amount=1):
+        """Record that employee number idx was given more work, re-keying them in each of their role heaps."""
+        self.load[idx] += amount
+        for role in self.roles[idx]:
+            heapq.heappush(self.heaps[role], (self.load[idx], idx))
+
+    def entries(self):
+        """Return the number of heap entries, stale ones included."""
+        return sum(map(len, self.heaps.values()))
+
+    def compact(self):
+        """Drop the stale and duplicate entries add_load leaves behind, for pools kept across many fills."""
+        for heap in self.heaps.values():
+            heap[:] = {item for item in heap if item[0] == self.load[item[1]]}
+            heapq.heapify(heap)
@@ -0,0 +1,319 @@
+"""
+Compact, array-backed storage for weekly schedules.
+
+A CompactSchedule behaves like the usual {day: [{"employee_id", "role", "slot"}, ...]} dict, so the scheduling and
+evaluation functions in calculateschedule.py run on it unchanged. Underneath, every assignment is one row of three
+integer columns (employee, role and slot indices into interned tables) and each day is an array of row numbers,
+which takes a few bytes per assignment instead of a dict each. Slot strings are parsed once, when interned.
+Rows are reference counted, so those a day no longer holds (after schedule[day] = ..., an entry overwritten or
+deleted) are reused for new assignments instead of the columns growing with every change.
+"""
+
+from array import array
+from collections import Counter
+from collections.abc import Mapping, MutableMapping, MutableSequence
+
+from availability import window_minutes
+
+
+ENTRY_KEYS = ("employee_id", "role", "slot")
+NO_SLOT = -1
+
+
+def slot_minutes(slot):
+    """Parse a "HH:MM-HH:MM" slot into (start, end) minutes since midnight; a slot past midnight ends after 1440."""
+    return window_minutes(slot)
+
+
+class CompactEntry(MutableMapping):
+    """A live view of one assignment row; reads and writes go straight to the schedule's columns."""
+    __slots__ = ("schedule", "entry_id")
+
+    def __init__(self, schedule, entry_id):
+        self.schedule = schedule
+        self.entry_id = entry_id
+
+    def __getitem__(self, key):
+        schedule, entry_id = self.schedule, self.entry_id
+        if key == "employee_id":
+            return schedule.employee_ids[schedule.entry_employee[entry_id]]
+        if key == "role":
+            return schedule.roles[schedule.entry_role[entry_id]]
+        if key == "slot" and schedule.entry_slot[entry_id] != NO_SLOT:
+            return schedule.slots[schedule.entry_slot[entry_id]]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        schedule, entry_id = self.schedule, self.entry_id
+        if key == "employee_id":
+            schedule.entry_employee[entry_id] = schedule.employee_index(value)
+        elif key == "role":
+            schedule.entry_role[entry_id] = schedule.role_index(value)
+        elif key == "slot":
+            schedule.entry_slot[entry_id] = schedule.slot_index(value)
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        if key != "slot":
+            raise KeyError(key)
+        self.schedule.entry_slot[self.entry_id] = NO_SLOT
+
+    def __iter__(self):
+        if self.schedule.entry_slot[self.entry_id] == NO_SLOT:
+            return iter(ENTRY_KEYS[:2])
+        return iter(ENTRY_KEYS)
+
+    def __len__(self):
+        return 2 if self.schedule.entry_slot[self.entry_id] == NO_SLOT else 3
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactDay(MutableSequence):
+    """A live view of one day's assignments, in order."""
+    __slots__ = ("schedule", "order")
+
+    def __init__(self, schedule, order):
+        self.schedule = schedule
+        self.order = order
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [CompactEntry(self.schedule, entry_id) for entry_id in self.order[idx]]
+        return CompactEntry(self.schedule, self.order[idx])
+
+    def __setitem__(self, idx, value):
+        schedule = self.schedule
+        if isinstance(idx, slice):
+            new = array('i', (schedule.entry_for(v) for v in value))
+            old = self.order[idx]
+            self.order[idx] = new
+            for entry_id in old:
+                schedule.release(entry_id)
+        else:
+            entry_id = schedule.entry_for(value)
+            schedule.release(self.order[idx])
+            self.order[idx] = entry_id
+
+    def __delitem__(self, idx):
+        old = self.order[idx] if isinstance(idx, slice) else (self.order[idx],)
+        del self.order[idx]
+        for entry_id in old:
+            self.schedule.release(entry_id)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        schedule = self.schedule
+        return (CompactEntry(schedule, entry_id) for entry_id in self.order)
+
+    def insert(self, idx, value):
+        self.order.insert(idx, self.schedule.entry_for(value))
+
+    def copy(self):
+        return list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, CompactDay)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class CompactSchedule(MutableMapping):
+    """A weekly schedule stored as integer columns with interned employee, role and slot tables."""
+
+    def __init__(self):
+        self.employee_ids, self._employee_index = [], {}
+        self.roles, self._role_index = [], {}
+        self.slots, self._slot_index = [], {}
+        # Parsed (start, end) minutes for every interned slot
+        self.slot_start, self.slot_end = array('i'), array('i')
+        # One row per assignment
+        self.entry_employee, self.entry_role, self.entry_slot = array('i'), array('i'), array('i')
+        # How many places in the days hold each row; rows held nowhere are free to reuse
+        self.entry_refs = array('i')
+        self._unused = 0
+        self._free = []
+        self._days = {}
+
+    @classmethod
+    def from_dict(cls, schedule):
+        """Build a compact schedule from the {day: [assignment dict, ...]} format."""
+        compact = cls()
+        for day, day_schedule in schedule.items():
+            compact[day] = day_schedule
+        return compact
+
+    @classmethod
+    def from_columns(cls, employee_ids, roles, slots, entry_employee, entry_role, entry_slot, days):
+        """
+        Build a compact schedule straight from its tables and columns, e.g. as read back from a columnar file.
+        days maps each day to the row numbers of its assignments, in order.
+        """
+        compact = cls()
+        compact.employee_ids, compact.roles = list(employee_ids), list(roles)
+        compact._employee_index = {employee_id: idx for idx, employee_id in enumerate(compact.employee_ids)}
+        compact._role_index = {role: idx for idx, role in enumerate(compact.roles)}
+        for slot in slots:
+            compact.slot_index(slot)
+        compact.entry_employee = array('i', entry_employee)
+        compact.entry_role = array('i', entry_role)
+        compact.entry_slot = array('i', entry_slot)
+        compact._days = {day: array('i', order) for day, order in days.items()}
+        compact.entry_refs = array('i', bytes(4 * len(compact.entry_employee)))
+        for entry_id in compact.entry_ids():
+            compact.entry_refs[entry_id] += 1
+        compact._unused = compact.entry_refs.count(0)
+        return compact
+
+    def to_dict(self):
+        """Convert back to the {day: [assignment dict, ...]} format."""
+        return {day: [dict(entry) for entry in self[day]] for day in self._days}
+
+    def employee_index(self, employee_id):
+        idx = self._employee_index.get(employee_id)
+        if idx is None:
+            idx = self._employee_index[employee_id] = len(self.employee_ids)
+            self.employee_ids.append(employee_id)
+        return idx
+
+    def role_index(self, role):
+        idx = self._role_index.get(role)
+        if idx is None:
+            idx = self._role_index[role] = len(self.roles)
+            self.roles.append(role)
+        return idx
+
+    def slot_index(self, slot):
+        idx = self._slot_index.get(slot)
+        if idx is None:
+            start, end = slot_minutes(slot)
+            idx = self._slot_index[slot] = len(self.slots)
+            self.slots.append(slot)
+            self.slot_start.append(start)
+            self.slot_end.append(end)
+        return idx
+
+    def entry_for(self, value):
+        """
+        Return the row number for an assignment, taking a reference to it for the caller to store in a day: the
+        row itself if value is already a view of this schedule, otherwise a free row or a new one.
+        """
+        if isinstance(value, CompactEntry) and value.schedule is self:
+            entry_id = value.entry_id
+            if not self.entry_refs[entry_id]:
+                self._unused -= 1
+            self.entry_refs[entry_id] += 1
+            return entry_id
+        unknown = set(value) - set(ENTRY_KEYS)
+        if unknown:
+            raise ValueError(f"Unsupported keys in schedule entry: {sorted(unknown)}")
+        employee = self.employee_index(value["employee_id"])
+        role = self.role_index(value["role"])
+        slot = self.slot_index(value["slot"]) if "slot" in value else NO_SLOT
+        entry_id = self._free_row()
+        if entry_id is None:
+            self.entry_employee.append(employee)
+            self.entry_role.append(role)
+            self.entry_slot.append(slot)
+            self.entry_refs.append(1)
+            return len(self.entry_employee) - 1
+        self._unused -= 1
+        self.entry_employee[entry_id], self.entry_role[entry_id], self.entry_slot[entry_id] = employee, role, slot
+        self.entry_refs[entry_id] = 1
+        return entry_id
+
+    def release(self, entry_id):
+        """Drop a reference to a row, taken with entry_for, that a day no longer holds."""
+        self.entry_refs[entry_id] -= 1
+        if not self.entry_refs[entry_id]:
+            self._unused += 1
+
+    def _free_row(self):
+        # Rows are gathered for reuse once at least half the columns are unused, so the scan pays for itself;
+        # a gathered row that a stale view has since put back into a day is skipped
+        if not self._free and self._unused * 2 >= len(self.entry_refs) > 0:
+            self._free = [entry_id for entry_id, refs in enumerate(self.entry_refs) if not refs]
+            self._free.reverse()
+        while self._free:
+            entry_id = self._free.pop()
+            if not self.entry_refs[entry_id]:
+                return entry_id
+        return None
+
+    def entry_ids(self):
+        """Yield the row number of every scheduled assignment."""
+        for order in self._days.values():
+            yield from order
+
+    def employee_hours(self):
+        """Return a Counter of scheduled slots per employee id, counted straight off the columns."""
+        counts = Counter()
+        for order in self._days.values():
+            counts.update(map(self.entry_employee.__getitem__, order))
+        return Counter({self.employee_ids[idx]: count for idx, count in counts.items()})
+
+    def shifts(self, day):
+        """Yield (employee_id, role, start_minute, end_minute) for each slotted assignment on the given day."""
+        employee_ids, roles, slot_start, slot_end = self.employee_ids, self.roles, self.slot_start, self.slot_end
+        for entry_id in self._days[day]:
+            slot = self.entry_slot[entry_id]
+            if slot != NO_SLOT:
+                yield (employee_ids[self.entry_employee[entry_id]], roles[self.entry_role[entry_id]],
+                       slot_start[slot], slot_end[slot])
+
+    def role_counts(self, day):
+        """Return a Counter of assignments per role on the given day."""
+        counts = Counter(map(self.entry_role.__getitem__, self._days[day]))
+        return Counter({self.roles[idx]: count for idx, count in counts.items()})
+
+    def __getitem__(self, day):
+        return CompactDay(self, self._days[day])
+
+    def __setitem__(self, day, day_schedule):
+        order = array('i', (self.entry_for(entry) for entry in day_schedule))
+        old = self._days.get(day, ())
+        self._days[day] = order
+        for entry_id in old:
+            self.release(entry_id)
+
+    def __delitem__(self, day):
+        for entry_id in self._days.pop(day):
+            self.release(entry_id)
+
+    def __iter__(self):
+        return iter(self._days)
+
+    def __len__(self):
+        return len(self._days)
+
+    def copy(self):
+        compact = CompactSchedule.__new__(CompactSchedule)
+        compact.employee_ids, compact._employee_index = list(self.employee_ids), dict(self._employee_index)
+        compact.roles, compact._role_index = list(self.roles), dict(self._role_index)
+        compact.slots, compact._slot_index = list(self.slots), dict(self._slot_index)
+        compact.slot_start, compact.slot_end = array('i', self.slot_start), array('i', self.slot_end)
+        compact.entry_employee = array('i', self.entry_employee)
+        compact.entry_role = array('i', self.entry_role)
+        compact.entry_slot = array('i', self.entry_slot)
+        compact.entry_refs = array('i', self.entry_refs)
+        compact._unused, compact._free = self._unused, list(self._free)
+        compact._days = {day: array('i', order) for day, order in self._days.items()}
+        return compact
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CompactSchedule({self.to_dict()!r})"
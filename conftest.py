@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The test package imports its helpers script-style, as benchmark.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "test"))
@@ -0,0 +1,247 @@
+"""
+Traffic-based staffing solved exactly as a min-cost flow.
+
+For each day the hourly seat demand (required_staff_for_guests per hour and role, and at least "min" of every role
+that has one) is matched against the roster through the network
+
+    source -> employee        capacity = the employee's weekly maxh hours not yet used on earlier days
+    employee -> employee-hour capacity 1, one node for each operating hour the employee is available
+    employee-hour -> (hour, role) capacity 1, for each role the employee can work, at that hour's labor cost
+    (hour, role) -> sink      capacity = seats needed
+
+so every employee works at most one role an hour and at most maxh hours over the week, as many seats as possible are
+filled each day, and among the fullest staffings the cheapest is chosen. The flow is found by successive shortest paths with node
+potentials, pushing along every shortest path at once, which is polynomial in the size of the roster and the day.
+"""
+
+import heapq
+import math
+
+from availability import AvailabilityIndex, employee_roles
+from parsejson import hourly_demand_arrays, parse_hours
+
+
+EPSILON = 1e-9
+
+
+class MinCostFlow:
+    """A directed network with capacities and per-unit costs, solved for min-cost max-flow."""
+
+    def __init__(self, num_nodes=0):
+        self.graph = [[] for _ in range(num_nodes)]
+        # Edges are stored in pairs: edge e and its residual reverse edge e ^ 1
+        self.to, self.cap, self.cost = [], [], []
+
+    def add_node(self):
+        self.graph.append([])
+        return len(self.graph) - 1
+
+    def add_edge(self, u, v, cap, cost):
+        """Add an edge from u to v and return its number, for reading its flow back later."""
+        edge = len(self.to)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.graph[u].append(edge)
+        self.graph[v].append(edge + 1)
+        return edge
+
+    def flow(self, edge):
+        """Return the flow sent along an edge returned by add_edge."""
+        return self.cap[edge ^ 1]
+
+    def _shortest_paths(self, source, potential):
+        # Dijkstra over residual edges with reduced costs, which the potentials keep non-negative
+        dist = [math.inf] * len(self.graph)
+        dist[source] = 0
+        heap = [(0, source)]
+        to, cap, cost, graph = self.to, self.cap, self.cost, self.graph
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for edge in graph[u]:
+                if cap[edge] > 0:
+                    v = to[edge]
+                    nd = d + max(0, cost[edge] + potential[u] - potential[v])
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+        return dist
+
+    def _augment(self, source, sink, limit, potential):
+        # Blocking flow (Dinic) over the edges that lie on some shortest path, i.e. have zero reduced cost
+        to, cap, cost, graph = self.to, self.cap, self.cost, self.graph
+        total = 0
+        while total < limit:
+            level = [-1] * len(graph)
+            level[source] = 0
+            queue = [source]
+            for u in queue:
+                for edge in graph[u]:
+                    v = to[edge]
+                    if cap[edge] > 0 and level[v] < 0 and cost[edge] + potential[u] - potential[v] <= EPSILON:
+                        level[v] = level[u] + 1
+                        queue.append(v)
+            if level[sink] < 0:
+                break
+            next_edge = [0] * len(graph)
+
+            def push(u, amount):
+                if u == sink:
+                    return amount
+                edges = graph[u]
+                while next_edge[u] < len(edges):
+                    edge = edges[next_edge[u]]
+                    v = to[edge]
+                    if (cap[edge] > 0 and level[v] == level[u] + 1
+                            and cost[edge] + potential[u] - potential[v] <= EPSILON):
+                        pushed = push(v, min(amount, cap[edge]))
+                        if pushed:
+                            cap[edge] -= pushed
+                            cap[edge ^ 1] += pushed
+                            return pushed
+                    next_edge[u] += 1
+                return 0
+
+            while total < limit:
+                pushed = push(source, limit - total)
+                if not pushed:
+                    break
+                total += pushed
+        return total
+
+    def solve(self, source, sink, max_flow=math.inf):
+        """Send as much flow as possible (up to max_flow) from source to sink at least cost; return (flow, cost)."""
+        potential = [0] * len(self.graph)
+        total_flow = total_cost = 0
+        while total_flow < max_flow:
+            dist = self._shortest_paths(source, potential)
+            if dist[sink] == math.inf:
+                break
+            # Nodes that cannot be reached now never become reachable again, so their potentials can stay put
+            for node, d in enumerate(dist):
+                if d < math.inf:
+                    potential[node] += d
+            pushed = self._augment(source, sink, max_flow - total_flow, potential)
+            if not pushed:
+                break
+            total_flow += pushed
+            total_cost += pushed * (potential[sink] - potential[source])
+        return total_flow, total_cost
+
+
+def seat_demand(demand_arrays):
+    """Return {(hour, role): seats} for the hours that need any, from hourly_demand_arrays' {role: array}."""
+    return {(hour, role): seats for role, hourly in demand_arrays.items() for hour, seats in enumerate(hourly) if seats}
+
+
+def labor_rate(employee, role, positions):
+    """An employee's own hourlyRate if they have one, otherwise the role's."""
+    if "hourlyRate" in employee:
+        return employee["hourlyRate"]
+    return positions[role].get("hourlyRate", positions[role].get("rate", 0))
+
+
+def shifts_from_hours(worked):
+    """Merge {employee_id: {hour: role}} into assignment dicts, one per run of consecutive hours in the same role."""
+    day_schedule = []
+    for employee_id, hours in worked.items():
+        run_start = previous = run_role = None
+        for hour in sorted(hours):
+            role = hours[hour]
+            if run_role is not None and (hour != previous + 1 or role != run_role):
+                day_schedule.append({"employee_id": employee_id, "role": run_role,
+                                     "slot": f"{run_start:02d}:00-{previous + 1:02d}:00"})
+                run_role = None
+            if run_role is None:
+                run_start, run_role = hour, role
+            previous = hour
+        if run_role is not None:
+            day_schedule.append({"employee_id": employee_id, "role": run_role,
+                                 "slot": f"{run_start:02d}:00-{previous + 1:02d}:00"})
+    return day_schedule
+
+
+def flow_day_schedule(employees, positions, traffic, day_hours, day, availability=None, demand=None, window=None,
+                      hours_left=None):
+    """
+    Staff one day at least cost and return (day_schedule, shortfall), where shortfall is {(hour, role): seats}
+    for demand no available employee could fill. Shifts past midnight keep counting hours (e.g. "23:00-25:00").
+    demand, if given, is the {(hour, role): seats} to staff in place of the one computed from traffic, and window
+    the day's (start, end) operating hours in place of the ones parsed from day_hours. hours_left, if given, is
+    {employee index: hours of maxh still free this week}; it caps the day in place of maxh and the hours worked
+    are taken off it.
+    """
+    if availability is None:
+        availability = AvailabilityIndex(employees)
+    start, end = window or parse_hours({day: day_hours})[1][day]
+    if demand is None:
+        demand = seat_demand(hourly_demand_arrays(traffic, positions, start, end))
+
+    network = MinCostFlow(2)
+    source, sink = 0, 1
+    demand_nodes = {}
+    for key, seats in demand.items():
+        demand_nodes[key] = network.add_node()
+        network.add_edge(demand_nodes[key], sink, seats, 0)
+
+    # (employee index, hour, role, edge) for every edge that can carry a seat
+    seat_edges = []
+    for idx, employee in enumerate(employees):
+        roles = [role for role in employee_roles(employee) if role in positions]
+        hours = [hour for hour in range(start, end)
+                 if availability.is_available(idx, day, hour) and any((hour, role) in demand for role in roles)]
+        if not hours:
+            continue
+        cap = employee.get("maxh", len(hours))
+        if hours_left is not None:
+            cap = hours_left.get(idx, cap)
+        if cap <= 0:
+            continue
+        employee_node = network.add_node()
+        network.add_edge(source, employee_node, min(cap, len(hours)), 0)
+        for hour in hours:
+            hour_node = network.add_node()
+            network.add_edge(employee_node, hour_node, 1, 0)
+            for role in roles:
+                if (hour, role) in demand:
+                    edge = network.add_edge(hour_node, demand_nodes[hour, role], 1,
+                                            labor_rate(employee, role, positions))
+                    seat_edges.append((idx, hour, role, edge))
+
+    network.solve(source, sink)
+
+    worked = {}
+    shortfall = dict(demand)
+    for idx, hour, role, edge in seat_edges:
+        if network.flow(edge):
+            worked.setdefault(employees[idx]["id"], {})[hour] = role
+            shortfall[hour, role] -= 1
+            if hours_left is not None and idx in hours_left:
+                hours_left[idx] -= 1
+    shortfall = {key: seats for key, seats in shortfall.items() if seats}
+    return shifts_from_hours(worked), shortfall
+
+
+def generate_weekly_schedule_flow(data):
+    """
+    Staff every day in data["hours"] from its traffic with flow_day_schedule and return the weekly schedule,
+    ready to hand to the annealer in place of generate_entire_weekly_schedule_v4's. A parsed Store's demand
+    arrays and operating hours are used as they are. maxh caps each employee's hours over the whole week, the
+    days taking what is left in the order they come.
+    """
+    employees = data["empl"]
+    availability = AvailabilityIndex(employees)
+    hours_left = {idx: employee["maxh"] for idx, employee in enumerate(employees) if "maxh" in employee}
+    store_demand = getattr(data, "demand", None)
+    operating_hours = getattr(data, "operating_hours", {})
+    weekly_schedule = {}
+    for day, day_hours in data["hours"].items():
+        demand = None
+        if store_demand is not None:
+            demand = seat_demand(store_demand.get(day, {}))
+        weekly_schedule[day], _ = flow_day_schedule(
+            employees, data["positions"], data["dailyTraffic"].get(day, []), day_hours, day, availability, demand,
+            operating_hours.get(day), hours_left)
+    return weekly_schedule
@@ -0,0 +1,343 @@
+"""
+Opt-in instrumentation for the scheduler.
+
+Nothing here runs unless enable() is called. enable() swaps timing wrappers in for the hot helpers and the main
+phase functions of calculateschedule.py, and for the index methods the inner loops actually spend their time in
+(availability checks, break checks, cost deltas and candidate lookups), and disable() puts the originals back, so a
+normal run pays nothing. Functions are swapped in every loaded module that imported them by name
+(from calculateschedule import ...), so batch.py, service.py and the optimizers are seen too; methods are patched
+on their class. batch.py and service.py take --profile PATH to record their worker processes and write the trace.
+
+    recorder = instrumentation.enable()
+    telemetry = recorder.anneal_observer("weekly")
+    with instrumentation.phase("solve"):
+        schedule = generate_entire_weekly_schedule_v4(data)
+        schedule = simulated_annealing_v2(schedule, ..., observer=telemetry)
+    instrumentation.disable()
+    recorder.write_json("trace.json")     # chrome://tracing / Perfetto, plus summaries
+    recorder.write_pstats("calls.prof")   # python -m pstats calls.prof
+
+The JSON trace uses the Chrome trace event format: phases are complete ("X") events and the annealer's temperature
+and costs are counter ("C") events, with per-function and per-move-type summaries alongside.
+"""
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import functools
+import importlib
+import inspect
+import json
+import marshal
+import os
+import sys
+import time
+
+
+# Helpers called from inner loops: counted and timed in aggregate
+HOT_FUNCTIONS = ("hours_by_employee", "employee_hours", "required_staff_for_guests", "is_employee_available",
+                 "enforce_breaks", "propose_move", "accept_schedule")
+
+# Index methods called from inner loops, as "module.Class.method": counted and timed in aggregate
+HOT_METHODS = ("availability.AvailabilityIndex.covers", "breakindex.BreakIndex.can_add",
+               "calculateschedule.ScheduleCost.delta", "candidatepool.CandidatePool.fill")
+
+# Top-level steps: each call is also recorded as a phase in the trace
+PHASE_FUNCTIONS = ("generate_entire_weekly_schedule_v4", "enhanced_day_schedule", "simulated_annealing_v2",
+                   "simulated_annealing_anytime", "anneal_anytime", "evaluate_schedule", "repair_schedule",
+                   "rebalance_schedule")
+
+_recorder = None
+_patched = {}
+
+
+def function_key(fn):
+    """Return the (filename, line, name) key pstats uses for a function."""
+    code = getattr(fn, "__code__", None)
+    if code is None:
+        return ("~", 0, getattr(fn, "__qualname__", repr(fn)))
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class AnnealTelemetry:
+    """Annealer observer recording acceptance per move type and a sampled temperature and cost trajectory."""
+
+    def __init__(self, name, clock=time.perf_counter, sample_every=100):
+        self.name = name
+        self.clock = clock
+        self.sample_every = sample_every
+        self.iterations = 0
+        self.proposed = Counter()
+        self.accepted = Counter()
+        # (seconds since start, iteration, temp, current_cost, best_cost)
+        self.trajectory = []
+        self.start = clock()
+
+    def step(self, move, accepted, temp, current_cost, best_cost):
+        self.iterations += 1
+        if move is not None:
+            move_type = type(move).__name__
+            self.proposed[move_type] += 1
+            if accepted:
+                self.accepted[move_type] += 1
+        if self.iterations % self.sample_every == 1 or self.sample_every == 1:
+            self.trajectory.append((self.clock() - self.start, self.iterations, temp, current_cost, best_cost))
+
+    def acceptance_rates(self):
+        return {move_type: self.accepted[move_type] / count for move_type, count in self.proposed.items()}
+
+    def summary(self):
+        return {
+            "iterations": self.iterations,
+            "proposed": dict(self.proposed),
+            "accepted": dict(self.accepted),
+            "acceptance_rate": self.acceptance_rates(),
+            "trajectory": [
+                {"seconds": seconds, "iteration": iteration, "temp": temp, "current_cost": current, "best_cost": best}
+                for seconds, iteration, temp, current, best in self.trajectory],
+        }
+
+
+class Recorder:
+    """Collects call counts, times and phase events while instrumentation is enabled."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.start = clock()
+        self.calls = Counter()
+        self.seconds = defaultdict(float)
+        self.pid = os.getpid()
+        # (name, start, duration, pid), times in seconds since the recorder started
+        self.phases = []
+        self.observers = []
+
+    def record_call(self, key, seconds):
+        self.calls[key] += 1
+        self.seconds[key] += seconds
+
+    def record_phase(self, name, start, seconds):
+        self.phases.append((name, start - self.start, seconds, self.pid))
+
+    def merge(self, other):
+        """
+        Add another recorder's calls, phases and annealer telemetry to this one, as a batch does with the recorders
+        its worker processes send back. Phases keep their own process id; perf_counter is shared by the processes
+        of one machine, so they line up on one timeline.
+        """
+        self.calls.update(other.calls)
+        for key, seconds in other.seconds.items():
+            self.seconds[key] += seconds
+        offset = other.start - self.start
+        self.phases.extend((name, start + offset, seconds, pid) for name, start, seconds, pid in other.phases)
+        self.observers.extend(other.observers)
+
+    def anneal_observer(self, name="anneal", sample_every=100):
+        """Return an AnnealTelemetry to pass as observer= to the annealer; it is exported with this recorder."""
+        telemetry = AnnealTelemetry(name, self.clock, sample_every)
+        self.observers.append(telemetry)
+        return telemetry
+
+    def function_summary(self):
+        return {f"{name} ({os.path.basename(filename)}:{line})": {"calls": self.calls[key],
+                                                                 "seconds": self.seconds[key]}
+                for key in self.calls for filename, line, name in [key]}
+
+    def phase_summary(self):
+        totals = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        for name, _, seconds, _ in self.phases:
+            totals[name]["calls"] += 1
+            totals[name]["seconds"] += seconds
+        return dict(totals)
+
+    def trace(self):
+        """Return the recording as a Chrome trace event dict."""
+        events = [{"name": name, "cat": "phase", "ph": "X", "ts": start * 1e6, "dur": seconds * 1e6,
+                   "pid": pid, "tid": 0}
+                  for name, start, seconds, pid in self.phases]
+        for telemetry in self.observers:
+            offset = telemetry.start - self.start
+            for seconds, _, temp, current, best in telemetry.trajectory:
+                events.append({"name": telemetry.name, "cat": "anneal", "ph": "C", "ts": (offset + seconds) * 1e6,
+                               "pid": self.pid, "args": {"temp": temp, "current_cost": current, "best_cost": best}})
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "phases": self.phase_summary(),
+            "functions": self.function_summary(),
+            "anneal": {telemetry.name: telemetry.summary() for telemetry in self.observers},
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.trace(), f)
+
+    def pstats(self):
+        """
+        Return the call statistics in the marshalled form pstats.Stats loads. Wrapped functions are timed
+        inclusively, so their own time and cumulative time are the same figure.
+        """
+        stats = {}
+        for key, calls in self.calls.items():
+            stats[key] = (calls, calls, self.seconds[key], self.seconds[key], {})
+        # Phases from wrapped functions are already there under the function's own key
+        function_names = {name for _, _, name in self.calls}
+        for name, totals in self.phase_summary().items():
+            if name not in function_names:
+                stats[("~", 0, f"<phase {name}>")] = (
+                    totals["calls"], totals["calls"], totals["seconds"], totals["seconds"], {})
+        return stats
+
+    def write_pstats(self, path):
+        with open(path, "wb") as f:
+            marshal.dump(self.pstats(), f)
+
+
+def _counted(fn, recorder):
+    key = function_key(fn)
+    clock = recorder.clock
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            recorder.record_call(key, clock() - start)
+    return wrapper
+
+
+def _counted_generator(fn, recorder):
+    # Times every resumption, so a lazily consumed generator is charged for the work it does, not just its creation
+    key = function_key(fn)
+    clock = recorder.clock
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        seconds = 0.0
+        start = clock()
+        generator = fn(*args, **kwargs)
+        try:
+            while True:
+                try:
+                    value = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += clock() - start
+                yield value
+                start = clock()
+        finally:
+            start = clock()
+            generator.close()
+            recorder.record_call(key, seconds + clock() - start)
+    return wrapper
+
+
+def _phased(fn, recorder):
+    key = function_key(fn)
+    clock = recorder.clock
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = clock() - start
+            recorder.record_call(key, seconds)
+            recorder.record_phase(fn.__name__, start, seconds)
+    return wrapper
+
+
+def _phased_generator(fn, recorder):
+    # The phase spans the generator's whole life, from the call until it is exhausted or closed
+    key = function_key(fn)
+    clock = recorder.clock
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            yield from fn(*args, **kwargs)
+        finally:
+            seconds = clock() - start
+            recorder.record_call(key, seconds)
+            recorder.record_phase(fn.__name__, start, seconds)
+    return wrapper
+
+
+def _resolve_method(path):
+    module_name, class_name, name = path.rsplit(".", 2)
+    try:
+        owner = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError):
+        return None, name, None
+    return owner, name, owner.__dict__.get(name)
+
+
+def _importers(module, name, original):
+    # Every loaded module holding original under name: module itself, then any that imported it by name
+    owners = [module]
+    for other in list(sys.modules.values()):
+        if other is not module and getattr(other, "__dict__", {}).get(name) is original:
+            owners.append(other)
+    return owners
+
+
+def enable(recorder=None, module=None, functions=HOT_FUNCTIONS, phases=PHASE_FUNCTIONS, methods=HOT_METHODS):
+    """
+    Start recording into recorder (a new Recorder by default) and return it. functions and phases name attributes
+    of module (calculateschedule by default) to wrap, here and in every loaded module that imported them by name,
+    and methods names "module.Class.method" methods to wrap on their class; names that do not exist are skipped.
+    """
+    global _recorder
+    if module is None:
+        import calculateschedule as module
+    disable()
+    recorder = recorder or Recorder()
+    targets = [(module, name, getattr(module, name, None), _counted) for name in functions]
+    targets += [(module, name, getattr(module, name, None), _phased) for name in phases]
+    targets += [(*_resolve_method(path), _counted) for path in methods]
+    for owner, name, original, wrap in targets:
+        if original is None:
+            continue
+        if inspect.isgeneratorfunction(original):
+            wrap = _counted_generator if wrap is _counted else _phased_generator
+        wrapper = wrap(original, recorder)
+        owners = [owner] if inspect.isclass(owner) else _importers(owner, name, original)
+        for owner in owners:
+            _patched[(owner, name)] = original
+            setattr(owner, name, wrapper)
+    _recorder = recorder
+    return recorder
+
+
+def disable():
+    """Stop recording and restore the original functions. Returns the recorder that was active, if any."""
+    global _recorder
+    for (owner, name), original in _patched.items():
+        setattr(owner, name, original)
+    _patched.clear()
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def enabled():
+    return _recorder is not None
+
+
+def active_recorder():
+    return _recorder
+
+
+@contextmanager
+def phase(name):
+    """Record the enclosed block as a phase when instrumentation is enabled; does nothing otherwise."""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    start = recorder.clock()
+    try:
+        yield
+    finally:
+        recorder.record_phase(name, start, recorder.clock() - start)
@@ -0,0 +1,221 @@
+"""
+Pluggable optimizer engines for improving a weekly schedule.
+
+Every engine takes the same arguments, (schedule, data, weights, time_budget, rng, **options), prices changes
+with the same ScheduleCost model and returns the best schedule it found within time_budget seconds, so engines can
+be swapped per solve and compared like for like:
+
+    annealing   simulated_annealing_anytime
+    tabu        tabu search over sampled single-slot moves, with aspiration
+    lns         large-neighborhood search: clear a whole day or role and rebuild it with enhanced_day_schedule
+
+New engines are added with @register_optimizer("name").
+"""
+
+from collections import Counter
+import copy
+import math
+import random
+import time
+
+from availability import DEFAULT_GRANULARITY, AvailabilityIndex, window_minutes
+from breakindex import MIN_BREAK_HOURS, BreakIndex
+from calculateschedule import (DEFAULT_WEIGHTS, MOVES, BestSchedule, ScheduleCost, enhanced_day_schedule,
+                               hours_by_employee, simulated_annealing_anytime)
+from candidatepool import CandidatePool
+
+
+OPTIMIZERS = {}
+
+
+def register_optimizer(name):
+    def register(fn):
+        OPTIMIZERS[name] = fn
+        return fn
+    return register
+
+
+def optimize(schedule, data, weights=None, engine="annealing", time_budget=2.0, rng=random, **options):
+    """Improve the schedule with the named engine and return the best schedule found."""
+    if engine not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer: {engine} (choose from {', '.join(sorted(OPTIMIZERS))})")
+    weights = weights or data.get("weights") or DEFAULT_WEIGHTS
+    return OPTIMIZERS[engine](schedule, data, weights, time_budget, rng, **options)
+
+
+@register_optimizer("annealing")
+def anneal(schedule, data, weights, time_budget, rng, **options):
+    return simulated_annealing_anytime(schedule, data["empl"], data["positions"], data["dailyTraffic"], weights,
+                                       time_budget, rng=rng, **options)
+
+
+def _slot_states(schedule, move):
+    # What each slot the move touches would hold afterwards: apply, read, undo
+    move.apply(schedule)
+    states = frozenset((day, idx, schedule[day][idx]["employee_id"], schedule[day][idx]["role"])
+                       for day, idx in move.slots)
+    move.undo(schedule)
+    return states
+
+
+@register_optimizer("tabu")
+def tabu_search(schedule, data, weights, time_budget, rng, neighborhood=40, tenure=25, max_iterations=None,
+                should_stop=None, clock=time.monotonic):
+    """
+    Each iteration samples neighborhood moves and takes the cheapest one that is not tabu, even if it makes the
+    schedule worse. Moving a slot away from what it held makes that (slot, employee, role) state tabu for tenure
+    iterations, so the search cannot undo a move straight away; a tabu move is still allowed if it would beat
+    the best cost found (aspiration).
+    """
+    deadline = clock() + time_budget if time_budget is not None else math.inf
+    schedule = copy.deepcopy(schedule)
+    cost_model = ScheduleCost(schedule, data["empl"], data["positions"], weights)
+    days = list(schedule.keys())
+    current_cost = cost_model.total()
+    best = BestSchedule(schedule, current_cost)
+    # slot state -> iteration it stops being tabu
+    tabu = {}
+    iteration = 0
+    while (clock() < deadline and (max_iterations is None or iteration < max_iterations)
+           and not (should_stop is not None and should_stop())):
+        iteration += 1
+        chosen = None
+        for _ in range(neighborhood):
+            move = rng.choice(MOVES).propose(schedule, rng.choice(days), data["positions"], rng)
+            if move is None:
+                continue
+            new_cost = current_cost + cost_model.delta(move.removed, move.added)
+            if chosen is not None and new_cost >= chosen[0]:
+                continue
+            states = _slot_states(schedule, move)
+            if new_cost < best.cost or not any(tabu.get(state, 0) > iteration for state in states):
+                chosen = (new_cost, move)
+        if chosen is None:
+            continue
+        new_cost, move = chosen
+        for day, idx in move.slots:
+            hour_schedule = schedule[day][idx]
+            tabu[day, idx, hour_schedule["employee_id"], hour_schedule["role"]] = iteration + tenure
+        move.apply(schedule)
+        current_cost = cost_model.apply(move.removed, move.added)
+        best.applied(move, current_cost)
+        if len(tabu) > 8 * tenure * neighborhood:
+            tabu = {state: until for state, until in tabu.items() if until > iteration}
+    return best.result()
+
+
+def _rebuild(schedule, data, availability, candidates, position, day, role, min_break):
+    """
+    Return (kept, cleared, rebuilt) entries for the day: rebuilt replaces the cleared entries, everything of the
+    role (or the whole day if role is None), with a fresh greedy fill that favours whoever has fewest hours
+    elsewhere in the week. candidates holds each employee's weekly hours as their load; the cleared hours are
+    taken off it and the rebuilt ones added, as if the rebuild were kept.
+    """
+    employees = data["empl"]
+    kept, cleared = [], []
+    for hour_schedule in schedule[day]:
+        if role is None or hour_schedule["role"] == role:
+            cleared.append(hour_schedule)
+            candidates.add_load(position[hour_schedule["employee_id"]], -1)
+        else:
+            kept.append(dict(hour_schedule))
+    breaks = BreakIndex(min_break)
+    for hour_schedule in kept:
+        if "slot" in hour_schedule:
+            breaks.add(hour_schedule["employee_id"], *window_minutes(hour_schedule["slot"]))
+    day_data = data
+    if role is not None:
+        day_data = dict(role_requirements={role: data["role_requirements"].get(role, 0)},
+                        preferred_slots=data["preferred_slots"], empl=employees,
+                        preferred_windows=data.get("preferred_windows", {}),
+                        granularity=availability.granularity)
+    rebuilt = enhanced_day_schedule(day_data, day, availability, candidates, min_break, breaks)
+    return kept, cleared, rebuilt
+
+
+def _coverage(entries):
+    # Staff on shift per (hour, role), counting every hour a shift touches as hourly_coverage does
+    coverage = Counter()
+    for hour_schedule in entries:
+        if "slot" in hour_schedule:
+            start, end = window_minutes(hour_schedule["slot"])
+            for hour in range(start // 60, -(-end // 60)):
+                coverage[hour, hour_schedule["role"]] += 1
+    return coverage
+
+
+def _keeps_coverage(cleared, rebuilt, day_demand=None):
+    """
+    Check that a rebuild fills at least as many seats as it cleared and leaves no (hour, role) shorter of staff:
+    never below what was there before, or below demand if day_demand ({role: seats per hour}) is known.
+    """
+    if len(rebuilt) < len(cleared):
+        return False
+    after = _coverage(rebuilt)
+    for (hour, role), staffed in _coverage(cleared).items():
+        needed = staffed
+        if day_demand is not None:
+            seats = day_demand.get(role, ())
+            needed = min(staffed, seats[hour] if hour < len(seats) else 0)
+        if after[hour, role] < needed:
+            return False
+    return True
+
+
+@register_optimizer("lns")
+def large_neighborhood_search(schedule, data, weights, time_budget, rng, role_share=0.5, noise=1.0,
+                              min_break=MIN_BREAK_HOURS, max_iterations=None, should_stop=None,
+                              clock=time.monotonic):
+    """
+    Each iteration clears either one day (or, with probability role_share, one role across one day) and
+    rebuilds it with the greedy logic of enhanced_day_schedule, keeping the result if it costs no more and keeps
+    coverage: a rebuild that fills fewer seats than it cleared, or leaves any hour shorter of staff than before
+    (or than a Store's demand, where it was over), is rolled back, since dropping shifts always lowers labor cost.
+
+    One candidate pool lives for the whole search, its loads kept equal to each employee's weekly hours plus a
+    little noise as rebuilds are kept or rolled back, so an iteration costs the size of the day it rebuilds rather
+    than of the whole roster and week.
+    """
+    deadline = clock() + time_budget if time_budget is not None else math.inf
+    schedule = copy.deepcopy(schedule)
+    employees = data["empl"]
+    cost_model = ScheduleCost(schedule, employees, data["positions"], weights)
+    availability = AvailabilityIndex(employees, data.get("granularity", DEFAULT_GRANULARITY))
+    position = {employee["id"]: idx for idx, employee in enumerate(employees)}
+    hours = hours_by_employee(schedule)
+    candidates = CandidatePool(employees, roles_of=lambda e: e["roles"])
+    # A little noise breaks ties differently each time, so repeated rebuilds explore; it is redrawn for
+    # everyone a rebuild touches
+    jitter = [noise * rng.random() for _ in employees]
+    for idx, employee in enumerate(employees):
+        candidates.add_load(idx, hours[employee["id"]] + jitter[idx])
+    max_entries = 4 * candidates.entries()
+    demand = data.get("demand")
+    days = [day for day in schedule if data["preferred_slots"].get(day)]
+    roles = list(data["role_requirements"])
+    iteration = 0
+    while (days and clock() < deadline and (max_iterations is None or iteration < max_iterations)
+           and not (should_stop is not None and should_stop())):
+        iteration += 1
+        day = rng.choice(days)
+        role = rng.choice(roles) if roles and rng.random() < role_share else None
+        kept, cleared, rebuilt = _rebuild(schedule, data, availability, candidates, position, day, role, min_break)
+        removed = [(h["employee_id"], h["role"]) for h in cleared]
+        added = [(h["employee_id"], h["role"]) for h in rebuilt]
+        day_demand = demand.get(day, {}) if demand is not None else None
+        if cost_model.delta(removed, added) <= 0 and _keeps_coverage(cleared, rebuilt, day_demand):
+            schedule[day] = kept + rebuilt
+            cost_model.apply(removed, added)
+        else:
+            # Roll the loads back to the hours actually scheduled
+            for employee_id, _ in removed:
+                candidates.add_load(position[employee_id], 1)
+            for employee_id, _ in added:
+                candidates.add_load(position[employee_id], -1)
+        for idx in {position[employee_id] for employee_id, _ in removed + added}:
+            redrawn = noise * rng.random()
+            candidates.add_load(idx, redrawn - jitter[idx])
+            jitter[idx] = redrawn
+        if candidates.entries() > max_entries:
+            candidates.compact()
+    return schedule
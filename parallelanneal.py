@@ -0,0 +1,223 @@
+"""
+Parallel simulated annealing across worker processes.
+
+Two engines share the move set and cost model of simulated_annealing_v2:
+    restarts: N independent chains from the same starting schedule, each with its own seed; the best one wins.
+    tempering: N replicas held at a ladder of fixed temperatures, which run in parallel for a round of iterations
+        and then offer to swap temperatures with their neighbours on the ladder (replica exchange).
+
+Tempering replicas live in long-running worker processes for the whole run, each with its own schedule, cost model
+and BestSchedule log, so a round only sends temperatures out and costs back; schedules cross process boundaries
+once at the start and once, for the overall best, at the end.
+
+Every chain draws from its own random.Random seeded from the master seed and the chain number, and replica
+exchanges draw from a master generator, so the result depends only on the seed and the number of chains, not on
+how the pool happens to schedule the work.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import math
+import multiprocessing
+import os
+import random
+
+from calculateschedule import ScheduleCost, anneal_steps, simulated_annealing_v2
+
+
+def chain_rng(seed, chain):
+    """Return the random generator for one chain of a run with the given master seed."""
+    return random.Random(f"{seed}:{chain}")
+
+
+def _restart_chain(initial_schedule, employees, positions, daily_traffic, weights, initial_temp, cooling_rate,
+                   max_iterations, seed, chain):
+    best_schedule = simulated_annealing_v2(
+        initial_schedule, employees, positions, daily_traffic, weights, initial_temp, cooling_rate, max_iterations,
+        rng=chain_rng(seed, chain))
+    return best_schedule, ScheduleCost(best_schedule, employees, positions, weights).total()
+
+
+class Replica:
+    """One tempering chain: a private schedule with its own cost model, best-schedule log and random generator."""
+
+    def __init__(self, initial_schedule, employees, positions, weights, rng):
+        self.schedule = copy.deepcopy(initial_schedule)
+        self.positions = positions
+        self.cost_model = ScheduleCost(self.schedule, employees, positions, weights)
+        self.rng = rng
+        self.best = None
+
+    def run(self, temp, iterations):
+        """Anneal at a fixed temperature and return (current_cost, best_cost)."""
+        self.best, _ = anneal_steps(self.schedule, self.cost_model, self.positions, temp, 1, iterations, self.rng,
+                                    best=self.best)
+        return self.cost_model.total(), self.best.cost
+
+
+class _LocalReplicas:
+    """Every replica in this process."""
+
+    def __init__(self, initial_schedule, employees, positions, weights, seed, chains):
+        self.replicas = [Replica(initial_schedule, employees, positions, weights, chain_rng(seed, chain))
+                         for chain in range(chains)]
+
+    def run(self, temps, iterations):
+        return {chain: self.replicas[chain].run(temp, iterations) for chain, temp in temps.items()}
+
+    def best(self, chain):
+        return self.replicas[chain].best.result()
+
+    def close(self):
+        pass
+
+
+def _replica_worker(conn, initial_schedule, employees, positions, weights, seed, chains):
+    try:
+        replicas = {chain: Replica(initial_schedule, employees, positions, weights, chain_rng(seed, chain))
+                    for chain in chains}
+        while (request := conn.recv()) is not None:
+            if request[0] == "run":
+                _, temps, iterations = request
+                conn.send({chain: replicas[chain].run(temp, iterations) for chain, temp in temps.items()})
+            else:
+                conn.send(replicas[request[1]].best.result())
+    except Exception as e:
+        conn.send(e)
+    finally:
+        conn.close()
+
+
+class _ReplicaProcesses:
+    """Replicas spread over worker processes, chain i living in process i % workers for the whole run."""
+
+    def __init__(self, initial_schedule, employees, positions, weights, seed, chains, workers):
+        context = multiprocessing.get_context()
+        self.workers = min(workers, chains)
+        self.conns, self.processes = [], []
+        for worker in range(self.workers):
+            conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_replica_worker, daemon=True,
+                args=(child_conn, initial_schedule, employees, positions, weights, seed,
+                      list(range(worker, chains, self.workers))))
+            process.start()
+            child_conn.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+    def _receive(self, conn):
+        reply = conn.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def run(self, temps, iterations):
+        for worker, conn in enumerate(self.conns):
+            conn.send(("run", {chain: temp for chain, temp in temps.items() if chain % self.workers == worker},
+                       iterations))
+        results = {}
+        for conn in self.conns:
+            results.update(self._receive(conn))
+        return results
+
+    def best(self, chain):
+        conn = self.conns[chain % self.workers]
+        conn.send(("best", chain))
+        return self._receive(conn)
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        for process in self.processes:
+            process.join()
+
+
+def _map(executor, fn, calls):
+    if executor is None:
+        return [fn(*args) for args in calls]
+    return [future.result() for future in [executor.submit(fn, *args) for args in calls]]
+
+
+def temperature_ladder(chains, max_temp, min_temp):
+    """Return chains temperatures spaced geometrically from max_temp down to min_temp."""
+    if chains == 1:
+        return [max_temp]
+    ratio = (min_temp / max_temp) ** (1 / (chains - 1))
+    return [max_temp * ratio ** i for i in range(chains)]
+
+
+def parallel_annealing(initial_schedule, employees, positions, daily_traffic, weights, workers=None, seed=0,
+                       mode="restarts", chains=None, initial_temp=1000, cooling_rate=0.995, max_iterations=10000,
+                       min_temp=1, exchange_interval=200):
+    """
+    Run several annealing chains across a process pool and return the best schedule found.
+
+    mode is "restarts" or "tempering". chains defaults to the number of workers, which defaults to the CPU count.
+    For tempering, replicas sit at temperatures from initial_temp down to min_temp and each runs max_iterations
+    steps in total, exchanging temperatures with a neighbour every exchange_interval steps. With max_iterations 0
+    the starting schedule is returned as it is, as a copy.
+    """
+    if mode not in ("restarts", "tempering"):
+        raise ValueError(f"Unknown parallel annealing mode: {mode}")
+    if max_iterations < 0:
+        raise ValueError(f"max_iterations must not be negative: {max_iterations}")
+    if mode == "tempering" and exchange_interval <= 0:
+        raise ValueError(f"exchange_interval must be positive: {exchange_interval}")
+    if max_iterations == 0:
+        return copy.deepcopy(initial_schedule)
+    workers = workers or os.cpu_count() or 1
+    chains = chains or workers
+    if mode == "tempering":
+        if workers > 1:
+            replicas = _ReplicaProcesses(initial_schedule, employees, positions, weights, seed, chains, workers)
+        else:
+            replicas = _LocalReplicas(initial_schedule, employees, positions, weights, seed, chains)
+        try:
+            return _parallel_tempering(replicas, chains, seed, initial_temp, min_temp, max_iterations,
+                                       exchange_interval)
+        finally:
+            replicas.close()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        results = _map(executor, _restart_chain, [
+            (initial_schedule, employees, positions, daily_traffic, weights, initial_temp, cooling_rate,
+             max_iterations, seed, chain)
+            for chain in range(chains)])
+        # min keeps the lowest chain number on ties
+        best_schedule, _ = min(results, key=lambda result: result[1])
+        return best_schedule
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _parallel_tempering(replicas, chains, seed, max_temp, min_temp, max_iterations, exchange_interval):
+    temps = temperature_ladder(chains, max_temp, min_temp)
+    exchange_rng = chain_rng(seed, "exchange")
+    # rungs[i] is the chain currently held at temps[i]
+    rungs = list(range(chains))
+    costs, best_costs = {}, {}
+
+    done = 0
+    exchange_round = 0
+    while done < max_iterations:
+        iterations = min(exchange_interval, max_iterations - done)
+        results = replicas.run({chain: temps[i] for i, chain in enumerate(rungs)}, iterations)
+        for chain, (cost, best_cost) in results.items():
+            costs[chain], best_costs[chain] = cost, best_cost
+        done += iterations
+
+        # Offer swaps between neighbouring temperatures, alternating even and odd pairs each round
+        for i in range(exchange_round % 2, chains - 1, 2):
+            chain, other = rungs[i], rungs[i + 1]
+            delta = (costs[chain] - costs[other]) * (1 / temps[i] - 1 / temps[i + 1])
+            if delta >= 0 or exchange_rng.random() < math.exp(delta):
+                rungs[i], rungs[i + 1] = other, chain
+        exchange_round += 1
+    # min keeps the lowest chain number on ties
+    return replicas.best(min(range(chains), key=lambda chain: best_costs.get(chain, math.inf)))
@@ -1,8 +1,101 @@
+"""
+Parsing and validation of store configurations.
+
+parse_json_data checks the input and converts it in a single pass into a small typed model: Store, Position and
+Employee dataclasses with interned role names, operating hours parsed into integer hours, preferred slots into
+minutes, and per-day demand arrays. The records can also be read like the dicts they replace (store["empl"], employee["roles"],
+"min" in position), so the scheduling functions take the model directly.
+
+Both input dialects are accepted: the scheduler's (hourlyRate, roles, availability dicts, {"operatingHours": [...]})
+and the generator's (rate, pos, avl lists, ["10:00-00:00", "16:00-23:00"] hours).
+"""
+
+from array import array
+from dataclasses import dataclass, field, fields
 import json
+import sys
+
+from availability import DAY_MINUTES, DAYS, DEFAULT_GRANULARITY, check_granularity, window_minutes
+
+
+class Record:
+    """Dict-style read access to a dataclass's fields; fields left as None count as missing keys."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if isinstance(key, str) else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return isinstance(key, str) and getattr(self, key, None) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if isinstance(key, str) else None
+        return default if value is None else value
+
+    def keys(self):
+        return [f.name for f in fields(self) if not f.name.startswith("_") and getattr(self, f.name) is not None]
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+
+@dataclass(slots=True)
+class Position(Record):
+    name: str
+    hourlyRate: float
+    maxGuests: int
+    min: int = None
+
+
+@dataclass(slots=True)
+class Employee(Record):
+    id: int
+    pos: str
+    roles: tuple
+    ph: int
+    maxh: int
+    # {day: "open" | "off" | "H:MM-H:MM"}, as the scheduler reads it
+    availability: dict
+    hourlyRate: float = None
+
+
+@dataclass(slots=True)
+class Store(Record):
+    hours: dict
+    dailyTraffic: dict
+    positions: dict
+    empl: list
+    role_requirements: dict
+    preferred_slots: dict
+    store: object = None
+    weights: dict = None
+    # {day: (start, end)} operating hours; an end past midnight is pushed past 24
+    operating_hours: dict = field(default_factory=dict)
+    # {day: [(start, end), ...]} parsed preferred_slots, in minutes; a slot past midnight ends after 1440
+    preferred_windows: dict = field(default_factory=dict)
+    # {day: {role: array of seats needed at each hour of the day}}
+    demand: dict = field(default_factory=dict)
+    # Length in minutes of the ticks availability is tracked in: 15, 30 or 60
+    granularity: int = DEFAULT_GRANULARITY
+
+    def to_dict(self):
+        """Return the store as plain JSON-ready dicts in the scheduler's format."""
+        data = {key: self[key] for key in ("hours", "dailyTraffic", "role_requirements", "preferred_slots")}
+        data["positions"] = {name: {key: value for key, value in position.to_dict().items() if key != "name"}
+                             for name, position in self.positions.items()}
+        data["empl"] = [{key: (list(value) if key == "roles" else value) for key, value in employee.to_dict().items()}
+                        for employee in self.empl]
+        for key in ("store", "weights", "granularity"):
+            if key in self:
+                data[key] = self[key]
+        return data
 
 
 def parse_json_data(json_string):
-    """Parse a JSON string and return a predefined structure."""
+    """Parse a JSON string and return it as a validated Store."""
     # Decode the JSON string into a dictionary
     parsed_data = json.loads(json_string)
 
@@ -12,62 +105,225 @@ def parse_json_data(json_string):
     return structured_data
 
 
-def enforce_structure(data):
-    """Enforce a predefined structure on the parsed data."""
+def _minutes(time, what):
+    # "H:MM" as minutes past midnight, up to 24:00, checked the way window_minutes will read it
+    parts = time.split(":") if isinstance(time, str) else ()
+    if (len(parts) != 2 or not all(part.isascii() and part.isdigit() for part in parts) or len(parts[1]) != 2
+            or int(parts[1]) > 59 or int(parts[0]) * 60 + int(parts[1]) > DAY_MINUTES):
+        raise ValueError(f"Incorrect time {time!r} in {what}")
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def _hour(time, what):
+    return _minutes(time, what) // 60
+
+
+def parse_window(window, what):
+    """Parse "HH:MM-HH:MM" into (start, end) hours, checking both times in full; start and end must differ."""
+    if not isinstance(window, str) or window.count("-") != 1:
+        raise ValueError(f"Incorrect window {window!r} in {what}")
+    start, end = window.split("-")
+    if _minutes(start, what) == _minutes(end, what):
+        raise ValueError(f"Empty window {window!r} in {what}")
+    return _hour(start, what), _hour(end, what)
+
+
+def parse_slot(window, what, granularity=DEFAULT_GRANULARITY):
+    """Parse "HH:MM-HH:MM" into (start, end) minutes, checking it starts and ends on the granularity."""
+    parse_window(window, what)
+    start, end = window_minutes(window)
+    if start % granularity or end % granularity:
+        raise ValueError(f"Window {window!r} in {what} is not on the {granularity}-minute grid")
+    return start, end
+
+
+def _role(name, roles):
+    # Every mention of a role shares one string object
+    return roles.setdefault(name, sys.intern(name))
 
-    # 1. Enforce structure for 'hours'
-    if 'hours' not in data or not isinstance(data['hours'], dict):
+
+def _int(value, key, what):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"Missing or incorrect type for {key} in {what}")
+    return value
+
+
+def _number(value, key, what):
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError(f"Missing or incorrect type for {key} in {what}")
+    return value
+
+
+def parse_hours(hours):
+    """
+    Check a store's hours in either dialect and return (hours, operating_hours): the hours in the scheduler's
+    {day: {"operatingHours": [...], ...}} form, and {day: (start, end)} integer operating hours, where an end at or
+    before the start runs past midnight (past 24).
+    """
+    if not isinstance(hours, dict):
         raise ValueError("Missing or incorrect type for key: hours")
-    for day, timing in data['hours'].items():
-        if 'operatingHours' not in timing or not isinstance(timing['operatingHours'], list):
-            raise ValueError(
-                f"Missing or incorrect type for operatingHours for day: {day}")
+    normalized, operating = {}, {}
+    for day, timing in hours.items():
+        if isinstance(timing, dict):
+            times = timing.get("operatingHours")
+            if not isinstance(times, list) or len(times) < 2:
+                raise ValueError(f"Missing or incorrect type for operatingHours for day: {day}")
+            start, end = _hour(times[0], f"hours for day: {day}"), _hour(times[1], f"hours for day: {day}")
+            normalized[day] = timing
+        elif isinstance(timing, list) and timing:
+            # The generator's ["operating window", "open window"]
+            start, end = parse_window(timing[0], f"hours for day: {day}")
+            normalized[day] = {"operatingHours": timing[0].split("-"), "openHours": timing[1:]}
+        else:
+            raise ValueError(f"Missing or incorrect type for operatingHours for day: {day}")
+        operating[day] = (start, end + 24 if end <= start else end)
+    return normalized, operating
 
-    # 2. Enforce structure for 'dailyTraffic'
-    if 'dailyTraffic' not in data or not isinstance(data['dailyTraffic'], dict):
-        raise ValueError("Missing or incorrect type for key: dailyTraffic")
-    for day, traffic in data['dailyTraffic'].items():
-        if not all(isinstance(i, int) for i in traffic):
-            raise ValueError(
-                f"Incorrect values in dailyTraffic for day: {day}")
 
-    # 3. Enforce structure for 'positions'
-    if 'positions' not in data or not isinstance(data['positions'], dict):
+def _parse_positions(positions, roles):
+    if not isinstance(positions, dict):
         raise ValueError("Missing or incorrect type for key: positions")
-    for position, details in data['positions'].items():
-        if 'maxGuests' not in details or not isinstance(details['maxGuests'], int):
-            raise ValueError(
-                f"Missing or incorrect type for maxGuests in position: {position}")
-        if 'rate' not in details or not isinstance(details['rate'], int):
-            raise ValueError(
-                f"Missing or incorrect type for rate in position: {position}")
+    parsed = {}
+    for name, details in positions.items():
+        what = f"position: {name}"
+        if not isinstance(details, dict):
+            raise ValueError(f"Missing or incorrect type for {what}")
+        rate = details.get("hourlyRate", details.get("rate"))
+        name = _role(name, roles)
+        parsed[name] = Position(
+            name=name,
+            hourlyRate=_number(rate, "hourlyRate", what),
+            maxGuests=_int(details.get("maxGuests"), "maxGuests", what),
+            min=_int(details["min"], "min", what) if "min" in details else None)
+    return parsed
 
-    # 4. Enforce structure for 'empl'
-    if 'empl' not in data or not isinstance(data['empl'], list):
-        raise ValueError("Missing or incorrect type for key: empl")
-    for employee in data['empl']:
-        if 'id' not in employee or not isinstance(employee['id'], int):
-            raise ValueError(
-                "Missing or incorrect type for id in employee data")
-        if 'pos' not in employee or not isinstance(employee['pos'], str):
-            raise ValueError(
-                "Missing or incorrect type for pos in employee data")
-        if 'ph' not in employee or not isinstance(employee['ph'], int):
-            raise ValueError(
-                "Missing or incorrect type for ph in employee data")
-        if 'avl' not in employee or not isinstance(employee['avl'], list):
-            raise ValueError(
-                "Missing or incorrect type for avl in employee data")
 
-    return data
+def _parse_availability(employee, what):
+    availability = {}
+    if isinstance(employee.get("availability"), dict):
+        items = employee["availability"].items()
+    elif isinstance(employee.get("avl"), list):
+        # The generator's per-day list, in DAYS order: 1, 0 or a window
+        items = [(day, value if isinstance(value, str) else "open" if value else "off")
+                 for day, value in zip(DAYS, employee["avl"])]
+    else:
+        raise ValueError(f"Missing or incorrect type for availability in {what}")
+    for day, value in items:
+        if value not in ("open", "off"):
+            # Checked here so bad windows are reported with the employee, not deep inside a solve
+            parse_window(value, what)
+        availability[day] = value
+    return availability
+
 
+def _parse_employee(employee, roles):
+    if not isinstance(employee, dict):
+        raise ValueError("Incorrect employee data")
+    employee_id = _int(employee.get("id"), "id", "employee data")
+    what = f"employee data: {employee_id}"
+    if "roles" in employee:
+        if (not isinstance(employee["roles"], list) or not employee["roles"]
+                or not all(isinstance(role, str) for role in employee["roles"])):
+            raise ValueError(f"Missing or incorrect type for roles in {what}")
+        employee_roles = tuple(_role(role, roles) for role in employee["roles"])
+        pos = _role(employee["pos"], roles) if isinstance(employee.get("pos"), str) else employee_roles[0]
+    elif isinstance(employee.get("pos"), str):
+        pos = _role(employee["pos"], roles)
+        employee_roles = (pos,)
+    else:
+        raise ValueError(f"Missing or incorrect type for pos in {what}")
+    availability = _parse_availability(employee, what)
+    return Employee(
+        id=employee_id,
+        pos=pos,
+        roles=employee_roles,
+        ph=_int(employee.get("ph"), "ph", what),
+        maxh=_int(employee.get("maxh"), "maxh", what),
+        availability=availability,
+        hourlyRate=_number(employee["hourlyRate"], "hourlyRate", what) if "hourlyRate" in employee else None)
 
 
+def required_staff_for_guests(guest_count, max_guests_per_employee):
+    # Calculate the required number of employees based on guest count.
+    return (guest_count + max_guests_per_employee - 1) // max_guests_per_employee
 
 
+def hourly_demand_arrays(traffic, positions, start, end):
+    """
+    Return {role: array of seats needed at each hour 0..end} for the operating hours start..end: at least the
+    role's "min", and enough for the guests where it has a maxGuests. Traffic is indexed by hour of the day; hours
+    past the end of the traffic list count as no guests. positions may be Positions or plain dicts.
+    """
+    demand = {}
+    for role, position in positions.items():
+        seats = array('i', bytes(4 * end))
+        max_guests = position.get("maxGuests", 0)
+        for hour in range(start, end):
+            guests = traffic[hour % 24] if hour % 24 < len(traffic) else 0
+            needed = position.get("min", 0)
+            if max_guests > 0:
+                needed = max(needed, required_staff_for_guests(guests, max_guests))
+            seats[hour] = needed
+        if any(seats):
+            demand[role] = seats
+    return demand
+
+
+def enforce_structure(data):
+    """Validate the parsed data and return it as a Store, checking and converting each field once."""
+    if not isinstance(data, dict):
+        raise ValueError("Incorrect type for store data")
+    roles = {}
 
-# Add the updated functions to our script content
+    # 1. Hours, parsed to integer operating hours
+    hours, operating_hours = parse_hours(data.get("hours"))
 
+    # 2. Daily traffic
+    if not isinstance(data.get("dailyTraffic"), dict):
+        raise ValueError("Missing or incorrect type for key: dailyTraffic")
+    for day, traffic in data["dailyTraffic"].items():
+        if not isinstance(traffic, list) or not all(isinstance(i, int) for i in traffic):
+            raise ValueError(
+                f"Incorrect values in dailyTraffic for day: {day}")
+
+    # 3. Positions
+    positions = _parse_positions(data.get("positions"), roles)
+
+    # 4. Employees
+    if not isinstance(data.get("empl"), list):
+        raise ValueError("Missing or incorrect type for key: empl")
+    employees = [_parse_employee(employee, roles) for employee in data["empl"]]
 
+    # 5. Greedy phase inputs
+    role_requirements = data.get("role_requirements", {})
+    if not isinstance(role_requirements, dict):
+        raise ValueError("Incorrect type for key: role_requirements")
+    role_requirements = {_role(role, roles): _int(count, role, "role_requirements")
+                         for role, count in role_requirements.items()}
+    preferred_slots = data.get("preferred_slots", {})
+    if not isinstance(preferred_slots, dict):
+        raise ValueError("Incorrect type for key: preferred_slots")
+    granularity = data.get("granularity", DEFAULT_GRANULARITY)
+    try:
+        check_granularity(granularity)
+    except ValueError as e:
+        raise ValueError(f"Incorrect value for key: granularity ({e})") from None
+    preferred_windows = {day: [parse_slot(slot, f"preferred_slots for day: {day}", granularity) for slot in slots]
+                         for day, slots in preferred_slots.items()}
 
+    demand = {day: hourly_demand_arrays(data["dailyTraffic"].get(day, []), positions, start, end)
+              for day, (start, end) in operating_hours.items()}
 
+    return Store(
+        hours=hours,
+        dailyTraffic=data["dailyTraffic"],
+        positions=positions,
+        empl=employees,
+        role_requirements=role_requirements,
+        preferred_slots=preferred_slots,
+        store=data.get("store", data.get("id")),
+        weights=data.get("weights"),
+        operating_hours=operating_hours,
+        preferred_windows=preferred_windows,
+        demand=demand,
+        granularity=granularity)
@@ -0,0 +1,149 @@
+"""
+Rolling-horizon scheduling over several weeks.
+
+Weeks are planned one at a time. Between weeks only a small CarryOver state is kept: every employee's cumulative
+scheduled and preferred hours and the end of their last shift. Each new week is scheduled and annealed on its own,
+with that state folded into its inputs:
+
+    - an employee whose last shift ended late is not available on the first day until the rest period is over,
+    - preferred hours become the week's share of the cumulative target, so anyone under- or over-scheduled so far
+      is pulled back towards it, within maxh,
+    - the greedy phase starts from the cumulative hours, so it hands shifts to the people who have had fewest.
+
+The work per week does not depend on how many weeks came before, so a plan costs linearly in its length.
+"""
+
+import random
+
+from availability import DAY_MINUTES, DEFAULT_GRANULARITY, WEEK_DAYS, normalize_availability, window_minutes
+from breakindex import MIN_BREAK_HOURS
+from calculateschedule import (DEFAULT_WEIGHTS, day_shifts, generate_entire_weekly_schedule_v4, hours_by_employee,
+                               simulated_annealing_v2)
+from candidatepool import CandidatePool
+
+
+WEEK_MINUTES = DAY_MINUTES * len(WEEK_DAYS)
+
+
+class CarryOver:
+    """What later weeks need to know about the weeks already planned."""
+    __slots__ = ("weeks", "hours", "preferred", "last_end")
+
+    def __init__(self, weeks=0, hours=None, preferred=None, last_end=None):
+        self.weeks = weeks
+        # employee id -> scheduled and preferred hours summed over the planned weeks
+        self.hours = dict(hours or {})
+        self.preferred = dict(preferred or {})
+        # employee id -> end of their last shift, in minutes from the start of the next week (usually negative)
+        self.last_end = dict(last_end or {})
+
+    def advance(self, schedule, employees):
+        """Fold a finished week's schedule into the state."""
+        scheduled = hours_by_employee(schedule)
+        for employee in employees:
+            employee_id = employee["id"]
+            self.hours[employee_id] = self.hours.get(employee_id, 0) + scheduled[employee_id]
+            self.preferred[employee_id] = self.preferred.get(employee_id, 0) + employee["ph"]
+        last_end = {employee_id: end - WEEK_MINUTES for employee_id, end in self.last_end.items()
+                    if end - WEEK_MINUTES > -WEEK_MINUTES}
+        for day in schedule:
+            if day not in WEEK_DAYS:
+                continue
+            offset = DAY_MINUTES * WEEK_DAYS.index(day) - WEEK_MINUTES
+            for employee_id, _, _, end in day_shifts(schedule, day):
+                last_end[employee_id] = max(last_end.get(employee_id, offset + end), offset + end)
+        self.last_end = last_end
+        self.weeks += 1
+
+    def to_dict(self):
+        return {"weeks": self.weeks, "hours": self.hours, "preferred": self.preferred, "last_end": self.last_end}
+
+    @classmethod
+    def from_dict(cls, state):
+        # JSON turns integer employee ids into strings
+        def ids(mapping):
+            return {int(k) if isinstance(k, str) and k.isdigit() else k: v for k, v in mapping.items()}
+        return cls(state["weeks"], ids(state["hours"]), ids(state["preferred"]), ids(state["last_end"]))
+
+
+def _clock(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def rested_availability(availability, earliest):
+    """Return a first-day availability value that starts no earlier than the given minute."""
+    if earliest <= 0 or availability == "off":
+        return availability
+    if availability == "open":
+        return f"{_clock(earliest)}-48:00"
+    start, end = window_minutes(availability)
+    if max(start, earliest) >= end:
+        return "off"
+    return f"{_clock(max(start, earliest))}-{_clock(end)}"
+
+
+def week_employees(employees, carry, min_rest=MIN_BREAK_HOURS):
+    """Return copies of the employees with this week's preferred hours and first-day availability."""
+    adjusted = []
+    first_day = WEEK_DAYS[0]
+    for employee in employees:
+        employee_id = employee["id"]
+        week = dict(employee)
+        if carry.weeks:
+            # Aim to bring the running total back to ph per week
+            target = carry.preferred.get(employee_id, 0) + employee["ph"] - carry.hours.get(employee_id, 0)
+            week["ph"] = min(max(target, 0), employee["maxh"])
+        if employee_id in carry.last_end:
+            availability = dict(normalize_availability(employee))
+            availability[first_day] = rested_availability(
+                availability.get(first_day, "off"), carry.last_end[employee_id] + round(min_rest * 60))
+            week["availability"] = availability
+        adjusted.append(week)
+    return adjusted
+
+
+def week_candidates(employees, carry):
+    """A candidate pool whose loads start from the hours already worked, for the greedy phase."""
+    candidates = CandidatePool(employees, roles_of=lambda e: e["roles"])
+    for idx, employee in enumerate(employees):
+        worked = carry.hours.get(employee["id"], 0)
+        if worked:
+            candidates.add_load(idx, worked)
+    return candidates
+
+
+def plan_week(data, carry, daily_traffic=None, weights=None, max_iterations=2000, min_rest=MIN_BREAK_HOURS,
+              rng=random):
+    """Schedule the next week given the carried-over state, and advance the state past it. Returns the schedule."""
+    employees = week_employees(data["empl"], carry, min_rest)
+    week_data = {
+        "empl": employees,
+        "positions": data["positions"],
+        "hours": data["hours"],
+        "dailyTraffic": data["dailyTraffic"] if daily_traffic is None else daily_traffic,
+        "role_requirements": data["role_requirements"],
+        "preferred_slots": data["preferred_slots"],
+        "preferred_windows": data.get("preferred_windows", {}),
+        "granularity": data.get("granularity", DEFAULT_GRANULARITY),
+    }
+    schedule = generate_entire_weekly_schedule_v4(week_data, candidates=week_candidates(employees, carry))
+    if max_iterations:
+        schedule = simulated_annealing_v2(
+            schedule, employees, data["positions"], week_data["dailyTraffic"], weights or DEFAULT_WEIGHTS,
+            max_iterations=max_iterations, rng=rng)
+    carry.advance(schedule, data["empl"])
+    return schedule
+
+
+def plan_horizon(data, weeks, carry=None, traffic_by_week=None, weights=None, max_iterations=2000,
+                 min_rest=MIN_BREAK_HOURS, rng=random):
+    """
+    Plan several weeks in a row and return (schedules, carry). traffic_by_week optionally gives each week its own
+    dailyTraffic; carry continues a plan from an earlier call and is updated in place.
+    """
+    carry = carry or CarryOver()
+    schedules = []
+    for week in range(weeks):
+        traffic = traffic_by_week[week] if traffic_by_week is not None else None
+        schedules.append(plan_week(data, carry, traffic, weights, max_iterations, min_rest, rng))
+    return schedules, carry
@@ -0,0 +1,305 @@
+"""
+Streaming and columnar output for large schedules.
+
+ScheduleWriter streams schedules and evaluate_schedule reports as JSON lines, one line per day of a schedule and
+one per report, so a region-wide run never holds more than a day's worth of output text in memory:
+
+    {"store": 7, "day": "mo", "shifts": [{"employee_id": 3, "role": "server", "slot": "10:00-15:00"}, ...]}
+    {"store": 7, "evaluation": {"hours_difference": -12, ...}}
+
+write_columnar stores a schedule in a little-endian binary file of int32 columns, one row per assignment, that
+payroll tools can load without parsing JSON:
+
+    day       index into the day table
+    start     slot start, in minutes since midnight of the day (-1 for an entry without a slot)
+    end       slot end, in minutes; a slot past midnight ends after 1440
+    employee  index into the employee table
+    role      index into the role table
+    slot      index into the slot string table (-1 for an entry without a slot)
+
+Rows are grouped by day, in the schedule's day order. The file starts with the magic b"SCHEDCOL", the format version
+and the row count, followed by the tables (days with their row counts, employee ids, roles and slots) and then the
+columns, each aligned to 8 bytes. String tables are a count, that many uint32 byte lengths, then the UTF-8 bytes.
+Employee ids that are all integers are stored as an int64 array instead, and a mix of integer and string ids as a
+string table preceded by one type tag byte per id, so every id reads back as the type it was written as; other id
+types are rejected. ColumnarSchedule maps a file back in and
+exposes the columns as memoryviews over the mapping, without copying, and to_compact turns it into a
+CompactSchedule for warm starts and repairs.
+"""
+
+from array import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+from compactschedule import NO_SLOT, CompactSchedule
+
+
+MAGIC = b"SCHEDCOL"
+# Version 2 added MIXED_IDS; version 1 files read the same
+VERSION = 2
+COLUMNS = ("day", "start", "end", "employee", "role", "slot")
+
+# How the employee table is stored
+INT_IDS, STRING_IDS, MIXED_IDS = 0, 1, 2
+
+# Per-id type tags of a MIXED_IDS table
+INT_TAG, STRING_TAG = 0, 1
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+_HEADER = struct.Struct("<8sII")
+_COUNT = struct.Struct("<I")
+
+
+class ScheduleWriter:
+    """Write schedules and evaluation reports to a text sink as they are produced, one JSON line at a time."""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def _write(self, record):
+        self.sink.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def write_schedule(self, schedule, store=None):
+        """Write one line per day of the schedule."""
+        for day in schedule:
+            self._write({"store": store, "day": day, "shifts": [dict(entry) for entry in schedule[day]]})
+
+    def write_evaluation(self, evaluation, store=None):
+        self._write({"store": store, "evaluation": evaluation})
+
+    def flush(self):
+        self.sink.flush()
+
+
+def read_jsonl(lines):
+    """
+    Yield (store, schedule, evaluation) from ScheduleWriter output. A schedule's records are gathered until the
+    next one starts: a different store, a day seen already, or a day or second evaluation after its evaluation, so
+    back-to-back schedules of one store (or of no store) stay apart. evaluation is None if none was written, and
+    other records (such as errors) are skipped.
+    """
+    store, schedule, evaluation, started = None, {}, None, False
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if "evaluation" not in record and "day" not in record:
+            continue
+        if started and (record.get("store") != store or evaluation is not None or record.get("day") in schedule):
+            yield store, schedule, evaluation
+            schedule, evaluation = {}, None
+        store, started = record.get("store"), True
+        if "evaluation" in record:
+            evaluation = record["evaluation"]
+        else:
+            schedule.setdefault(record["day"], []).extend(record["shifts"])
+    if started:
+        yield store, schedule, evaluation
+
+
+# Columnar files
+
+def _little_endian(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def _pad(f):
+    f.write(bytes(-f.tell() % 8))
+
+
+def _write_strings(f, strings):
+    encoded = [s.encode() for s in strings]
+    f.write(_COUNT.pack(len(encoded)))
+    f.write(_little_endian(array('I', map(len, encoded))).tobytes())
+    f.write(b"".join(encoded))
+    _pad(f)
+
+
+def _id_tag(employee_id):
+    if isinstance(employee_id, int) and not isinstance(employee_id, bool):
+        return INT_TAG
+    if isinstance(employee_id, str):
+        return STRING_TAG
+    raise ValueError(f"Unsupported employee id {employee_id!r}: columnar files hold int and str ids only")
+
+
+def write_columnar(schedule, path):
+    """Write a schedule ({day: [assignment, ...]} or CompactSchedule) to a columnar file; returns the row count."""
+    compact = schedule if isinstance(schedule, CompactSchedule) else CompactSchedule.from_dict(schedule)
+    days = list(compact)
+    rows = array('i')
+    day_column = array('i')
+    for day_idx, day in enumerate(days):
+        order = compact[day].order
+        rows.extend(order)
+        day_column.extend([day_idx] * len(order))
+    entry_slot = compact.entry_slot
+    slot_column = array('i', map(entry_slot.__getitem__, rows))
+    slot_start, slot_end = compact.slot_start, compact.slot_end
+    columns = {
+        "day": day_column,
+        "start": array('i', (slot_start[slot] if slot != NO_SLOT else -1 for slot in slot_column)),
+        "end": array('i', (slot_end[slot] if slot != NO_SLOT else -1 for slot in slot_column)),
+        "employee": array('i', map(compact.entry_employee.__getitem__, rows)),
+        "role": array('i', map(compact.entry_role.__getitem__, rows)),
+        "slot": slot_column,
+    }
+
+    employee_ids = compact.employee_ids
+    tags = bytes(map(_id_tag, employee_ids))
+    if STRING_TAG not in tags and all(INT64_MIN <= employee_id <= INT64_MAX for employee_id in employee_ids):
+        id_kind = INT_IDS
+    elif INT_TAG not in tags:
+        id_kind = STRING_IDS
+    else:
+        id_kind = MIXED_IDS
+    # Written to a temporary name and moved into place, so readers never map half a file
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(rows)))
+            _write_strings(f, days)
+            f.write(_little_endian(array('i', (len(compact[day]) for day in days))).tobytes())
+            _pad(f)
+            f.write(_COUNT.pack(id_kind))
+            if id_kind == INT_IDS:
+                f.write(_COUNT.pack(len(employee_ids)))
+                _pad(f)
+                f.write(_little_endian(array('q', employee_ids)).tobytes())
+            elif id_kind == STRING_IDS:
+                _write_strings(f, employee_ids)
+            else:
+                f.write(_COUNT.pack(len(employee_ids)))
+                f.write(tags)
+                _pad(f)
+                _write_strings(f, map(str, employee_ids))
+            _write_strings(f, compact.roles)
+            _write_strings(f, compact.slots)
+            for name in COLUMNS:
+                f.write(_little_endian(columns[name]).tobytes())
+                _pad(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return len(rows)
+
+
+class ColumnarSchedule:
+    """
+    A columnar schedule file mapped into memory. The columns are int32 memoryviews over the mapping; call close()
+    (or use it as a context manager) once they are no longer needed.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self._views = []
+        try:
+            self._read()
+        except BaseException:
+            self.close()
+            raise
+
+    def _cast(self, offset, count, typecode, size):
+        end = offset + count * size
+        if end > len(self._view):
+            raise ValueError("Truncated columnar schedule file")
+        view = self._view[offset:end].cast(typecode)
+        if sys.byteorder == "big":
+            # Only big-endian hosts pay for a copy
+            view = _little_endian(array(typecode, view))
+        else:
+            self._views.append(view)
+        return view, offset + count * size + (-(count * size) % 8)
+
+    def _strings(self, offset):
+        (count,) = _COUNT.unpack_from(self._view, offset)
+        lengths, _ = self._cast(offset + 4, count, 'I', 4)
+        offset += 4 + 4 * count
+        strings = []
+        for length in lengths:
+            strings.append(bytes(self._view[offset:offset + length]).decode())
+            offset += length
+        return strings, offset + (-offset % 8)
+
+    def _read(self):
+        if len(self._view) < _HEADER.size:
+            raise ValueError("Not a columnar schedule file")
+        magic, version, self.rows = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a columnar schedule file")
+        if not 1 <= version <= VERSION:
+            raise ValueError(f"Unsupported columnar schedule version: {version}")
+        self.days, offset = self._strings(_HEADER.size)
+        self.day_counts, offset = self._cast(offset, len(self.days), 'i', 4)
+        (kind,) = _COUNT.unpack_from(self._view, offset)
+        if kind == INT_IDS:
+            (count,) = _COUNT.unpack_from(self._view, offset + 4)
+            ids, offset = self._cast(offset + 8, count, 'q', 8)
+            self.employee_ids = list(ids)
+        elif kind == STRING_IDS:
+            self.employee_ids, offset = self._strings(offset + 4)
+        elif kind == MIXED_IDS:
+            (count,) = _COUNT.unpack_from(self._view, offset + 4)
+            tags, offset = self._cast(offset + 8, count, 'B', 1)
+            ids, offset = self._strings(offset)
+            self.employee_ids = [int(employee_id) if tag == INT_TAG else employee_id
+                                 for tag, employee_id in zip(tags, ids)]
+        else:
+            raise ValueError(f"Unsupported employee id table: {kind}")
+        self.roles, offset = self._strings(offset)
+        self.slots, offset = self._strings(offset)
+        self.columns = {}
+        for name in COLUMNS:
+            self.columns[name], offset = self._cast(offset, self.rows, 'i', 4)
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Views into the mapping have to be released before it can be closed
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._view.release()
+        self._map.close()
+
+    def shifts(self):
+        """Yield (day, employee_id, role, start, end) for every row."""
+        days, employee_ids, roles = self.days, self.employee_ids, self.roles
+        columns = self.columns
+        for day, employee, role, start, end in zip(columns["day"], columns["employee"], columns["role"],
+                                                   columns["start"], columns["end"]):
+            yield days[day], employee_ids[employee], roles[role], start, end
+
+    def to_compact(self):
+        """Copy the schedule into a CompactSchedule, column by column."""
+        days = {}
+        first = 0
+        for day, count in zip(self.days, self.day_counts):
+            days[day] = range(first, first + count)
+            first += count
+        return CompactSchedule.from_columns(self.employee_ids, self.roles, self.slots, self.columns["employee"],
+                                            self.columns["role"], self.columns["slot"], days)
+
+
+def read_columnar(path):
+    """Load a columnar schedule file as a CompactSchedule."""
+    with ColumnarSchedule(path) as columnar:
+        return columnar.to_compact()
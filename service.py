@@ -0,0 +1,375 @@
+"""
+Local asyncio scheduling service.
+
+Clients connect over a Unix socket or loopback TCP and exchange JSON lines. Each store submitted becomes a job that
+waits in a priority queue until one of the workers picks it up. The worker runs the greedy phase, anytime annealing
+and evaluate_schedule in a pool of solver processes, so solves run in parallel and the event loop stays free to
+accept jobs and stream progress. Progress comes back over a shared queue, and cancelling a job sets a shared event
+the solver polls. Requests:
+
+    {"op": "submit", "store": {...}, "priority": 0, "time_budget": 2.0, "engine": "tabu"}   -> {"ok": true, "job": 1}
+    {"op": "watch", "job": 1}           -> progress events ({"event": "progress", "best_cost": ...}), then the result
+    {"op": "status", "job": 1}          -> the job's state, priority and best cost so far
+    {"op": "result", "job": 1}          -> waits for the job and returns its schedule and evaluation
+    {"op": "cancel", "job": 1}          -> stops the job, keeping the best schedule found so far
+    {"op": "reprioritize", "job": 1, "priority": 5}
+
+Higher priorities run first; among equals, jobs run in the order submitted. engine is one of the optimizers
+engines (annealing by default); only annealing streams progress as it goes, the others report their final cost.
+
+    python service.py --port 8765
+    python service.py --unix /tmp/scheduler.sock
+    python service.py --profile trace.json     # instrument every solve; the trace is written on shutdown
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+from calculateschedule import (DEFAULT_WEIGHTS, ScheduleCost, anneal_anytime, evaluate_schedule,
+                               generate_entire_weekly_schedule_v4)
+import instrumentation
+from optimizers import OPTIMIZERS, optimize
+from parsejson import enforce_structure
+
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Longest request line accepted; a store with thousands of employees runs to megabytes of JSON
+LINE_LIMIT = 64 * 1024 * 1024
+
+# How often a solver process checks whether its job has been cancelled
+STOP_POLL_SECONDS = 0.05
+
+
+class _StopCheck:
+    """should_stop for a solver process: polls the job's shared stop event at most every interval seconds."""
+
+    def __init__(self, event, interval=STOP_POLL_SECONDS):
+        self.event = event
+        self.interval = interval
+        self.checked = time.monotonic()
+        self.stopped = False
+
+    def __call__(self):
+        now = time.monotonic()
+        if now - self.checked >= self.interval:
+            self.checked = now
+            self.stopped = self.event.is_set()
+        return self.stopped
+
+
+def solve_job(job_id, store, options, events, stop, profile=False):
+    """
+    Run one job in a solver process and return (schedule, best_cost, evaluation, recorder). Each improvement is put
+    on events as (job_id, best_cost, seconds); the search ends early, keeping its best schedule, once stop is set.
+    With profile, the job runs under instrumentation and recorder is its Recorder; otherwise it is None.
+    """
+    recorder = instrumentation.enable() if profile else None
+    try:
+        return _solve(job_id, store, options, events, stop) + (recorder,)
+    finally:
+        if profile:
+            instrumentation.disable()
+
+
+def _solve(job_id, store, options, events, stop):
+    data = enforce_structure(store)
+    weights = options.get("weights") or data.get("weights", DEFAULT_WEIGHTS)
+    start = time.monotonic()
+    schedule = generate_entire_weekly_schedule_v4(data)
+    engine = options.get("engine", "annealing")
+    if engine == "annealing":
+        for best, best_cost in anneal_anytime(
+                schedule, data["empl"], data["positions"], data["dailyTraffic"], weights,
+                time_budget=options.get("time_budget", 2.0), max_iterations=options.get("max_iterations"),
+                should_stop=_StopCheck(stop)):
+            events.put((job_id, best_cost, time.monotonic() - start))
+        best = best.result()
+    else:
+        best = optimize(schedule, data, weights, engine, options.get("time_budget", 2.0),
+                        max_iterations=options.get("max_iterations"), should_stop=_StopCheck(stop))
+        best_cost = ScheduleCost(best, data["empl"], data["positions"], weights).total()
+        events.put((job_id, best_cost, time.monotonic() - start))
+    evaluation = evaluate_schedule(best, data["empl"], data["hours"], data["positions"], demand=data.get("demand"))
+    return best.to_dict() if hasattr(best, "to_dict") else best, best_cost, evaluation
+
+
+class Job:
+    """One submitted store and everything clients can ask about it."""
+
+    def __init__(self, job_id, store, priority, options):
+        self.id = job_id
+        self.store = store
+        self.priority = priority
+        self.options = options
+        self.state = QUEUED
+        self.best_cost = None
+        self.schedule = None
+        self.evaluation = None
+        self.error = None
+        # Shared with the solver process once the job starts
+        self.stop = None
+        self.finished = asyncio.Event()
+        self.watchers = []
+
+    def status(self):
+        return {"job": self.id, "state": self.state, "priority": self.priority, "best_cost": self.best_cost}
+
+    def publish(self, event):
+        # Only ever called on the event loop thread
+        for queue in self.watchers:
+            queue.put_nowait(event)
+
+    def result(self):
+        result = self.status()
+        if self.error is not None:
+            result["error"] = self.error
+        if self.schedule is not None:
+            result["schedule"] = self.schedule
+            result["evaluation"] = self.evaluation
+        return result
+
+
+class SchedulingService:
+    """A priority queue of scheduling jobs served by a pool of solver processes."""
+
+    def __init__(self, workers=None, profile=False):
+        self.workers = workers or os.cpu_count() or 1
+        # With profile, every job's instrumentation is merged in here
+        self.recorder = instrumentation.Recorder() if profile else None
+        # Spawned rather than forked: the service process has the event loop and relay threads running
+        context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self._manager = context.Manager()
+        self._events = self._manager.Queue()
+        self._relay = None
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._order = itertools.count()
+        # (-priority, order, job id); reprioritized jobs are pushed again and stale entries skipped
+        self._queue = []
+        self._ready = asyncio.Condition()
+        self._tasks = []
+        self._servers = []
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """Start the workers and listen on a Unix socket at path, or on host:port (loopback by default)."""
+        loop = asyncio.get_running_loop()
+        self._relay = threading.Thread(target=self._relay_progress, args=(loop,), name="progress", daemon=True)
+        self._relay.start()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if path is not None:
+            server = await asyncio.start_unix_server(self._handle, path=path, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self._handle, host, port, limit=LINE_LIMIT)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        for job in self.jobs.values():
+            if job.stop is not None:
+                job.stop.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Waiting for the solver processes and the relay thread blocks, so it happens off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.executor.shutdown)
+        if self._relay is not None:
+            self._events.put(None)
+            await loop.run_in_executor(None, self._relay.join)
+        await loop.run_in_executor(None, self._manager.shutdown)
+
+    # Job control
+
+    async def submit(self, store, priority=0, **options):
+        job = Job(next(self._ids), store, priority, options)
+        self.jobs[job.id] = job
+        async with self._ready:
+            heapq.heappush(self._queue, (-priority, next(self._order), job.id))
+            self._ready.notify()
+        return job
+
+    async def reprioritize(self, job_id, priority):
+        job = self.jobs[job_id]
+        job.priority = priority
+        if job.state == QUEUED:
+            async with self._ready:
+                heapq.heappush(self._queue, (-priority, next(self._order), job_id))
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs[job_id]
+        if job.state == QUEUED:
+            self._finish(job, CANCELLED)
+        elif job.state == RUNNING:
+            # The solver notices at its next check and keeps the best schedule so far
+            job.stop.set()
+        return job
+
+    async def watch(self, job_id):
+        """Yield the job's events as they happen, ending with its result."""
+        job = self.jobs[job_id]
+        queue = asyncio.Queue()
+        job.watchers.append(queue)
+        try:
+            if job.best_cost is not None:
+                yield {"job": job.id, "event": "progress", "best_cost": job.best_cost}
+            while not job.finished.is_set():
+                getter = asyncio.ensure_future(queue.get())
+                finished = asyncio.ensure_future(job.finished.wait())
+                done, _ = await asyncio.wait({getter, finished}, return_when=asyncio.FIRST_COMPLETED)
+                finished.cancel()
+                if getter in done:
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            while not queue.empty():
+                yield queue.get_nowait()
+            yield dict(job.result(), event="result")
+        finally:
+            job.watchers.remove(queue)
+
+    def _finish(self, job, state):
+        job.state = state
+        job.finished.set()
+
+    async def _next_job(self):
+        async with self._ready:
+            while True:
+                while self._queue:
+                    neg_priority, _, job_id = heapq.heappop(self._queue)
+                    job = self.jobs[job_id]
+                    if job.state == QUEUED and -neg_priority == job.priority:
+                        return job
+                await self._ready.wait()
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._next_job()
+            job.stop = self._manager.Event()
+            job.state = RUNNING
+            job.publish({"job": job.id, "event": "started"})
+            try:
+                job.schedule, job.best_cost, job.evaluation, recorder = await asyncio.wrap_future(
+                    self.executor.submit(solve_job, job.id, job.store, job.options, self._events, job.stop,
+                                         self.recorder is not None))
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                self._finish(job, FAILED)
+            else:
+                if recorder is not None:
+                    self.recorder.merge(recorder)
+                self._finish(job, CANCELLED if job.stop.is_set() else DONE)
+
+    def _relay_progress(self, loop):
+        # Runs on its own thread, handing progress from the solver processes back to the loop
+        for job_id, best_cost, seconds in iter(self._events.get, None):
+            loop.call_soon_threadsafe(self._progress, job_id, best_cost, seconds)
+
+    def _progress(self, job_id, best_cost, seconds):
+        job = self.jobs[job_id]
+        if job.state in FINISHED:
+            return
+        job.best_cost = best_cost
+        job.publish({"job": job.id, "event": "progress", "best_cost": best_cost, "seconds": seconds})
+
+    # Protocol
+
+    async def _send(self, writer, response):
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # The rest of an oversized line cannot be told apart from the next request, so stop reading
+                    await self._send(writer, {"ok": False, "error": f"Request line longer than {LINE_LIMIT} bytes"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    async for response in self._respond(request):
+                        await self._send(writer, response)
+                except (ValueError, KeyError, TypeError) as e:
+                    await self._send(writer, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("Request must be a JSON object")
+        op = request.get("op")
+        if op == "submit":
+            options = {key: request[key] for key in ("time_budget", "max_iterations", "weights", "engine")
+                       if key in request}
+            if options.get("engine", "annealing") not in OPTIMIZERS:
+                raise ValueError(f"Unknown optimizer: {options['engine']}")
+            job = await self.submit(request["store"], request.get("priority", 0), **options)
+            yield {"ok": True, "job": job.id}
+        elif op == "watch":
+            async for event in self.watch(request["job"]):
+                yield dict(event, ok=True)
+        elif op == "status":
+            yield dict(self.jobs[request["job"]].status(), ok=True)
+        elif op == "result":
+            job = self.jobs[request["job"]]
+            await job.finished.wait()
+            yield dict(job.result(), ok=True)
+        elif op == "cancel":
+            yield dict(self.cancel(request["job"]).status(), ok=True)
+        elif op == "reprioritize":
+            job = await self.reprioritize(request["job"], request["priority"])
+            yield dict(job.status(), ok=True)
+        else:
+            raise ValueError(f"Unknown op: {op}")
+
+
+async def serve(host="127.0.0.1", port=8765, path=None, workers=None, profile=None):
+    service = SchedulingService(workers, profile is not None)
+    server = await service.start(host, port, path)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+        if profile is not None:
+            service.recorder.write_json(profile)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve scheduling jobs over loopback TCP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="solver processes (default CPU count)")
+    parser.add_argument("--profile", metavar="PATH", help="write a Chrome trace of every solve to PATH on shutdown")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.profile))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
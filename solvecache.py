@@ -0,0 +1,244 @@
+"""
+Persistent, content-addressed cache of solved schedules.
+
+Entries are keyed by the sha256 of the store's canonical JSON (the normalized model from parse_json_data, with
+sorted keys) together with the solver settings (weights, iteration counts and annealing parameters), so an unchanged
+store solved the same way is answered straight from disk. Each entry also records a signature of everything the
+schedule has to satisfy: the employees (their roles, hours and availability), the positions, the role requirements,
+the preferred slots and the granularity. Stores that share it but differ only in traffic, hours or solver settings
+are near hits, and the cached schedule with the most annealing behind it (the most recent on ties) is used to
+warm-start the annealer instead of the greedy schedule.
+
+The cache is a directory that several worker processes can share. Files are written to a temporary name and moved
+into place with os.replace, so readers never see half an entry, and index updates and eviction hold an fcntl lock
+where that is available. The least recently used entries (by file mtime, refreshed on every hit) are evicted once the
+cache, entries and staff indexes together, grows past max_bytes; an evicted entry is dropped from its staff index,
+and an index left empty is removed.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import random
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; atomic renames still keep entries whole
+    fcntl = None
+
+from availability import DEFAULT_GRANULARITY
+from calculateschedule import DEFAULT_WEIGHTS, ScheduleCost, generate_entire_weekly_schedule_v4, simulated_annealing_v2
+from optimizers import optimize
+
+
+# Cached schedules remembered per staff signature, for near hits
+NEAR_CANDIDATES = 8
+
+
+def _plain(data):
+    return data.to_dict() if hasattr(data, "to_dict") else data
+
+
+def canonical_json(value):
+    return json.dumps(_plain(value), sort_keys=True, separators=(",", ":"), default=list)
+
+
+def input_key(data, solver=None):
+    """Return the sha256 of a store's canonical JSON and the solver settings it was solved with."""
+    return hashlib.sha256(canonical_json({"store": _plain(data), "solver": solver}).encode()).hexdigest()
+
+
+def staff_key(data):
+    """
+    Return the sha256 of the store's staff, positions, role requirements, preferred slots and granularity: the
+    constraints a cached schedule was built to, shared by weeks that differ only in demand.
+    """
+    data = _plain(data)
+    staff = {"empl": data["empl"], "positions": data["positions"],
+             "role_requirements": data.get("role_requirements", {}),
+             "preferred_slots": data.get("preferred_slots", {}),
+             "granularity": data.get("granularity", DEFAULT_GRANULARITY)}
+    return hashlib.sha256(canonical_json(staff).encode()).hexdigest()
+
+
+class SolveCache:
+    """A directory of solved schedules shared between processes, bounded to max_bytes."""
+
+    def __init__(self, root, max_bytes=256 * 1024 * 1024, near_candidates=NEAR_CANDIDATES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.near_candidates = near_candidates
+        os.makedirs(os.path.join(root, "entries"), exist_ok=True)
+        os.makedirs(os.path.join(root, "staff"), exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, "entries", key + ".json")
+
+    def _staff_path(self, key):
+        return os.path.join(self.root, "staff", key + ".json")
+
+    @contextmanager
+    def _locked(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write(self, path, value):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _load_entry(self, key):
+        path = self._entry_path(key)
+        with self._locked(exclusive=False):
+            entry = self._read(path)
+        if entry is not None:
+            try:
+                # Mark as recently used for eviction
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+        return entry
+
+    def get(self, data, solver=None):
+        """Return the cached schedule for exactly this store and solver settings, or None."""
+        entry = self._load_entry(input_key(data, solver))
+        return None if entry is None else entry["schedule"]
+
+    def nearest(self, data):
+        """
+        Return (schedule, iterations) for the cached schedule built to the same constraints with the most annealing
+        iterations behind it, the most recent on ties, or (None, 0).
+        """
+        with self._locked(exclusive=False):
+            keys = self._read(self._staff_path(staff_key(data))) or []
+        best = None
+        # Newest first, so ties keep the most recent
+        for key in reversed(keys):
+            entry = self._load_entry(key)
+            if entry is not None and (best is None or entry.get("iterations", 0) > best.get("iterations", 0)):
+                best = entry
+        return (None, 0) if best is None else (best["schedule"], best.get("iterations", 0))
+
+    def put(self, data, schedule, cost=None, solver=None, iterations=0):
+        """
+        Store the schedule solved for this store with the given solver settings and return its key. iterations is
+        the annealing behind the schedule, counting any warm start's.
+        """
+        key, staff = input_key(data, solver), staff_key(data)
+        schedule = schedule.to_dict() if hasattr(schedule, "to_dict") else schedule
+        entry = {"key": key, "staff": staff, "cost": cost, "iterations": iterations, "schedule": schedule}
+        with self._locked(exclusive=True):
+            self._write(self._entry_path(key), entry)
+            staff_path = self._staff_path(staff)
+            keys = [k for k in self._read(staff_path) or [] if k != key]
+            keys.append(key)
+            self._write(staff_path, keys[-self.near_candidates:])
+            self._evict()
+        return key
+
+    def _files(self, directory):
+        # {name: (mtime, size)} for the files in one of the cache's directories
+        files = {}
+        path = os.path.join(self.root, directory)
+        for name in os.listdir(path):
+            if name.startswith("."):
+                continue
+            try:
+                stat = os.stat(os.path.join(path, name))
+            except FileNotFoundError:
+                continue
+            files[name] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def _evict(self):
+        # Staff indexes count towards max_bytes too; evicting an entry takes it out of its staff index, and an
+        # index naming no entries is removed with it
+        entries = self._files("entries")
+        staff_sizes = {name: size for name, (_, size) in self._files("staff").items()}
+        total = sum(size for _, size in entries.values()) + sum(staff_sizes.values())
+        # Oldest first
+        for _, name in sorted((mtime, name) for name, (mtime, _) in entries.items()):
+            if total <= self.max_bytes:
+                break
+            path = os.path.join(self.root, "entries", name)
+            entry = self._read(path)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= entries[name][1]
+            if entry is not None and entry.get("staff"):
+                total += self._unindex(entry["staff"], entry["key"], staff_sizes)
+
+    def _unindex(self, staff, key, staff_sizes):
+        # Drop key from a staff index and return how much the index shrank or grew, in bytes
+        path = self._staff_path(staff)
+        name = os.path.basename(path)
+        keys = [k for k in self._read(path) or [] if k != key]
+        if keys:
+            self._write(path, keys)
+            size = os.path.getsize(path)
+        else:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size = 0
+        change, staff_sizes[name] = size - staff_sizes.get(name, 0), size
+        return change
+
+
+def solve_cached(cache, data, weights=None, max_iterations=10000, warm_iterations=None, rng=random, engine=None,
+                 time_budget=2.0, **kwargs):
+    """
+    Return (schedule, source) for a store, where source is "hit", "warm" or "cold". Exact hits (the same store and
+    solver settings) come straight from the cache; near hits anneal from the best-annealed cached schedule built to
+    the same constraints for warm_iterations steps (a quarter of max_iterations by default); anything else anneals
+    from the greedy schedule. New solutions are cached.
+
+    With an engine, the schedule is improved by that optimizers engine within time_budget seconds instead, capped
+    at the same iteration counts (0 for no cap).
+    """
+    weights = weights or data.get("weights") or DEFAULT_WEIGHTS
+    solver = {"weights": weights, "max_iterations": max_iterations, "warm_iterations": warm_iterations, **kwargs}
+    if engine is not None:
+        solver.update(engine=engine, time_budget=time_budget)
+    schedule = cache.get(data, solver)
+    if schedule is not None:
+        return schedule, "hit"
+    start, done = cache.nearest(data)
+    if start is not None:
+        source, iterations = "warm", max_iterations // 4 if warm_iterations is None else warm_iterations
+    else:
+        source, iterations, done = "cold", max_iterations, 0
+        start = generate_entire_weekly_schedule_v4(data)
+    if engine is not None:
+        schedule = optimize(start, data, weights, engine, time_budget, rng, max_iterations=iterations or None,
+                            **kwargs)
+    else:
+        schedule = simulated_annealing_v2(start, data["empl"], data["positions"], data["dailyTraffic"], weights,
+                                          max_iterations=iterations, rng=rng, **kwargs)
+    cache.put(data, schedule, ScheduleCost(schedule, data["empl"], data["positions"], weights).total(), solver,
+              done + iterations)
+    return schedule, source
@@ -0,0 +1,175 @@
+"""
+Scaling benchmark for the scheduling pipeline.
+
+Generates seeded instances with generate_test_data at a range of roster sizes and times each phase: the greedy
+weekly schedule (generate_entire_weekly_schedule_v4), simulated_annealing_v2 and evaluate_schedule. For every phase
+it records wall time and peak traced memory, plus annealing iterations per second and the final schedule cost, and
+writes the lot as JSON so results from two commits can be compared with --compare. With --engines, each optimizer
+engine is also run from the same greedy schedule for the same time budget and its final cost recorded.
+
+    python test/benchmark.py --sizes 25 100 1000 --output bench.json
+    python test/benchmark.py --output after.json --compare before.json
+    python test/benchmark.py --sizes 500 --engines annealing tabu lns --time-budget 2
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculateschedule import (evaluate_schedule, generate_entire_weekly_schedule_v4, schedule_cost_v2,
+                               simulated_annealing_v2)
+from generate_test_data import TRAFFIC_SHAPES, generate_test_data
+from optimizers import OPTIMIZERS, optimize
+
+
+DEFAULT_SIZES = [25, 100, 500, 2000, 10000]
+WEIGHTS = {"labor_cost": 1, "fairness": 1, "preference": 1}
+NOISE_SECONDS = 0.005
+
+
+def measure(fn, trace_memory=True):
+    """
+    Run fn() and return (result, seconds, peak_bytes). Tracing slows the call down, so when trace_memory is set
+    the time comes from an untraced run and the peak from a second, traced one; fn must be repeatable.
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run_case(num_employees, seed, iterations, role_mix=None, availability_density=None, traffic_shape="random",
+             trace_memory=True, engines=(), time_budget=1.0):
+    """Benchmark every phase on one generated instance and return the results as a dict."""
+    data = generate_test_data(num_employees, seed=seed, role_mix=role_mix,
+                              availability_density=availability_density, traffic_shape=traffic_shape)
+    employees, positions = data["empl"], data["positions"]
+    case = {"employees": num_employees, "seed": seed, "phases": {}}
+
+    schedule, seconds, peak = measure(lambda: generate_entire_weekly_schedule_v4(data), trace_memory)
+    case["phases"]["greedy"] = {"seconds": seconds, "peak_bytes": peak}
+    case["assignments"] = sum(len(day_schedule) for day_schedule in schedule.values())
+    case["initial_cost"] = schedule_cost_v2(schedule, employees, positions, data["dailyTraffic"], WEIGHTS)
+
+    # Same seed for the timed and traced runs, so both anneal along the same path
+    annealed, seconds, peak = measure(lambda: simulated_annealing_v2(
+        schedule, employees, positions, data["dailyTraffic"], WEIGHTS, max_iterations=iterations,
+        rng=random.Random(seed)), trace_memory)
+    case["phases"]["annealing"] = {"seconds": seconds, "peak_bytes": peak, "iterations": iterations,
+                                   "iterations_per_second": iterations / seconds if seconds else None}
+    case["final_cost"] = schedule_cost_v2(annealed, employees, positions, data["dailyTraffic"], WEIGHTS)
+
+    evaluation, seconds, peak = measure(
+        lambda: evaluate_schedule(annealed, employees, data["hours"], positions), trace_memory)
+    case["phases"]["evaluation"] = {"seconds": seconds, "peak_bytes": peak}
+    case["evaluation"] = evaluation
+
+    # Engines get the same start, seed and time budget, so their costs compare directly
+    case["engines"] = {}
+    for engine in engines:
+        optimized = optimize(schedule, data, WEIGHTS, engine, time_budget, random.Random(seed))
+        case["engines"][engine] = {
+            "time_budget": time_budget,
+            "final_cost": schedule_cost_v2(optimized, employees, positions, data["dailyTraffic"], WEIGHTS),
+            "evaluation": evaluate_schedule(optimized, employees, data["hours"], positions),
+        }
+    return case
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Return a line for every phase that got slower than the baseline by more than the threshold ratio. Phases that
+    differ by less than a few milliseconds are left out as timer noise.
+    """
+    previous = {(case["employees"], case["seed"]): case for case in baseline["results"]}
+    regressions = []
+    for case in results["results"]:
+        old = previous.get((case["employees"], case["seed"]))
+        if old is None:
+            continue
+        for phase, timing in case["phases"].items():
+            old_seconds = old["phases"].get(phase, {}).get("seconds")
+            if old_seconds and timing["seconds"] > max(old_seconds * threshold, old_seconds + NOISE_SECONDS):
+                regressions.append(f"{case['employees']:>6} employees  {phase:<10} "
+                                   f"{old_seconds:.3f}s -> {timing['seconds']:.3f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler at several roster sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="annealing iterations per case")
+    parser.add_argument("--role-mix", type=json.loads, default=None, help='JSON weights, e.g. {"server": 3}')
+    parser.add_argument("--availability-density", type=float, default=None)
+    parser.add_argument("--traffic-shape", choices=sorted(TRAFFIC_SHAPES), default="random")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced runs for peak memory")
+    parser.add_argument("--engines", nargs="+", choices=sorted(OPTIMIZERS), default=[],
+                        help="optimizer engines to compare on equal time budgets")
+    parser.add_argument("--time-budget", type=float, default=1.0, help="seconds per engine")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "parameters": {"iterations": args.iterations, "role_mix": args.role_mix,
+                       "availability_density": args.availability_density, "traffic_shape": args.traffic_shape,
+                       "engines": args.engines, "time_budget": args.time_budget},
+        "results": [],
+    }
+    for num_employees in args.sizes:
+        for seed in args.seeds:
+            case = run_case(num_employees, seed, args.iterations, args.role_mix, args.availability_density,
+                            args.traffic_shape, not args.no_memory, args.engines, args.time_budget)
+            results["results"].append(case)
+            phases = case["phases"]
+            print(f"{num_employees:>6} employees  seed {seed}  "
+                  f"greedy {phases['greedy']['seconds']:.3f}s  "
+                  f"annealing {phases['annealing']['seconds']:.3f}s "
+                  f"({phases['annealing']['iterations_per_second']:.0f} it/s)  "
+                  f"evaluation {phases['evaluation']['seconds']:.3f}s  "
+                  f"cost {case['initial_cost']:.1f} -> {case['final_cost']:.1f}")
+            for engine, outcome in case["engines"].items():
+                print(f"{'':>6}  {engine:<10} {outcome['final_cost']:.1f} in {outcome['time_budget']}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print("slower:", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture
+def employees():
+    """Two servers free all week."""
+    return [{"id": 1, "ph": 10, "maxh": 40, "roles": ["server"], "availability": {}},
+            {"id": 2, "ph": 10, "maxh": 40, "roles": ["server"], "availability": {}}]
+
+
+@pytest.fixture
+def positions():
+    return {"server": {"hourlyRate": 10, "maxGuests": 5}}
+
+
+@pytest.fixture
+def shift():
+    """Build a server assignment: shift(employee_id, slot)."""
+    def shift(employee_id, slot):
+        return {"employee_id": employee_id, "role": "server", "slot": slot}
+    return shift
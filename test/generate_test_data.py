@@ -2,14 +2,32 @@ import random
 
 num_employees = 25
 
-def generate_test_data(num_employees):
+DAYS = ["su", "mo", "tu", "we", "th", "fr", "sa"]
+
+# Relative guest traffic over the 16 hours of a day
+TRAFFIC_SHAPES = {
+    "random": None,
+    "flat": [1.0] * 16,
+    # lunch and dinner rushes
+    "peaked": [0.2, 0.4, 0.8, 1.0, 0.7, 0.4, 0.3, 0.4, 0.7, 1.0, 1.0, 0.8, 0.6, 0.4, 0.3, 0.2],
+}
+
+
+def generate_test_data(num_employees, seed=None, role_mix=None, availability_density=None, traffic_shape="random",
+                       num_managers=4):
+    # seed: makes the instance reproducible without touching the global random state
+    # role_mix: {role: weight} for the non-manager roles, uniform if not given
+    # availability_density: chance an employee is available on a given day; if not given every employee
+    #   gets one availability for the whole week, as before
+    # traffic_shape: "random", "flat" or "peaked"
+    rng = random.Random(seed) if seed is not None else random
     data = {
         #Two sets of hours - 1st is operating hours(prep, opening, closing , etc), 2nd is open hours(business service hours)
 
-        
+
 
         "hours": {
-            
+
             "su": ["08:00-00:00", "16:00-23:00"],
             "mo": ["10:00-00:00", "16:00-23:00"],
             "tu": ["10:00-00:00", "16:00-23:00"],
@@ -19,9 +37,9 @@ def generate_test_data(num_employees):
             "sa": ["08:00-01:00", "16:00-00:00"]
         },
         "positions": {
-            #           role : 
+            #           role :
             #           hourlyRate: what the business pays this employee per hour,
-            #           maxGuests: how many guests in an hour one person in this role can serve, 
+            #           maxGuests: how many guests in an hour one person in this role can serve,
             #           minOnPeak: how many instances of this role are required during peak hours
             #           min: how many instances of this role are required total
             #           max: how many instances of this role are allowed total
@@ -29,45 +47,67 @@ def generate_test_data(num_employees):
             #           hours_after_close: how many hours after close this role should be scheduled
 
             "manager": {"hourlyRate": 35, "maxGuests": 0, "min": 1},
-            "server": {"hourlyRate": random.randint(10, 15), "maxGuests": 25},
-            "bartender": {"hourlyRate": random.randint(10, 15), "maxGuests": 50},
-            "host": {"hourlyRate": random.randint(8, 10), "maxGuests": 100},
-            "expo": {"hourlyRate": random.randint(8, 10), "maxGuests": 100, "minOnPeak": 1},
-            "support": {"hourlyRate": random.randint(8, 10), "maxGuests": 75},
-            "line cook": {"hourlyRate": random.randint(12, 20), "maxGuests": 75},
-            "prep cook": {"hourlyRate": random.randint(8, 10), "maxGuests": 75},
-            "dishwasher": {"hourlyRate": random.randint(8, 10), "maxGuests": 75},
-            "sous chef": {"hourlyRate": random.randint(18, 25), "maxGuests": 75},
-            "head chef": {"hourlyRate": random.randint(25, 35), "maxGuests": 75},
+            "server": {"hourlyRate": rng.randint(10, 15), "maxGuests": 25},
+            "bartender": {"hourlyRate": rng.randint(10, 15), "maxGuests": 50},
+            "host": {"hourlyRate": rng.randint(8, 10), "maxGuests": 100},
+            "expo": {"hourlyRate": rng.randint(8, 10), "maxGuests": 100, "minOnPeak": 1},
+            "support": {"hourlyRate": rng.randint(8, 10), "maxGuests": 75},
+            "line cook": {"hourlyRate": rng.randint(12, 20), "maxGuests": 75},
+            "prep cook": {"hourlyRate": rng.randint(8, 10), "maxGuests": 75},
+            "dishwasher": {"hourlyRate": rng.randint(8, 10), "maxGuests": 75},
+            "sous chef": {"hourlyRate": rng.randint(18, 25), "maxGuests": 75},
+            "head chef": {"hourlyRate": rng.randint(25, 35), "maxGuests": 75},
 
         },
-        # Daily traffic is totally random right now, but we could improve this later to more accurately reflect a real business.
-        "dailyTraffic": {day: [random.randint(10, 80) for _ in range(16)] for day in ["su", "mo", "tu", "we", "th", "fr", "sa"]},
         "empl": []
     }
 
+    # Daily traffic is random by default, or follows one of the TRAFFIC_SHAPES with some noise
+    shape = TRAFFIC_SHAPES[traffic_shape]
+    if shape is None:
+        data["dailyTraffic"] = {day: [rng.randint(10, 80) for _ in range(16)] for day in DAYS}
+    else:
+        data["dailyTraffic"] = {day: [max(0, int(80 * weight + rng.randint(-5, 5))) for weight in shape] for day in DAYS}
+
     roles = list(data["positions"].keys())
-    for _ in range(num_employees - 4):  # reserving slots for 4 managers
-        role = random.choice(roles[1:])  # exclude manager
-        availability = random.choice(
-            #creating random availability for each employee. 0 = not available, 1 = available, string = specific hours
-            [1, 0, f"{random.randint(8, 10)}:00-{random.randint(14, 16)}:00", f"{random.randint(16, 18)}:00-{random.randint(22, 24)}:00"])
+    weights = [role_mix.get(role, 0) for role in roles[1:]] if role_mix else None
+    for _ in range(num_employees - num_managers):  # reserving slots for managers
+        role = rng.choices(roles[1:], weights)[0] if weights else rng.choice(roles[1:])  # exclude manager
+        if availability_density is None:
+            availability = rng.choice(
+                #creating random availability for each employee. 0 = not available, 1 = available, string = specific hours
+                [1, 0, f"{rng.randint(8, 10)}:00-{rng.randint(14, 16)}:00", f"{rng.randint(16, 18)}:00-{rng.randint(22, 24)}:00"])
+            avl = [availability for _ in range(7)]
+        else:
+            avl = [rng.choice([1, 1, f"{rng.randint(8, 10)}:00-{rng.randint(14, 16)}:00", f"{rng.randint(16, 18)}:00-{rng.randint(22, 24)}:00"])
+                   if rng.random() < availability_density else 0 for _ in range(7)]
         data["empl"].append({
             "id": _ + 1, # employee id
             "pos": role, # employee position
-            "ph": random.randint(4, 8), # employee hourly rate
-            "maxh": random.randint(5, 10), # employee max hours (per day)
-            "avl": [availability for _ in range(7)] # employee availability (per day, for the week)
+            "ph": rng.randint(4, 8), # employee hourly rate
+            "maxh": rng.randint(5, 10), # employee max hours (per day)
+            "avl": avl # employee availability (per day, for the week)
         })
 
     # Add managers separately to ensure there are enough of them
-    for i in range(num_employees - 4, num_employees):
+    for i in range(num_employees - num_managers, num_employees):
         data["empl"].append({
             "id": i + 1,
             "pos": "manager",
-            "ph": random.randint(6, 10),
-            "maxh": random.randint(8, 12),
+            "ph": rng.randint(6, 10),
+            "maxh": rng.randint(8, 12),
             "avl": [1 for _ in range(7)]
         })
 
+    # The same employees in the form generate_entire_weekly_schedule_v4 reads
+    for employee in data["empl"]:
+        employee["roles"] = [employee["pos"]]
+        employee["availability"] = {
+            day: availability if isinstance(availability, str) else "open" if availability else "off"
+            for day, availability in zip(DAYS, employee["avl"])}
+    role_counts = {role: sum(1 for employee in data["empl"] if employee["pos"] == role) for role in roles}
+    # roughly a quarter of each role on every preferred slot
+    data["role_requirements"] = {role: max(1, count // 4) for role, count in role_counts.items()}
+    data["preferred_slots"] = {day: ["10:00-15:00", "16:00-23:00"] for day in DAYS}
+
     return data
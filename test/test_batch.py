@@ -0,0 +1,24 @@
+import json
+import os
+
+import batch
+from generate_test_data import generate_test_data
+
+
+def crash_on_line_two(line_number, line, *args):
+    if line_number == 2:
+        os._exit(1)
+    return batch_schedule_store(line_number, line, *args)
+
+
+batch_schedule_store = batch.schedule_store
+
+
+def test_a_dead_worker_fails_its_stores_not_the_batch(monkeypatch):
+    monkeypatch.setattr(batch, "schedule_store", crash_on_line_two)
+    lines = [json.dumps(generate_test_data(10, seed=seed)) for seed in range(6)]
+    results = {result["line"]: result for result in batch.run_batch(lines, workers=2, max_in_flight=2)}
+    assert sorted(results) == list(range(1, 7))
+    assert "BrokenProcessPool" in results[2]["error"]
+    # Stores submitted after the crash are scheduled by a fresh pool
+    assert "schedule" in results[6]
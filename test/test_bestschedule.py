@@ -0,0 +1,65 @@
+import copy
+import random
+
+import pytest
+
+from calculateschedule import MOVES, BestSchedule, ScheduleCost, generate_entire_weekly_schedule_v4
+from generate_test_data import generate_test_data
+from parallelanneal import parallel_annealing
+from parsejson import enforce_structure
+
+
+WEIGHTS = {"labor_cost": 1, "fairness": 1, "preference": 1}
+
+
+def _walk(max_log):
+    rng = random.Random(max_log)
+    data = enforce_structure(generate_test_data(25, seed=5))
+    schedule = copy.deepcopy(generate_entire_weekly_schedule_v4(data))
+    cost_model = ScheduleCost(schedule, data["empl"], data["positions"], WEIGHTS)
+    best = BestSchedule(schedule, cost_model.total(), max_log=max_log)
+    expected = copy.deepcopy(schedule)
+    for _ in range(400):
+        move = rng.choice(MOVES).propose(schedule, rng.choice(list(schedule)), data["positions"], rng)
+        if move is None:
+            continue
+        move.apply(schedule)
+        cost = cost_model.apply(move.removed, move.added)
+        best.applied(move, cost)
+        if cost <= best.cost:
+            expected = copy.deepcopy(schedule)
+        assert best.copy() == expected
+    live = copy.deepcopy(schedule)
+    assert best.copy() == expected and schedule == live
+    assert best.result() == expected
+    assert ScheduleCost(expected, data["empl"], data["positions"], WEIGHTS).total() == best.cost
+
+
+def test_best_schedule_rebuilt_from_undo_log():
+    _walk(max_log=10 ** 6)
+
+
+def test_best_schedule_snapshots_when_log_is_full():
+    _walk(max_log=5)
+
+
+def test_tempering_result_does_not_depend_on_workers():
+    data = enforce_structure(generate_test_data(30, seed=2))
+    schedule = generate_entire_weekly_schedule_v4(data)
+    results = [parallel_annealing(schedule, data["empl"], data["positions"], data["dailyTraffic"], WEIGHTS,
+                                  workers=workers, chains=3, mode="tempering", max_iterations=600, seed=1)
+               for workers in (1, 2)]
+    assert results[0] == results[1]
+
+
+def test_tempering_checks_its_iteration_settings():
+    data = enforce_structure(generate_test_data(10, seed=2))
+    schedule = generate_entire_weekly_schedule_v4(data)
+    args = (schedule, data["empl"], data["positions"], data["dailyTraffic"], WEIGHTS)
+    for mode in ("restarts", "tempering"):
+        result = parallel_annealing(*args, workers=1, chains=2, mode=mode, max_iterations=0)
+        assert result == schedule and result is not schedule
+    with pytest.raises(ValueError, match="exchange_interval"):
+        parallel_annealing(*args, workers=1, chains=2, mode="tempering", exchange_interval=0)
+    with pytest.raises(ValueError, match="max_iterations"):
+        parallel_annealing(*args, workers=1, chains=2, max_iterations=-1)
@@ -0,0 +1,58 @@
+import copy
+import random
+
+from compactschedule import CompactSchedule
+
+
+def test_round_trip_with_mixed_ids_and_empty_days():
+    schedule = {"mo": [{"employee_id": 7, "role": "server", "slot": "10:00-14:00"},
+                       {"employee_id": "7", "role": "host", "slot": "18:00-01:00"},
+                       {"employee_id": "a-3", "role": "server"}],
+                "tu": [],
+                "we": [{"employee_id": 12, "role": "cook", "slot": "10:30-14:00"}],
+                "th": []}
+    compact = CompactSchedule.from_dict(schedule)
+    assert compact.to_dict() == schedule
+    assert list(compact) == list(schedule)
+    assert copy.deepcopy(compact).to_dict() == schedule
+
+
+def test_replaced_entries_are_reused_not_appended():
+    rng = random.Random(0)
+    slots = ["10:00-14:00", "14:00-18:00", "18:00-22:00"]
+
+    def entries(count):
+        return [{"employee_id": rng.choice([1, 2, "x"]), "role": rng.choice(["server", "host"]),
+                 "slot": rng.choice(slots)} for _ in range(count)]
+
+    expected = {day: entries(10) for day in ("mo", "tu", "we")}
+    compact = CompactSchedule.from_dict(expected)
+    peak = 30
+    for _ in range(2000):
+        day = rng.choice(list(expected))
+        action = rng.randrange(4)
+        if action == 0:
+            # Keep some, rebuild the rest, as LNS does
+            kept = [entry for entry in compact[day] if rng.random() < 0.5]
+            rebuilt = entries(rng.randint(0, 10))
+            expected[day] = [dict(entry) for entry in kept] + rebuilt
+            compact[day] = kept + rebuilt
+        elif action == 1 and expected[day]:
+            idx = rng.randrange(len(expected[day]))
+            value = entries(1)[0]
+            expected[day][idx] = value
+            compact[day][idx] = value
+        elif action == 2 and expected[day]:
+            idx = rng.randrange(len(expected[day]))
+            del expected[day][idx]
+            del compact[day][idx]
+        else:
+            other = rng.choice(list(expected))
+            if expected[day] and expected[other]:
+                i, j = rng.randrange(len(expected[day])), rng.randrange(len(expected[other]))
+                expected[day][i], expected[other][j] = expected[other][j], expected[day][i]
+                compact[day][i], compact[other][j] = compact[other][j], compact[day][i]
+        assert compact.to_dict() == expected
+        peak = max(peak, sum(len(day_schedule) for day_schedule in expected.values()))
+    # Rows are only added while at most half of them are free, however many changes are made
+    assert len(compact.entry_employee) <= 2 * peak
@@ -0,0 +1,19 @@
+from array import array
+
+from calculateschedule import evaluate_schedule
+
+
+def test_overnight_rest_follows_monday_first_week(employees, positions, shift):
+    saturday_into_sunday = {"sa": [shift(1, "20:00-00:30")], "su": [shift(1, "01:00-05:00")]}
+    assert not evaluate_schedule(saturday_into_sunday, employees, {}, positions)["breaks_enforced"]
+    sunday_then_monday = {"su": [shift(1, "20:00-00:30")], "mo": [shift(1, "08:00-12:00")]}
+    assert evaluate_schedule(sunday_then_monday, employees, {}, positions)["breaks_enforced"]
+
+
+def test_coverage_shortfalls_reported_against_demand(employees, positions, shift):
+    schedule = {"mo": [shift(1, "10:00-12:00"), shift(2, "10:30-11:00")]}
+    demand = {"mo": {"server": array('i', [0] * 10 + [2, 2, 1])}}
+    evaluation = evaluate_schedule(schedule, employees, {}, positions, demand=demand)
+    assert not evaluation["coverage_met"]
+    assert evaluation["coverage_shortfalls"] == [["mo", 11, "server", 1], ["mo", 12, "server", 1]]
+    assert "coverage_met" not in evaluate_schedule(schedule, employees, {}, positions)
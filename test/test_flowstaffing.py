@@ -0,0 +1,77 @@
+import itertools
+import random
+
+from availability import AvailabilityIndex
+from flowstaffing import flow_day_schedule, generate_weekly_schedule_flow, labor_rate
+from generate_test_data import generate_test_data
+from parsejson import enforce_structure
+
+
+POSITIONS = {"server": {"hourlyRate": 15, "maxGuests": 10}, "host": {"hourlyRate": 12, "maxGuests": 30}}
+WINDOW = (10, 13)
+
+
+def random_case(rng):
+    employees = []
+    for employee_id in range(1, 4):
+        start = rng.randint(9, 11)
+        employees.append({"id": employee_id, "roles": rng.sample(sorted(POSITIONS), rng.randint(1, 2)),
+                          "maxh": rng.randint(1, 3), "availability": {"mo": f"{start}:00-{start + 3}:00"}})
+    if rng.random() < 0.5:
+        employees[0]["hourlyRate"] = 20
+    demand = {(hour, role): rng.randint(1, 2) for hour in range(*WINDOW) for role in POSITIONS if rng.random() < 0.6}
+    hours_left = {idx: rng.randint(0, employee["maxh"]) for idx, employee in enumerate(employees)}
+    return employees, demand, hours_left
+
+
+def brute_force(employees, demand, hours_left, availability):
+    # Every employee-hour left idle or given a role in demand: the most seats filled, then the least cost
+    cells = [(idx, hour) for idx in range(len(employees)) for hour in range(*WINDOW)
+             if availability.is_available(idx, "mo", hour)]
+    options = [[None] + [role for role in employees[idx]["roles"] if (hour, role) in demand] for idx, hour in cells]
+    best = (0, 0)
+    for choice in itertools.product(*options):
+        seats, hours = {}, [0] * len(employees)
+        for (idx, hour), role in zip(cells, choice):
+            if role is not None:
+                seats[hour, role] = seats.get((hour, role), 0) + 1
+                hours[idx] += 1
+        if any(hours[idx] > hours_left[idx] for idx in hours_left) or any(
+                count > demand[key] for key, count in seats.items()):
+            continue
+        cost = sum(labor_rate(employees[idx], role, POSITIONS) for (idx, _), role in zip(cells, choice) if role)
+        best = max(best, (sum(seats.values()), -cost))
+    return best[0], -best[1]
+
+
+def test_flow_day_matches_brute_force_under_weekly_caps():
+    rng = random.Random(0)
+    for _ in range(40):
+        employees, demand, hours_left = random_case(rng)
+        availability = AvailabilityIndex(employees)
+        expected = brute_force(employees, demand, hours_left, availability)
+        left = dict(hours_left)
+        day_schedule, shortfall = flow_day_schedule(employees, POSITIONS, [], None, "mo", availability, demand,
+                                                    WINDOW, left)
+        worked = {}
+        cost = 0
+        for entry in day_schedule:
+            start, end = (int(time.split(":")[0]) for time in entry["slot"].split("-"))
+            worked[entry["employee_id"]] = worked.get(entry["employee_id"], 0) + end - start
+            cost += (end - start) * labor_rate(employees[entry["employee_id"] - 1], entry["role"], POSITIONS)
+        assert (sum(demand.values()) - sum(shortfall.values()), cost) == expected
+        for idx, employee in enumerate(employees):
+            assert left[idx] == hours_left[idx] - worked.get(employee["id"], 0) >= 0
+
+
+def test_weekly_flow_schedule_keeps_maxh_for_the_week():
+    data = enforce_structure(generate_test_data(30, seed=3))
+    schedule = generate_weekly_schedule_flow(data)
+    worked = {}
+    for day_schedule in schedule.values():
+        for entry in day_schedule:
+            start, end = (int(time.split(":")[0]) for time in entry["slot"].split("-"))
+            worked[entry["employee_id"]] = worked.get(entry["employee_id"], 0) + end - start
+    assert worked
+    for employee in data["empl"]:
+        assert worked.get(employee["id"], 0) <= employee["maxh"]
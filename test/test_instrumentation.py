@@ -0,0 +1,32 @@
+import json
+
+from batch import main, run_batch
+import calculateschedule
+from generate_test_data import generate_test_data
+import instrumentation
+import optimizers
+
+
+PHASES = {"generate_entire_weekly_schedule_v4", "enhanced_day_schedule", "simulated_annealing_v2",
+          "evaluate_schedule"}
+
+
+def test_batch_run_records_every_phase(tmp_path):
+    lines = [json.dumps(generate_test_data(20, seed=seed)) for seed in (1, 2)]
+    for workers in (1, 2):
+        results = list(run_batch(lines, workers=workers, iterations=50, profile=True))
+        assert len(results) == 2
+        for result in results:
+            assert "error" not in result
+            assert PHASES <= {name for name, *_ in result["profile"].phases}
+    assert not instrumentation.enabled()
+    assert not hasattr(calculateschedule.evaluate_schedule, "__wrapped__")
+    assert not hasattr(optimizers.enhanced_day_schedule, "__wrapped__")
+
+    source, trace = tmp_path / "stores.jsonl", tmp_path / "trace.json"
+    source.write_text("\n".join(lines) + "\n")
+    assert main([str(source), "-o", str(tmp_path / "out.jsonl"), "--workers", "1", "--iterations", "50",
+                 "--profile", str(trace)]) == 0
+    recorded = json.loads(trace.read_text())
+    assert {name: totals["calls"] for name, totals in recorded["phases"].items()
+            if name != "enhanced_day_schedule"} == dict.fromkeys(PHASES - {"enhanced_day_schedule"}, 2)
@@ -0,0 +1,20 @@
+import random
+
+from calculateschedule import coverage_shortfalls, hourly_coverage
+from flowstaffing import generate_weekly_schedule_flow
+from generate_test_data import generate_test_data
+from optimizers import optimize
+from parsejson import enforce_structure
+
+
+def test_lns_never_lowers_coverage():
+    data = enforce_structure(generate_test_data(60, seed=2))
+    schedule = generate_weekly_schedule_flow(data)
+    improved = optimize(schedule, data, engine="lns", time_budget=None, rng=random.Random(0), max_iterations=200)
+
+    assert sum(map(len, improved.values())) >= sum(map(len, schedule.values()))
+    assert len(coverage_shortfalls(improved, data.demand)) <= len(coverage_shortfalls(schedule, data.demand))
+    before, after = hourly_coverage(schedule), hourly_coverage(improved)
+    for (day, hour, role), staffed in before.items():
+        seats = data.demand.get(day, {}).get(role, ())
+        assert after[day, hour, role] >= min(staffed, seats[hour] if hour < len(seats) else 0)
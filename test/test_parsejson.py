@@ -0,0 +1,24 @@
+import pytest
+
+from availability import AvailabilityIndex
+from generate_test_data import generate_test_data
+from parsejson import enforce_structure
+
+
+def with_window(window):
+    data = generate_test_data(5, seed=1)
+    data["empl"][0]["avl"][1] = data["empl"][0]["availability"]["mo"] = window
+    return data
+
+
+@pytest.mark.parametrize("window", ["10:xx-14:00", "10:60-14:00", "10:0-14:00", "10-14:00", "10:00-25:00",
+                                    "10:00-14:00:00", "10:00-10:00", "١٠:00-14:00"])
+def test_bad_availability_windows_are_reported_with_the_employee(window):
+    with pytest.raises(ValueError, match="employee data: 1"):
+        enforce_structure(with_window(window))
+
+
+@pytest.mark.parametrize("window", ["10:30-14:45", "18:00-01:00", "16:00-24:00", "9:05-13:00"])
+def test_valid_availability_windows_reach_the_index(window):
+    data = enforce_structure(with_window(window))
+    AvailabilityIndex(data["empl"], data["granularity"])
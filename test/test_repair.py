@@ -0,0 +1,33 @@
+import pytest
+
+from calculateschedule import repair_schedule
+
+
+def test_override_of_unscheduled_slot_is_rejected(employees, positions, shift):
+    schedule = {"mo": [shift(1, "10:00-12:00")]}
+    for day, slot in (("mo", "13:00-15:00"), ("tu", "10:00-12:00")):
+        with pytest.raises(ValueError, match=f"{slot}.*{day}"):
+            repair_schedule(schedule, employees, {}, positions,
+                            [{"type": "override", "day": day, "slot": slot, "employee_id": 2, "role": "server"}])
+    assert schedule == {"mo": [shift(1, "10:00-12:00")]}
+
+
+def test_bad_changes_are_rejected_before_anything_changes(employees, positions, shift):
+    schedule = {"mo": [shift(1, "10:00-12:00")]}
+    for change, message in (({"type": "swap"}, "Unknown change type: swap"),
+                            ({"employee_id": 1}, "Unknown change type: None"),
+                            ({"type": "callout", "employee_id": 9}, "Unknown employee in callout change: 9"),
+                            ({"type": "availability", "availability": {}}, "Unknown employee.*None")):
+        with pytest.raises(ValueError, match=message):
+            repair_schedule(schedule, employees, {}, positions, [{"type": "callout", "employee_id": 2}, change])
+    assert schedule == {"mo": [shift(1, "10:00-12:00")]}
+
+
+def test_repair_keeps_half_hour_shifts_on_a_half_hour_store(positions, shift):
+    employees = [{"id": 1, "ph": 10, "maxh": 40, "roles": ["server"], "availability": {"mo": "10:30-18:00"}},
+                 {"id": 2, "ph": 10, "maxh": 40, "roles": ["server"], "availability": {"tu": "10:00-18:00"}}]
+    schedule = {"mo": [shift(1, "10:30-14:00")], "tu": [shift(2, "10:00-14:00")]}
+    schedule, dropped = repair_schedule(schedule, employees, {}, positions,
+                                        [{"type": "callout", "employee_id": 2, "day": "tu"}], granularity=30)
+    assert schedule == {"mo": [shift(1, "10:30-14:00")], "tu": []}
+    assert dropped == [{"day": "tu", "slot": "10:00-14:00", "role": "server"}]
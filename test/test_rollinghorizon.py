@@ -0,0 +1,44 @@
+import json
+
+from availability import WEEK_DAYS
+from calculateschedule import hours_by_employee
+from rollinghorizon import CarryOver, plan_horizon, plan_week, week_employees
+
+
+def store(slots):
+    employees = [{"id": employee_id, "pos": "server", "roles": ["server"], "ph": 8, "maxh": 40,
+                  "availability": dict.fromkeys(WEEK_DAYS, "open")} for employee_id in (1, 2)]
+    return {"empl": employees, "positions": {"server": {"hourlyRate": 10, "maxGuests": 5}}, "hours": {},
+            "dailyTraffic": {}, "role_requirements": {"server": 1}, "preferred_slots": slots}
+
+
+def test_late_last_shift_blocks_an_early_start_next_week(shift):
+    data = store({"mo": ["06:00-10:00"]})
+    # Employee 2 has worked far more, so the greedy phase would pick employee 1 if they were rested
+    busy = {day: [shift(2, "10:00-18:00")] for day in WEEK_DAYS[:-1]}
+    for sunday_shift, expected in (("18:00-23:00", 2), ("12:00-20:00", 1)):
+        carry = CarryOver()
+        carry.advance(dict(busy, su=[shift(1, sunday_shift)]), data["empl"])
+        schedule = plan_week(data, carry, max_iterations=0, min_rest=8)
+        assert [entry["employee_id"] for entry in schedule["mo"]] == [expected]
+
+
+def test_cumulative_hours_carry_across_weeks():
+    data = store({day: ["10:00-14:00", "16:00-20:00"] for day in WEEK_DAYS})
+    schedules, carry = plan_horizon(data, 2, max_iterations=0)
+    # Continue from a JSON round trip, as a plan resumed in a later run would
+    carry = CarryOver.from_dict(json.loads(json.dumps(carry.to_dict())))
+    more, carry = plan_horizon(data, 1, carry=carry, max_iterations=0)
+    schedules += more
+
+    assert carry.weeks == 3
+    totals = {1: 0, 2: 0}
+    for schedule in schedules:
+        for employee_id, hours in hours_by_employee(schedule).items():
+            totals[employee_id] += hours
+    assert carry.hours == totals
+    assert carry.preferred == {1: 24, 2: 24}
+
+    # Next week's preferred hours pull each running total back towards ph a week
+    carry.hours = {1: 30, 2: 18}
+    assert {employee["id"]: employee["ph"] for employee in week_employees(data["empl"], carry)} == {1: 2, 2: 14}
@@ -0,0 +1,71 @@
+import copy
+import random
+
+from calculateschedule import (MOVES, BestSchedule, ScheduleCost, anneal_batched, generate_entire_weekly_schedule_v4,
+                               schedule_cost_v2)
+from generate_test_data import generate_test_data
+from parsejson import enforce_structure
+
+
+WEIGHTS = [
+    {"labor_cost": 1, "fairness": 1, "preference": 1},
+    {"labor_cost": 0.5, "fairness": 3, "preference": 0.25},
+]
+
+
+def test_running_cost_matches_full_cost_over_random_move_chains():
+    for seed in range(4):
+        rng = random.Random(seed)
+        data = enforce_structure(generate_test_data(30, seed=seed, availability_density=0.7))
+        schedule = copy.deepcopy(generate_entire_weekly_schedule_v4(data))
+        weights = WEIGHTS[seed % len(WEIGHTS)]
+        cost_model = ScheduleCost(schedule, data["empl"], data["positions"], weights)
+        days = list(schedule)
+        for _ in range(300):
+            move = rng.choice(MOVES).propose(schedule, rng.choice(days), data["positions"], rng)
+            if move is None:
+                continue
+            predicted = cost_model.total() + cost_model.delta(move.removed, move.added)
+            move.apply(schedule)
+            total = cost_model.apply(move.removed, move.added)
+            expected = schedule_cost_v2(schedule, data["empl"], data["positions"], data["dailyTraffic"], weights)
+            assert abs(total - expected) < 1e-6
+            assert abs(predicted - expected) < 1e-6
+
+
+def test_undo_restores_cost():
+    rng = random.Random(7)
+    data = enforce_structure(generate_test_data(20, seed=7))
+    schedule = copy.deepcopy(generate_entire_weekly_schedule_v4(data))
+    weights = WEIGHTS[0]
+    before = schedule_cost_v2(schedule, data["empl"], data["positions"], data["dailyTraffic"], weights)
+    moves = []
+    for _ in range(100):
+        move = rng.choice(MOVES).propose(schedule, rng.choice(list(schedule)), data["positions"], rng)
+        if move is not None:
+            move.apply(schedule)
+            moves.append(move)
+    for move in reversed(moves):
+        move.undo(schedule)
+    after = schedule_cost_v2(schedule, data["empl"], data["positions"], data["dailyTraffic"], weights)
+    assert abs(before - after) < 1e-6
+
+
+def test_batched_annealing_keeps_cost_model_and_best_in_step():
+    for seed in range(3):
+        data = enforce_structure(generate_test_data(30, seed=seed))
+        schedule = copy.deepcopy(generate_entire_weekly_schedule_v4(data))
+        weights = WEIGHTS[seed % len(WEIGHTS)]
+        cost_model = ScheduleCost(schedule, data["empl"], data["positions"], weights)
+        best = BestSchedule(schedule, cost_model.total())
+        rng = random.Random(seed)
+        temp = 5
+        for _ in range(3):
+            best, temp = anneal_batched(schedule, cost_model, data["positions"], temp, 0.999, 500, batch_size=64,
+                                        rng=rng, best=best)
+            expected = schedule_cost_v2(schedule, data["empl"], data["positions"], data["dailyTraffic"], weights)
+            assert abs(cost_model.total() - expected) < 1e-6
+        best_schedule = best.copy()
+        assert abs(schedule_cost_v2(best_schedule, data["empl"], data["positions"], data["dailyTraffic"], weights)
+                   - best.cost) < 1e-6
+        assert best.cost <= cost_model.total() + 1e-6
@@ -0,0 +1,31 @@
+import io
+
+import pytest
+
+from scheduleio import ScheduleWriter, read_columnar, read_jsonl, write_columnar
+
+
+def test_columnar_round_trip_keeps_mixed_id_types(tmp_path):
+    schedule = {"mo": [{"employee_id": 7, "role": "server", "slot": "10:00-14:00"},
+                       {"employee_id": "7", "role": "host", "slot": "18:00-01:00"}],
+                "tu": [{"employee_id": "a-3", "role": "server", "slot": "10:30-14:00"}]}
+    path = str(tmp_path / "mixed.sched")
+    write_columnar(schedule, path)
+    assert read_columnar(path).to_dict() == schedule
+
+    with pytest.raises(ValueError, match="employee id"):
+        write_columnar({"mo": [{"employee_id": 1.5, "role": "server", "slot": "10:00-14:00"}]}, path)
+
+
+def test_read_jsonl_splits_back_to_back_schedules_of_one_store():
+    first = {"mo": [{"employee_id": 1, "role": "server", "slot": "10:00-14:00"}]}
+    second = {"mo": [{"employee_id": 2, "role": "server", "slot": "10:00-14:00"}]}
+    sink = io.StringIO()
+    writer = ScheduleWriter(sink)
+    writer.write_schedule(first)
+    writer.write_schedule(second)
+    writer.write_schedule(first, store=5)
+    writer.write_evaluation({"hours_difference": 0}, store=5)
+    writer.write_schedule(second, store=5)
+    assert list(read_jsonl(sink.getvalue().splitlines())) == [
+        (None, first, None), (None, second, None), (5, first, {"hours_difference": 0}), (5, second, None)]
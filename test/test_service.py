@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+from generate_test_data import generate_test_data
+from service import LINE_LIMIT, SchedulingService
+
+
+async def request(reader, writer, message):
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def submit_watch_cancel():
+    service = SchedulingService(workers=1)
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=LINE_LIMIT)
+        # Past asyncio's default 64KB line limit
+        submitted = await request(reader, writer, {"op": "submit", "store": generate_test_data(300, seed=1),
+                                                   "time_budget": 60})
+        assert submitted["ok"]
+
+        watch_reader, watch_writer = await asyncio.open_connection("127.0.0.1", port, limit=LINE_LIMIT)
+        watch_writer.write(json.dumps({"op": "watch", "job": submitted["job"]}).encode() + b"\n")
+        progress = []
+        while True:
+            event = json.loads(await asyncio.wait_for(watch_reader.readline(), 60))
+            if event["event"] == "progress":
+                progress.append(event["best_cost"])
+                if len(progress) == 1:
+                    cancelled = await request(reader, writer, {"op": "cancel", "job": submitted["job"]})
+                    assert cancelled["ok"]
+            if event["event"] == "result":
+                break
+        watch_writer.close()
+
+        result = event
+        assert result["state"] == "cancelled"
+        assert result["best_cost"] <= progress[0]
+        assert result["schedule"] and "evaluation" in result
+
+        # A request that is not a JSON object gets an error reply, and the connection stays usable
+        for message in ([1], "status", None):
+            reply = await request(reader, writer, message)
+            assert not reply["ok"] and "JSON object" in reply["error"]
+        assert (await request(reader, writer, {"op": "status", "job": submitted["job"]}))["ok"]
+
+        # An oversized request gets an error reply rather than a dropped connection
+        writer.write(b'{"op": "status", "pad": "' + b"x" * (64 * 1024 * 1024) + b'"}\n')
+        reply = json.loads(await reader.readline())
+        assert not reply["ok"]
+        writer.close()
+    finally:
+        await service.close()
+
+
+def test_submit_watch_cancel_over_loopback():
+    asyncio.run(submit_watch_cancel())
+
+
+async def submit_engines():
+    service = SchedulingService(workers=1)
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=LINE_LIMIT)
+        store = generate_test_data(30, seed=1)
+        assert not (await request(reader, writer, {"op": "submit", "store": store, "engine": "nope"}))["ok"]
+        submitted = await request(reader, writer, {"op": "submit", "store": store, "engine": "tabu",
+                                                   "max_iterations": 20})
+        result = await request(reader, writer, {"op": "result", "job": submitted["job"]})
+        assert result["state"] == "done" and result["best_cost"] is not None and result["schedule"]
+        writer.close()
+    finally:
+        await service.close()
+
+
+def test_submit_with_engine():
+    asyncio.run(submit_engines())
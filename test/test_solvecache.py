@@ -0,0 +1,54 @@
+import json
+import os
+import random
+
+from generate_test_data import generate_test_data
+from parsejson import enforce_structure
+from solvecache import SolveCache, solve_cached
+
+
+def store(seed=1):
+    return enforce_structure(generate_test_data(15, seed=seed))
+
+
+def test_solver_settings_are_part_of_the_exact_key(tmp_path):
+    cache = SolveCache(str(tmp_path))
+    data = store()
+    assert solve_cached(cache, data, max_iterations=0, rng=random.Random(0))[1] == "cold"
+    assert solve_cached(cache, data, max_iterations=0, rng=random.Random(0))[1] == "hit"
+    assert solve_cached(cache, data, max_iterations=200, rng=random.Random(0))[1] == "warm"
+    assert solve_cached(cache, data, max_iterations=200, rng=random.Random(0))[1] == "hit"
+
+
+def test_near_hits_need_the_same_requirements_and_slots(tmp_path):
+    cache = SolveCache(str(tmp_path))
+    data = store()
+    solve_cached(cache, data, max_iterations=100, rng=random.Random(0))
+
+    traffic = data.to_dict()
+    traffic["dailyTraffic"] = {day: [guests + 1 for guests in hourly] for day, hourly in traffic["dailyTraffic"].items()}
+    assert solve_cached(cache, enforce_structure(traffic), max_iterations=100, rng=random.Random(0))[1] == "warm"
+
+    requirements = data.to_dict()
+    requirements["role_requirements"] = {role: count + 1 for role, count in requirements["role_requirements"].items()}
+    assert solve_cached(cache, enforce_structure(requirements), max_iterations=100, rng=random.Random(0))[1] == "cold"
+
+    slots = data.to_dict()
+    slots["preferred_slots"] = {day: day_slots[:1] for day, day_slots in slots["preferred_slots"].items()}
+    assert solve_cached(cache, enforce_structure(slots), max_iterations=100, rng=random.Random(0))[1] == "cold"
+
+
+def test_eviction_counts_and_removes_staff_indexes(tmp_path):
+    cache = SolveCache(str(tmp_path), max_bytes=12 * 1024)
+    for seed in range(8):
+        solve_cached(cache, store(seed), max_iterations=0, rng=random.Random(0))
+
+    entries = {name[:-len(".json")] for name in os.listdir(tmp_path / "entries") if not name.startswith(".")}
+    staff = [name for name in os.listdir(tmp_path / "staff") if not name.startswith(".")]
+    size = sum(os.path.getsize(tmp_path / directory / name)
+               for directory in ("entries", "staff") for name in os.listdir(tmp_path / directory))
+    assert 0 < len(entries) < 8 and size <= cache.max_bytes
+    # Every index left names only entries still cached
+    assert len(staff) == len(entries)
+    for name in staff:
+        assert set(json.loads((tmp_path / "staff" / name).read_text())) <= entries